@@ -1,69 +1,64 @@
 from flask import Flask, jsonify, request
-import subprocess
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+import gzip
+import hashlib
 import os
-import signal
-import psutil
 import sys
+import threading
+
+# The usage endpoints and the supervisor use the tracker's own modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from analytics import category_totals, load_history, to_seconds
+from archive import MANIFEST_NAME, UsageArchive
+from config import ARCHIVE_DIR, EVENT_DIR, ROLLUP_MINUTE_RETENTION_HOURS
+from event_store import SEGMENT_SUFFIX, open_event_store
+from rollups import UsageRollups
+from supervisor import TrackerSupervisor
 
 app = Flask(__name__)
 
-# Global variable to store the tracking process
-tracking_process = None
+USAGE_PAGE_SIZE = 500  # events per page unless ?limit= asks for fewer or more
+USAGE_MAX_PAGE_SIZE = 5000
+GZIP_MIN_BYTES = 1024  # smaller responses aren't worth compressing
+ROLLUP_KEY_LENGTHS = {"day": 10, "hour": 13, "minute": 16}  # Bucket keys are prefixes of timestamps
 
-def find_process_by_name(name):
-    """Find a process by its name"""
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-        try:
-            # Check if the name is in the process name or command line
-            if name in proc.info['name'] or (
-                proc.info['cmdline'] and name in ' '.join([str(cmd) for cmd in proc.info['cmdline']])
-            ):
-                return proc
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return None
+# The tracker runs as our child; created on first use so Flask's reloader parent doesn't spawn one
+supervisor = None
+supervisor_lock = threading.Lock()
+
+# Totals come from rollups kept up to date by reading only the store tail since the last request
+usage_rollups = None
+usage_rollups_cursor = None
+usage_rollups_lock = threading.Lock()
+
+# Events not archived yet, by seq with their labels applied; tailed from the store the same way
+live_events = {}
+live_seqs = []
+live_events_cursor = None
+live_events_lock = threading.Lock()
+LIVE_EVENTS_CHUNK = 500  # events collected per hold of live_events_lock
+
+def get_supervisor():
+    global supervisor
+    with supervisor_lock:
+        if supervisor is None:
+            supervisor = TrackerSupervisor()
+        return supervisor
 
 @app.route('/api/tracking/status', methods=['GET'])
 def get_tracking_status():
-    """Get the current status of the tracking service"""
-    global tracking_process
-    
-    # Check if our tracking process is running
-    if tracking_process and tracking_process.poll() is None:
-        return jsonify({"status": "running"})
-    
-    # Also check if main.py is running independently
-    process = find_process_by_name('main.py')
-    if process:
-        # Update our reference
-        tracking_process = process
-        return jsonify({"status": "running"})
-    
-    return jsonify({"status": "stopped"})
+    """Get the current status and health of the tracking service"""
+    return jsonify(get_supervisor().status())
 
 @app.route('/api/tracking/start', methods=['POST'])
 def start_tracking():
     """Start the tracking service"""
-    global tracking_process
-    
-    # Check if already running
-    if tracking_process and tracking_process.poll() is None:
-        return jsonify({"message": "Tracking already running"})
-    
-    # Check if main.py is already running elsewhere
-    process = find_process_by_name('main.py')
-    if process:
-        tracking_process = process
-        return jsonify({"message": "Tracking already running"})
-    
-    # Start the main.py script
     try:
-        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'main.py')
-        
-        # Use pythonw on Windows to hide console window, or python on other platforms
-        python_executable = 'pythonw' if sys.platform == 'win32' else 'python'
-        
-        tracking_process = subprocess.Popen([python_executable, script_path])
+        if not get_supervisor().start():
+            return jsonify({"message": "Tracking already running"})
         return jsonify({"message": "Tracking started"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -71,30 +66,215 @@ def start_tracking():
 @app.route('/api/tracking/stop', methods=['POST'])
 def stop_tracking():
     """Stop the tracking service"""
-    global tracking_process
-    
-    # First check our stored process
-    if tracking_process:
-        try:
-            if hasattr(tracking_process, 'terminate'):
-                tracking_process.terminate()
-            elif hasattr(tracking_process, 'kill'):
-                tracking_process.kill()
-            tracking_process = None
-            return jsonify({"message": "Tracking stopped"})
-        except Exception as e:
-            pass  # Continue to find the process by name
-    
-    # Find the process by name if our reference failed
-    process = find_process_by_name('main.py')
-    if process:
+    try:
+        if not get_supervisor().stop():
+            return jsonify({"message": "Tracking not running"})
+        return jsonify({"message": "Tracking stopped"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def usage_data_version():
+    """
+    Fingerprint of the tracker data: the size and mtime of every event store
+    segment and of the archive manifest. Any appended event or label, and any
+    compaction, changes it; computing it costs a few stat calls.
+    """
+    fingerprint = hashlib.sha1()
+    paths = []
+    if os.path.isdir(EVENT_DIR):
+        paths = [os.path.join(EVENT_DIR, name) for name in sorted(os.listdir(EVENT_DIR))
+                 if name.endswith(SEGMENT_SUFFIX)]
+    paths.append(os.path.join(ARCHIVE_DIR, MANIFEST_NAME))
+    for path in paths:
         try:
-            process.terminate()
-            return jsonify({"message": "Tracking stopped"})
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            return jsonify({"error": "Could not stop tracking process"}), 500
-    
-    return jsonify({"message": "Tracking not running"})
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return fingerprint.hexdigest()[:16]
+
+def usage_etag():
+    """ETag of a usage response: the data version plus the query that shaped it"""
+    return f"{usage_data_version()}-{hashlib.sha1(request.query_string).hexdigest()[:8]}"
+
+def not_modified(etag):
+    """Return a 304 if the client already has this version, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def usage_response(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)  # Weak: the gzip and identity bodies share it
+    response.headers['Cache-Control'] = 'no-cache'  # Always revalidate; a match costs a 304
+    return response
+
+def update_live_events(archived_max):
+    """Read what the tracker appended since the last call into live_events. Call with live_events_lock held."""
+    global live_events_cursor
+    records, live_events_cursor = open_event_store().read_since(live_events_cursor)
+    for record in records:
+        if "ref" in record:
+            if record["ref"] in live_events:
+                live_events[record["ref"]] = dict(live_events[record["ref"]], category=record["category"])
+        else:
+            live_events[record["seq"]] = record
+            live_seqs.append(record["seq"])
+    # Days compacted since are served from the archive
+    archived = bisect_right(live_seqs, archived_max)
+    for seq in live_seqs[:archived]:
+        del live_events[seq]
+    del live_seqs[:archived]
+
+def live_events_after(start, end, after_seq, archived_max):
+    """Live events in [start, end] with seq > after_seq, found by seeking to after_seq rather than scanning"""
+    with live_events_lock:
+        update_live_events(archived_max)
+    while True:
+        chunk = []
+        with live_events_lock:
+            position = bisect_right(live_seqs, after_seq)
+            while position < len(live_seqs) and len(chunk) < LIVE_EVENTS_CHUNK:
+                event = live_events[live_seqs[position]]
+                position += 1
+                timestamp = event["timestamp"]
+                # Timestamps compare as strings; a date-only end bound covers that whole day
+                if (start and timestamp < start) or (end and timestamp[:len(end)] > end):
+                    continue
+                chunk.append(event)
+            scanned_to = live_seqs[position - 1] if position else after_seq
+        yield from chunk
+        if scanned_to <= after_seq:
+            return
+        after_seq = scanned_to
+
+def iter_usage_events(start, end, after_seq):
+    """Events in [start, end] with seq > after_seq, in seq order: archived days first, then live ones"""
+    archive = UsageArchive()
+    yield from archive.iter_dicts(start, end, after_seq=after_seq)
+
+    archived_max = archive.max_seq()
+    yield from live_events_after(start, end, max(after_seq, archived_max), archived_max)
+
+@app.route('/api/usage/events', methods=['GET'])
+def get_usage_events():
+    """
+    Raw events by time range, paginated by sequence number.
+    ?from=YYYY-MM-DD[ HH:MM:SS]&to=...&cursor=<seq>&limit=<n>; follow next_cursor until it is null.
+    """
+    etag = usage_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    try:
+        after_seq = int(request.args.get('cursor', 0))
+        limit = min(int(request.args.get('limit', USAGE_PAGE_SIZE)), USAGE_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    events = list(islice(iter_usage_events(request.args.get('from'), request.args.get('to'), after_seq), limit + 1))
+    has_more = len(events) > limit
+    events = events[:limit]
+    return usage_response({
+        "events": events,
+        "next_cursor": events[-1]["seq"] if has_more else None,
+    }, etag)
+
+@lru_cache(maxsize=32)
+def cached_category_totals(version, start, end):
+    """Category totals for one data version; an unchanged store is never re-aggregated"""
+    frame = load_history(start, end)
+    return category_totals(frame, to_seconds(start), to_seconds(end, end=True))
+
+def apply_store_tail(rollups, cursor):
+    """Feed the rollups the records appended since cursor: new events, and labels as relabels"""
+    records, cursor = open_event_store().read_since(cursor)
+    for record in records:
+        if "ref" in record:
+            rollups.apply({"seq": record["ref"], "category": record["category"]})
+        elif record["seq"] > rollups.last_seq:  # Already counted from the archive
+            rollups.apply(record)
+    rollups.prune()
+    return cursor
+
+def current_rollups():
+    """
+    Rollups of all usage so far. The archive is aggregated once; after that each
+    call reads only what the tracker appended since the previous one.
+    """
+    global usage_rollups, usage_rollups_cursor
+    with usage_rollups_lock:
+        while usage_rollups is None:
+            archive = UsageArchive()
+            rollups = UsageRollups()
+            rollups.apply_all(archive.iter_dicts())
+            cursor = apply_store_tail(rollups, None)
+            # A compaction in between may have moved events out of segments we had not read yet
+            if UsageArchive().max_seq() == archive.max_seq():
+                usage_rollups, usage_rollups_cursor = rollups, cursor
+        usage_rollups_cursor = apply_store_tail(usage_rollups, usage_rollups_cursor)
+        return usage_rollups
+
+def rollup_granularity(start, end):
+    """
+    The coarsest rollup bucket both bounds fall on, or None if they split a bucket
+    (or need minute buckets that have already been pruned). Raises ValueError for a
+    malformed bound.
+    """
+    start_full = start + " 00:00:00" if start and len(start) <= 10 else start
+    end_full = end + " 23:59:59" if end and len(end) <= 10 else end
+    for bound in (start_full, end_full):
+        if bound:
+            datetime.strptime(bound, "%Y-%m-%d %H:%M:%S")
+    for granularity, length in ROLLUP_KEY_LENGTHS.items():
+        if ((not start_full or start_full[length:] == "0000-00-00 00:00:00"[length:])
+                and (not end_full or end_full[length:] == "0000-00-00 23:59:59"[length:])):
+            if granularity != "minute":
+                return granularity
+            horizon = datetime.now() - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS)
+            if start_full and start_full >= horizon.strftime("%Y-%m-%d %H:%M:%S"):
+                return granularity
+    return None
+
+@app.route('/api/usage/totals', methods=['GET'])
+def get_usage_totals():
+    """Active seconds per category over ?from=&to= (both optional, inclusive)"""
+    etag = usage_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        granularity = rollup_granularity(start, end)
+        if granularity:
+            # The session still open isn't part of any data version, so it's left out
+            length = ROLLUP_KEY_LENGTHS[granularity]
+            totals = current_rollups().totals(granularity, start and start[:length], end and end[:length],
+                                              include_open=False)
+        else:
+            totals = cached_category_totals(usage_data_version(), start, end)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {e}"}), 400
+    return usage_response({"from": start, "to": end, "totals": totals}, etag)
+
+@app.after_request
+def compress_usage_response(response):
+    """Gzip usage API responses for clients that accept it"""
+    if (not request.path.startswith('/api/usage/') or response.status_code != 200 or response.direct_passthrough
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
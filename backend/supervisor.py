@@ -0,0 +1,254 @@
+"""
+Supervisor for the tracker process (scripts/main.py).
+
+The API process starts the tracker as its child, records it in a pidfile and
+holds a lock next to it, so a second API process can't start another
+tracker. A monitor thread restarts the tracker when it crashes (non-zero
+exit), stops writing heartbeats, or its sampling or categorizer loop stops
+making progress, with exponential backoff. status() reads
+only the child handle and the heartbeat file, never the process table.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+from config import (HEARTBEAT_FILE, HEARTBEAT_INTERVAL, HEARTBEAT_STALE_AFTER, SUPERVISOR_MAX_RESTART_DELAY,
+                    SUPERVISOR_RESTART_DELAY, SUPERVISOR_STABLE_AFTER, TRACKER_PID_FILE)
+from heartbeat import HEARTBEAT_PROGRESS_FIELDS
+from heartbeat import read_heartbeat
+
+TRACKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'main.py')
+
+
+def default_command():
+    # Use pythonw on Windows to hide the console window
+    python_executable = 'pythonw' if sys.platform == 'win32' else sys.executable
+    return [python_executable, TRACKER_SCRIPT]
+
+
+def _lock_exclusive(lock_file):
+    if os.name == "nt":
+        import msvcrt
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class TrackerSupervisor:
+    def __init__(self, command=None, pid_file=TRACKER_PID_FILE, heartbeat_file=HEARTBEAT_FILE,
+                 stale_after=HEARTBEAT_STALE_AFTER, restart_delay=SUPERVISOR_RESTART_DELAY,
+                 max_restart_delay=SUPERVISOR_MAX_RESTART_DELAY, stable_after=SUPERVISOR_STABLE_AFTER):
+        self.command = command or default_command()
+        self.pid_file = pid_file
+        self.heartbeat_file = heartbeat_file
+        self.stale_after = stale_after
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+
+        self.process = None  # Our child (subprocess.Popen) or an adopted tracker (psutil.Process)
+        self.started_at = None
+        self.wanted = False  # True between start() and stop(): crashes are restarted
+        self.restarts = 0
+        self.last_exit_code = None
+        self.state = "stopped"  # stopped, running, restarting
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._monitor = None
+        self._wakeup = threading.Event()
+        self._adopt()
+
+    # --- pidfile ---
+
+    def _acquire_lock(self):
+        if self._lock_file is not None:
+            return
+        lock_file = open(f"{self.pid_file}.lock", "a+")
+        try:
+            _lock_exclusive(lock_file)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError("The tracker is supervised by another process")
+        self._lock_file = lock_file
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _write_pid_file(self, pid, create_time):
+        temp_file = f"{self.pid_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({"pid": pid, "create_time": create_time, "supervisor": os.getpid()}, f)
+        os.replace(temp_file, self.pid_file)
+
+    def _remove_pid_file(self):
+        try:
+            os.remove(self.pid_file)
+        except FileNotFoundError:
+            pass
+
+    def _adopt(self):
+        """Take over a tracker recorded by a previous supervisor, if that exact process still runs."""
+        try:
+            with open(self.pid_file, 'r') as f:
+                recorded = json.load(f)
+            process = psutil.Process(recorded["pid"])
+            if abs(process.create_time() - recorded["create_time"]) > 1:
+                raise psutil.NoSuchProcess(recorded["pid"])  # The pid was reused by something else
+            self._acquire_lock()
+        except (OSError, ValueError, KeyError, psutil.Error, RuntimeError):
+            return
+        self.process = process
+        self.started_at = process.create_time()
+        self.wanted = True
+        self.state = "running"
+        self._start_monitor()
+
+    # --- lifecycle ---
+
+    def _spawn(self):
+        self.process = subprocess.Popen(self.command, cwd=os.path.dirname(TRACKER_SCRIPT))
+        self.started_at = time.time()
+        self._write_pid_file(self.process.pid, psutil.Process(self.process.pid).create_time())
+        self.state = "running"
+
+    def _start_monitor(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._watch, daemon=True)
+            self._monitor.start()
+
+    def start(self):
+        """Start the tracker. Returns False if it is already running."""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._acquire_lock()
+            self.wanted = True
+            self._spawn()
+            self._start_monitor()
+            return True
+
+    def stop(self, timeout=10):
+        """Stop the tracker and don't restart it. Returns False if it wasn't running."""
+        with self._lock:
+            self.wanted = False
+            self._wakeup.set()
+            process = self.process
+            was_running = self.is_running()
+            if was_running:
+                process.terminate()
+                try:
+                    process.wait(timeout)
+                except (subprocess.TimeoutExpired, psutil.TimeoutExpired):
+                    process.kill()
+            self.process = None
+            self.state = "stopped"
+            self._remove_pid_file()
+            self._release_lock()
+            return was_running
+
+    def is_running(self):
+        if self.process is None:
+            return False
+        if isinstance(self.process, subprocess.Popen):
+            return self.process.poll() is None
+        return self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE
+
+    def _exit_code(self):
+        if isinstance(self.process, subprocess.Popen):
+            return self.process.poll()
+        return None  # Not our child: the exit status isn't ours to collect
+
+    def _heartbeat(self):
+        """The heartbeat of the current tracker; one left by an earlier run doesn't count."""
+        heartbeat = read_heartbeat(self.heartbeat_file)
+        if heartbeat is None or self.process is None or heartbeat.get("pid") != self.process.pid:
+            return None
+        return heartbeat
+
+    def _stale_reason(self, heartbeat):
+        """
+        Why the tracker counts as hung, or None. The heartbeat thread can outlive
+        the threads doing the work, so the sampling loop's last tick and the
+        categorizer's last cycle must be recent too.
+        """
+        now = time.time()
+        if now - self.started_at < self.stale_after:
+            return None  # Still starting up
+        if heartbeat is None:
+            return "no heartbeat"
+        for field in HEARTBEAT_PROGRESS_FIELDS:
+            if now - heartbeat.get(field, 0) > self.stale_after:
+                return f"{field} is stale"
+        return None
+
+    def _watch(self):
+        """Restart the tracker when it dies with an error or its heartbeat goes stale."""
+        delay = self.restart_delay
+        while True:
+            self._wakeup.wait(HEARTBEAT_INTERVAL)
+            self._wakeup.clear()
+            with self._lock:
+                if not self.wanted:
+                    return
+                if self.is_running():
+                    reason = self._stale_reason(self._heartbeat())
+                    if reason is None:
+                        if time.time() - self.started_at > self.stable_after:
+                            delay = self.restart_delay
+                        continue
+                    print(f"Tracker looks hung ({reason}); restarting it")
+                    self.process.kill()
+                    self.process.wait()
+                    self.last_exit_code = self._exit_code()
+                else:
+                    self.last_exit_code = self._exit_code()
+                    if self.last_exit_code == 0:
+                        # Clean exit (e.g. "exit" typed at its prompt): respect it
+                        self.wanted = False
+                        self.state = "stopped"
+                        self._remove_pid_file()
+                        self._release_lock()
+                        return
+                self.state = "restarting"
+
+            print(f"Tracker exited with {self.last_exit_code}; restarting in {delay}s")
+            if self._wakeup.wait(delay):
+                self._wakeup.clear()
+            with self._lock:
+                if not self.wanted:
+                    return
+                if not self.is_running():  # start() may have beaten us to it
+                    self.restarts += 1
+                    self._spawn()
+            delay = min(delay * 2, self.max_restart_delay)
+
+    # --- status ---
+
+    def status(self):
+        """State, pid, uptime, restarts and the tracker's last heartbeat; no process scan."""
+        with self._lock:
+            running = self.is_running()
+            state = self.state if (running or self.state != "running") else "crashed"
+            status = {
+                "status": state,
+                "pid": self.process.pid if running else None,
+                "uptime": time.time() - self.started_at if running else None,
+                "restarts": self.restarts,
+                "last_exit_code": self.last_exit_code,
+            }
+            heartbeat = self._heartbeat() if running else None
+            reason = self._stale_reason(heartbeat) if running else "not running"
+        if heartbeat is not None:
+            status["heartbeat"] = dict(heartbeat, age=time.time() - heartbeat.get("time", 0))
+        status["healthy"] = heartbeat is not None and reason is None
+        if reason is not None:
+            status["unhealthy_reason"] = reason
+        return status
@@ -22,6 +22,8 @@ from autogen_agentchat.agents import CodeExecutorAgent
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from mem0 import Memory
 
+from embedding_cache import install_embedding_cache
+
 # ----------------------------------------------------------------------------
 # Load environment variables and configure logging
 # ----------------------------------------------------------------------------
@@ -54,6 +56,7 @@ MEMORY_CONFIG = {
     }
 }
 memory = Memory.from_config(MEMORY_CONFIG)
+install_embedding_cache(memory)
 
 # ----------------------------------------------------------------------------
 # Memory helper functions
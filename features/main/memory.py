@@ -1,5 +1,8 @@
 from openai import OpenAI
 from mem0 import Memory
+from mem0.configs.prompts import get_update_memory_messages
+from mem0.memory.telemetry import capture_event
+from mem0.memory.utils import get_fact_retrieval_messages, parse_messages, remove_code_blocks
 from dotenv import load_dotenv
 import os
 import logging
@@ -8,6 +11,13 @@ import pytz
 from datetime import datetime
 import hashlib
 import inspect
+import json
+import threading
+import time
+import copy
+from collections import OrderedDict
+
+from embedding_cache import embed_batch, install_embedding_cache
 
 # Optional: Reduce ChromaDB logs
 logging.getLogger("chromadb").setLevel(logging.ERROR)
@@ -30,8 +40,219 @@ CUSTOM_PROMPT = """## System Context
 """
 global model_client
 
+SEARCH_CACHE_SIZE = 256  # Cached search results kept per process
+SEARCH_CACHE_TTL = 300  # Seconds; bounds staleness from writes made by other processes
+DEDUPE_SCOPE_KEYS = ("user_id", "agent_id", "run_id", "category")  # A fact is a duplicate only within the same scope
+DEDUPE_SEED_LIMIT = 1000  # Stored memories read per user/agent/run to seed the hash index
+
 # Extend Memory class to add timestamped entries and custom categorization
 class EnhancedMemory(Memory):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Search results keyed by (user, query, filters, limit, generation). Every
+        # write bumps the writer's generation, so results cached before it are
+        # never served again.
+        self._search_cache = OrderedDict()
+        self._generations = {}
+        self._search_cache_lock = threading.Lock()
+        # Memories created by one add(), keyed by the thread running its
+        # _add_to_vector_store and inserted together when that returns
+        self._batches = {}
+        self._batches_lock = threading.Lock()
+        # (scope, content hash) -> memory id; each user/agent/run is seeded from
+        # its stored memories the first time it adds something
+        self._hash_index = {}
+        self._seeded_owners = set()
+        self._hash_index_lock = threading.Lock()
+
+    def _generation(self, user_id):
+        with self._search_cache_lock:
+            return self._generations.get(user_id, 0)
+
+    def _bump_generation(self, user_id):
+        with self._search_cache_lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if user_id is not None:
+                # Searches without a user filter can see this user's memories too
+                self._generations[None] = self._generations.get(None, 0) + 1
+
+    def _memory_user(self, memory_id):
+        try:
+            return self.vector_store.get(vector_id=memory_id).payload.get("user_id")
+        except Exception:
+            return None
+
+    def _cached_search(self, kind, query, filters, limit, compute):
+        user_id = filters.get("user_id")
+        key = (kind, user_id, query, json.dumps(filters, sort_keys=True, default=str), limit,
+               self._generation(user_id))
+        now = time.time()
+        with self._search_cache_lock:
+            cached = self._search_cache.get(key)
+            if cached is not None and now - cached[0] < SEARCH_CACHE_TTL:
+                self._search_cache.move_to_end(key)
+                return copy.deepcopy(cached[1])
+
+        result = compute()
+        with self._search_cache_lock:
+            self._search_cache[key] = (now, copy.deepcopy(result))
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return result
+
+    def search(self, query, user_id=None, agent_id=None, run_id=None, limit=100, filters=None):
+        filters = dict(filters or {})
+        if user_id:
+            filters["user_id"] = user_id
+        if agent_id:
+            filters["agent_id"] = agent_id
+        if run_id:
+            filters["run_id"] = run_id
+        return self._cached_search(
+            "search", query, filters, limit,
+            lambda: super(EnhancedMemory, self).search(query=query, limit=limit, filters=dict(filters)),
+        )
+
+    def _update_memory(self, memory_id, data, existing_embeddings, metadata=None):
+        user_id = self._memory_user(memory_id)
+        try:
+            return super()._update_memory(memory_id, data, existing_embeddings, metadata)
+        finally:
+            self._forget_hash(memory_id)
+            self._bump_generation(user_id)
+
+    def _delete_memory(self, memory_id):
+        user_id = self._memory_user(memory_id)
+        try:
+            return super()._delete_memory(memory_id)
+        finally:
+            self._forget_hash(memory_id)
+            self._bump_generation(user_id)
+
+    def reset(self):
+        super().reset()
+        with self._hash_index_lock:
+            self._hash_index.clear()
+            self._seeded_owners.clear()
+        with self._search_cache_lock:
+            self._search_cache.clear()
+            self._generations = {user_id: generation + 1 for user_id, generation in self._generations.items()}
+
+    def _add_to_vector_store(self, messages, metadata, filters, infer):
+        """
+        Memory._add_to_vector_store (mem0 0.1.95) with its embedding and writes
+        batched: the extracted facts (or, without inference, the messages) are
+        embedded in one call up front, and the memories _create_memory makes are
+        inserted together in one write when this returns. Memory.add runs it on
+        an executor thread, so the pending batch is keyed by thread.
+        """
+        batch = {"memories": [], "embeddings": {}}
+        with self._batches_lock:
+            self._batches[threading.get_ident()] = batch
+        try:
+            if not infer:
+                return self._add_messages(messages, metadata)
+            return self._add_facts(messages, metadata, filters)
+        finally:
+            with self._batches_lock:
+                del self._batches[threading.get_ident()]
+            self._insert_memories(batch["memories"], batch["embeddings"])
+
+    def _embed_all(self, texts):
+        """{text: vector} for texts, embedded in one batched request."""
+        texts = list(dict.fromkeys(texts))
+        return dict(zip(texts, embed_batch(self.embedding_model, texts, "add")))
+
+    def _add_messages(self, messages, metadata):
+        contents = [message["content"] for message in messages if message["role"] != "system"]
+        embeddings = self._embed_all(contents)
+        returned_memories = []
+        for content in contents:
+            memory_id = self._create_memory(content, embeddings[content], metadata)
+            returned_memories.append({"id": memory_id, "memory": content, "event": "ADD"})
+        return returned_memories
+
+    def _add_facts(self, messages, metadata, filters):
+        parsed_messages = parse_messages(messages)
+        if self.config.custom_fact_extraction_prompt:
+            system_prompt = self.config.custom_fact_extraction_prompt
+            user_prompt = f"Input:\n{parsed_messages}"
+        else:
+            system_prompt, user_prompt = get_fact_retrieval_messages(parsed_messages)
+
+        response = self.llm.generate_response(
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            response_format={"type": "json_object"},
+        )
+        try:
+            new_retrieved_facts = json.loads(remove_code_blocks(response))["facts"]
+        except Exception as e:
+            logging.error(f"Error in new_retrieved_facts: {e}")
+            new_retrieved_facts = []
+
+        # One embedding request for every fact; mem0 embeds them one at a time
+        new_message_embeddings = self._embed_all(new_retrieved_facts)
+        retrieved_old_memory = {}
+        for fact in new_retrieved_facts:
+            for mem in self.vector_store.search(query=fact, vectors=new_message_embeddings[fact], limit=5,
+                                                filters=filters):
+                retrieved_old_memory[mem.id] = {"id": mem.id, "text": mem.payload["data"]}
+        retrieved_old_memory = list(retrieved_old_memory.values())
+        logging.info(f"Total existing memories: {len(retrieved_old_memory)}")
+
+        # Integers stand in for the UUIDs in the prompt, so hallucinated ids are caught
+        temp_uuid_mapping = {}
+        for idx, item in enumerate(retrieved_old_memory):
+            temp_uuid_mapping[str(idx)] = item["id"]
+            item["id"] = str(idx)
+
+        function_calling_prompt = get_update_memory_messages(
+            retrieved_old_memory, new_retrieved_facts, self.config.custom_update_memory_prompt
+        )
+        try:
+            new_memories_with_actions = self.llm.generate_response(
+                messages=[{"role": "user", "content": function_calling_prompt}],
+                response_format={"type": "json_object"},
+            )
+            new_memories_with_actions = json.loads(remove_code_blocks(new_memories_with_actions))
+        except Exception as e:
+            logging.error(f"Error in new_memories_with_actions: {e}")
+            new_memories_with_actions = {}
+
+        returned_memories = []
+        for resp in new_memories_with_actions.get("memory", []):
+            logging.info(resp)
+            try:
+                event, text = resp.get("event"), resp.get("text")
+                if not text:
+                    logging.info("Skipping memory entry because of empty `text` field.")
+                elif event == "ADD":
+                    memory_id = self._create_memory(data=text, existing_embeddings=new_message_embeddings,
+                                                    metadata=metadata)
+                    returned_memories.append({"id": memory_id, "memory": text, "event": event})
+                elif event == "UPDATE":
+                    memory_id = temp_uuid_mapping[resp["id"]]
+                    self._update_memory(memory_id=memory_id, data=text, existing_embeddings=new_message_embeddings,
+                                        metadata=metadata)
+                    returned_memories.append({"id": memory_id, "memory": text, "event": event,
+                                              "previous_memory": resp.get("old_memory")})
+                elif event == "DELETE":
+                    memory_id = temp_uuid_mapping[resp["id"]]
+                    self._delete_memory(memory_id=memory_id)
+                    returned_memories.append({"id": memory_id, "memory": text, "event": event})
+                else:
+                    logging.info("NOOP for Memory.")
+            except Exception as e:
+                logging.error(f"Error in new_memories_with_actions: {e}")
+
+        capture_event("mem0.add", self, {"version": self.api_version, "keys": list(filters.keys()), "sync_type": "sync"})
+        return returned_memories
+
+    def _current_batch(self):
+        with self._batches_lock:
+            return self._batches.get(threading.get_ident())
+
     def _create_memory(self, data, existing_embeddings, metadata=None):
         logging.debug(f"Creating memory with {data=}")
         
@@ -40,20 +261,12 @@ class EnhancedMemory(Memory):
         day_of_week = now.strftime("%A")
         timestamp = now.isoformat()
         
-        # Prepend timestamp and day to the content
-        timestamped_data = f"[{day_of_week}, {timestamp}] {data}"
-        
-        if data in existing_embeddings:
-            # We need to re-embed with the timestamped data
-            embeddings = self.embedding_model.embed(timestamped_data, memory_action="add")
-        else:
-            embeddings = self.embedding_model.embed(timestamped_data, memory_action="add")
-        
+        # The timestamp lives in metadata only, so the embedded text (and its
+        # vector) is the same whenever the same fact is stated
         memory_id = str(uuid.uuid4())
-        metadata = metadata or {}
-        metadata["data"] = timestamped_data
-        metadata["original_data"] = data  # Store the original data too
-        metadata["hash"] = hashlib.md5(timestamped_data.encode()).hexdigest()
+        metadata = dict(metadata or {})  # Memory.add passes one dict for every fact
+        metadata["data"] = data
+        metadata["hash"] = hashlib.md5(data.encode()).hexdigest()
         metadata["created_at"] = timestamp
         
         # Store time data as flat keys instead of nested dictionary
@@ -65,13 +278,110 @@ class EnhancedMemory(Memory):
         metadata["time_hour"] = now.hour
         metadata["time_minute"] = now.minute
 
+        # A fact already stored in this scope only has its last-seen time refreshed
+        duplicate_id = self._find_duplicate(metadata, timestamp)
+        if duplicate_id is not None:
+            logging.debug(f"Memory {duplicate_id} already holds {data=}")
+            return duplicate_id
+
+        # Memory.add passes {fact: vector} for the facts it already embedded, but a bare vector when infer=False
+        if not isinstance(existing_embeddings, dict):
+            existing_embeddings = {data: existing_embeddings} if existing_embeddings else {}
+
+        batch = self._current_batch()
+        if batch is not None:
+            batch["memories"].append((memory_id, data, metadata))
+            batch["embeddings"].update(existing_embeddings)
+        else:
+            self._insert_memories([(memory_id, data, metadata)], existing_embeddings)
+        return memory_id
+
+    def _insert_memories(self, memories, existing_embeddings):
+        """Embed whatever isn't in existing_embeddings in one call, then insert all memories in one write."""
+        if not memories:
+            return
+        missing = list(dict.fromkeys(data for _, data, _ in memories if data not in existing_embeddings))
+        embedded = dict(existing_embeddings)
+        embedded.update(zip(missing, embed_batch(self.embedding_model, missing, "add")))
+
         self.vector_store.insert(
-            vectors=[embeddings],
-            ids=[memory_id],
-            payloads=[metadata],
+            vectors=[embedded[data] for _, data, _ in memories],
+            ids=[memory_id for memory_id, _, _ in memories],
+            payloads=[metadata for _, _, metadata in memories],
         )
-        self.db.add_history(memory_id, None, timestamped_data, "ADD", created_at=metadata["created_at"])
-        return memory_id        
+        for memory_id, data, metadata in memories:
+            self.db.add_history(memory_id, None, data, "ADD", created_at=metadata["created_at"])
+        with self._hash_index_lock:
+            for memory_id, _, metadata in memories:
+                self._hash_index[self._hash_key(metadata)] = memory_id
+        for user_id in {metadata.get("user_id") for _, _, metadata in memories}:
+            self._bump_generation(user_id)
+
+    @staticmethod
+    def _hash_key(metadata):
+        scope = {key: metadata[key] for key in DEDUPE_SCOPE_KEYS if key in metadata}
+        return json.dumps(scope, sort_keys=True, default=str), metadata["hash"]
+
+    def _forget_hash(self, memory_id):
+        with self._hash_index_lock:
+            for key in [key for key, indexed_id in self._hash_index.items() if indexed_id == memory_id]:
+                del self._hash_index[key]
+
+    def _seed_hash_index(self, metadata):
+        """Index the content hashes of the owner's stored memories, once per owner."""
+        owner = {key: metadata[key] for key in ("user_id", "agent_id", "run_id") if key in metadata}
+        owner_key = json.dumps(owner, sort_keys=True, default=str)
+        with self._hash_index_lock:
+            if owner_key in self._seeded_owners:
+                return
+        try:
+            stored = self.get_all(limit=DEDUPE_SEED_LIMIT, **owner)
+        except Exception as e:
+            logging.warning(f"Could not seed the memory hash index for {owner}: {e}")
+            return
+        with self._hash_index_lock:
+            for item in stored["results"] if isinstance(stored, dict) else stored:
+                if item.get("hash"):
+                    item_metadata = dict(item.get("metadata") or {}, hash=item["hash"])
+                    item_metadata.update((key, item[key]) for key in owner if key in item)
+                    self._hash_index.setdefault(self._hash_key(item_metadata), item["id"])
+            self._seeded_owners.add(owner_key)
+
+    def _find_duplicate(self, metadata, timestamp):
+        """
+        Id of a memory with the same content hash in the same scope, or None.
+        A stored duplicate gets last_seen_at and seen_count refreshed; one
+        still pending in this add() is simply reused.
+        """
+        key = self._hash_key(metadata)
+        for memory_id, _, pending in (self._current_batch() or {}).get("memories", []):
+            if self._hash_key(pending) == key:
+                return memory_id
+
+        self._seed_hash_index(metadata)
+        with self._hash_index_lock:
+            memory_id = self._hash_index.get(key)
+        if memory_id is not None and self._touch_memory(memory_id, timestamp):
+            return memory_id
+        return None
+
+    def _touch_memory(self, memory_id, timestamp):
+        """
+        Record that an existing memory was stated again. False if it no longer
+        exists. Content is unchanged, so cached searches stay valid.
+        """
+        try:
+            existing = self.vector_store.get(vector_id=memory_id)
+        except Exception:
+            existing = None
+        if existing is None:
+            self._forget_hash(memory_id)
+            return False
+        payload = dict(existing.payload)
+        payload["last_seen_at"] = timestamp
+        payload["seen_count"] = payload.get("seen_count", 1) + 1
+        self.vector_store.update(vector_id=memory_id, payload=payload)
+        return True
 
     def save_categorized_memory(
         self,
@@ -176,27 +486,31 @@ class EnhancedMemory(Memory):
             return self.search(query=query, filters=filters, limit=limit)
         else:
             # If no query, get all memories with this category
-            memories = self.vector_store.list(filters=filters, limit=limit)[0]
+            return self._cached_search("category", None, filters, limit, lambda: self._list_category(filters, limit))
+
+    def _list_category(self, filters, limit):
+        """Category memories formatted like search results."""
+        memories = self.vector_store.list(filters=filters, limit=limit)[0]
+        
+        # Format results similar to search results
+        results = []
+        for mem in memories:
+            memory_item = {
+                "id": mem.id,
+                "memory": mem.payload["data"],
+                "created_at": mem.payload.get("created_at"),
+                "updated_at": mem.payload.get("updated_at"),
+            }
             
-            # Format results similar to search results
-            results = []
-            for mem in memories:
-                memory_item = {
-                    "id": mem.id,
-                    "memory": mem.payload["data"],
-                    "created_at": mem.payload.get("created_at"),
-                    "updated_at": mem.payload.get("updated_at"),
-                }
-                
-                # Add metadata if available
-                excluded_keys = {"user_id", "agent_id", "run_id", "hash", "data", "created_at", "updated_at", "id"}
-                metadata = {k: v for k, v in mem.payload.items() if k not in excluded_keys}
-                if metadata:
-                    memory_item["metadata"] = metadata
-                
-                results.append(memory_item)
+            # Add metadata if available
+            excluded_keys = {"user_id", "agent_id", "run_id", "hash", "data", "created_at", "updated_at", "id"}
+            metadata = {k: v for k, v in mem.payload.items() if k not in excluded_keys}
+            if metadata:
+                memory_item["metadata"] = metadata
             
-            return {"results": results}
+            results.append(memory_item)
+        
+        return {"results": results}
 
 # Configure persistent memory with ChromaDB
 config = {
@@ -210,6 +524,14 @@ config = {
 }
 
 memory = EnhancedMemory.from_config(config)
+install_embedding_cache(memory)
+
+def format_memory(entry):
+    """A memory with its day and time prefixed, as older entries stored it in the text itself."""
+    metadata = entry.get("metadata") or {}
+    if "time_day" in metadata and "time_timestamp" in metadata and "original_data" not in metadata:
+        return f"[{metadata['time_day']}, {metadata['time_timestamp']}] {entry['memory']}"
+    return entry["memory"]
 
 def view_memories(user_id="default_user"):
     all_memories = memory.get_all(user_id=user_id)
@@ -226,7 +548,7 @@ def view_category_memories(category, user_id="default_user"):
 def chat_with_memories(message: str, user_id: str = "default_user") -> str:
     # Retrieve relevant memories
     relevant_memories = memory.search(query=message, user_id=user_id, limit=3)
-    memories_str = "\n".join(f"- {entry['memory']}" for entry in relevant_memories["results"])
+    memories_str = "\n".join(f"- {format_memory(entry)}" for entry in relevant_memories["results"])
     
     # Generate Assistant response
     system_prompt = (
@@ -265,13 +587,13 @@ def chat_with_memories(message: str, user_id: str = "default_user") -> str:
 def get_relevant_memories(query: str, user_id: str = "default_user") -> str:
     """Get relevant memories for a query from the memory store."""
     relevant_memories = memory.search(query=query, user_id=user_id, limit=3)
-    memories_str = "\n".join(f"- {entry['memory']}" for entry in relevant_memories["results"])
+    memories_str = "\n".join(f"- {format_memory(entry)}" for entry in relevant_memories["results"])
     return memories_str
 
 def get_category_memories(category: str, user_id: str = "default_user") -> str:
     """Get memories from a specific category."""
     categorized_memories = memory.search_by_category(category=category, user_id=user_id)
-    memories_str = "\n".join(f"- {entry['memory']}" for entry in categorized_memories["results"])
+    memories_str = "\n".join(f"- {format_memory(entry)}" for entry in categorized_memories["results"])
     return memories_str
 
 def add_timestamped_memory(messages, user_id: str = "default_user"):
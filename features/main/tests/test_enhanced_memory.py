@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+
+import types
+
+import pytest
+
+os.environ["MEM0_TELEMETRY"] = "False"  # Read when mem0 is first imported
+pytest.importorskip("mem0")
+pytest.importorskip("chromadb")
+pytest.importorskip("embedding_cache")
+
+
+class StubEmbedder:
+    """Records each embedding request; embed() and the batched client both count as one call."""
+
+    def __init__(self):
+        self.config = types.SimpleNamespace(model="stub", embedding_dims=3)
+        self.client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=self._create))
+        self.calls = []
+
+    @staticmethod
+    def _vector(text):
+        return [float(len(text)), 1.0, 0.0]
+
+    def embed(self, text, memory_action=None):
+        self.calls.append([text])
+        return self._vector(text)
+
+    def _create(self, input, model, **options):
+        self.calls.append(list(input))
+        return types.SimpleNamespace(data=[types.SimpleNamespace(index=i, embedding=self._vector(text))
+                                           for i, text in enumerate(input)])
+
+
+class StubLLM:
+    """Extracts the facts given to it and answers ADD for each."""
+
+    def __init__(self, facts):
+        self.facts = facts
+
+    def generate_response(self, messages, response_format=None, **kwargs):
+        if messages[0]["role"] == "system":
+            return json.dumps({"facts": self.facts})
+        return json.dumps({"memory": [{"id": str(i), "text": fact, "event": "ADD"} for i, fact in enumerate(self.facts)]})
+
+
+@pytest.fixture
+def memory_module(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("EMBEDDING_CACHE_DB", str(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.chdir(tmp_path)  # The module opens ./chroma_db on import
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    sys.modules.pop("memory", None)
+    import memory
+    yield memory
+    sys.modules.pop("memory", None)
+
+
+@pytest.fixture
+def enhanced_memory(memory_module, tmp_path):
+    memory = memory_module.EnhancedMemory.from_config({
+        "vector_store": {"provider": "chroma", "config": {"collection_name": "test", "path": str(tmp_path / "db")}},
+        "history_db_path": str(tmp_path / "history.db"),
+    })
+    memory.embedding_model = StubEmbedder()
+    inserts = []
+    insert = memory.vector_store.insert
+
+    def counting_insert(vectors, payloads=None, ids=None):
+        inserts.append(ids)
+        return insert(vectors=vectors, payloads=payloads, ids=ids)
+
+    memory.vector_store.insert = counting_insert
+    return memory, inserts
+
+
+def test_add_inserts_all_facts_in_one_write(enhanced_memory):
+    memory, inserts = enhanced_memory
+    facts = ["Uses VS Code", "Prefers dark themes", "Writes Python"]
+    memory.llm = StubLLM(facts)
+
+    result = memory.add("I use VS Code with a dark theme and write Python", user_id="u1")
+
+    assert len(inserts) == 1
+    assert len(inserts[0]) == len(facts)
+    assert sorted(item["memory"] for item in result["results"]) == sorted(facts)
+    # All facts went out in one embedding request, and those vectors were reused
+    assert len(memory.embedding_model.calls) == 1
+    assert sorted(memory.embedding_model.calls[0]) == sorted(facts)
+
+
+def test_add_without_inference_inserts_once(enhanced_memory):
+    memory, inserts = enhanced_memory
+    memory.add([{"role": "user", "content": "Uses VS Code"}, {"role": "user", "content": "Writes Python"}],
+               user_id="u1", infer=False)
+
+    assert len(inserts) == 1
+    assert len(inserts[0]) == 2
+    assert memory.embedding_model.calls == [["Uses VS Code", "Writes Python"]]
+
+
+def test_repeated_fact_refreshes_instead_of_inserting(enhanced_memory):
+    memory, inserts = enhanced_memory
+    memory.llm = StubLLM(["My IDE is VS Code"])
+    first = memory.add("My IDE is VS Code", user_id="u1")["results"][0]["id"]
+    second = memory.add("My IDE is VS Code", user_id="u1")["results"][0]["id"]
+
+    assert second == first
+    assert len(inserts) == 1
+    stored = memory.vector_store.get(vector_id=first).payload
+    assert stored["seen_count"] == 2
+    assert "last_seen_at" in stored
+
+
+def test_duplicates_are_found_in_a_fresh_process(enhanced_memory, memory_module, tmp_path):
+    memory, inserts = enhanced_memory
+    memory.add([{"role": "user", "content": "Writes Python"}], user_id="u1", infer=False)
+
+    restarted = memory_module.EnhancedMemory.from_config({
+        "vector_store": {"provider": "chroma", "config": {"collection_name": "test", "path": str(tmp_path / "db")}},
+        "history_db_path": str(tmp_path / "history.db"),
+    })
+    restarted.embedding_model = StubEmbedder()
+    restarted.add([{"role": "user", "content": "Writes Python"}], user_id="u1", infer=False)
+    restarted.add([{"role": "user", "content": "Writes Python"}], user_id="u2", infer=False)
+
+    assert len(restarted.get_all(user_id="u1")["results"]) == 1
+    assert len(restarted.get_all(user_id="u2")["results"]) == 1
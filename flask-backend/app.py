@@ -1,14 +1,16 @@
 import os
+import threading
 from autogen import GroupChat, GroupChatManager, register_function
 from flask import Flask
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from change_feed import DEBOUNCE_SECONDS, ChangeFeed, Debouncer
 from agents import make_bash_agent, make_env_agent, make_human_agent, make_manager_agent
 from config import openai_client
-from memory import add_memory, get_relevant_memories, view_memories
+from memory import add_memory, get_memories_by_category, view_memories
 from tools import execute_command, generate_command, open_youtube_video
 
 
@@ -20,34 +22,83 @@ socketio = SocketIO(
     logger=True,
     engineio_logger=True
 )
-WATCHED_FILE = os.path.abspath(
-    os.path.join(os.path.dirname(__file__),
-                 "../scripts/logs\categorized_log.json")
-)
+USAGE_ROOM = "usage_changes"
 
 
 class FileChangeHandler(FileSystemEventHandler):
-    def __init__(self, socketio_instance):
+    def __init__(self, socketio_instance, feed):
         self.socketio = socketio_instance
+        self.feed = feed
+        # Subscribers catch up from their own cursor; broadcasts start at what is new now
+        self.cursor = feed.size()
+        self.lock = threading.Lock()
+        self.debouncer = Debouncer(DEBOUNCE_SECONDS, self.emit_file_on_change_event)
 
 
     def on_modified(self, event):
-        src = os.path.abspath(event.src_path)
-        # print(f"src_path -> {src}")
-        # print(f"watched file -> {WATCHED_FILE}")
-        if src == WATCHED_FILE:
-            print(f"File {event.src_path} has been modified!")
-            self.emit_file_on_change_event()
-    
+        if os.path.abspath(event.src_path) == self.feed.path:
+            self.debouncer.trigger()
 
-    def emit_file_on_change_event(self):
-        # print("Emitting....")
-        with open("../scripts/logs/categorized_log.json", 'r') as file:
-            data = file.read()
-            socketio.emit('file_change', {'content': data})
-        # emit('new_change', {'status': 'File changed and updated'})
+    on_created = on_modified
+
+    def on_moved(self, event):
+        # Rotation replaces the change file with a new one
+        if os.path.abspath(event.dest_path) == self.feed.path:
+            self.debouncer.trigger()
 
 
+    def send_since(self, cursor, send, limit=None):
+        """Send the feed after cursor (up to limit) as usage_delta batches; return the cursor reached"""
+        while True:
+            entries, new_cursor, reset = self.feed.read(cursor, limit)
+            if entries or reset:
+                send('usage_delta', {'entries': entries, 'from': new_cursor if reset else cursor,
+                                     'cursor': new_cursor, 'reset': reset})
+            if new_cursor == cursor and not reset:
+                return cursor
+            cursor = new_cursor
+
+
+    def emit_file_on_change_event(self):
+        """Broadcast only the entries appended since the last broadcast"""
+        with self.lock:
+            self.cursor = self.send_since(
+                self.cursor, lambda name, payload: self.socketio.emit(name, payload, to=USAGE_ROOM))
+
+
+change_feed = ChangeFeed()
+file_change_handler = FileChangeHandler(socketio, change_feed)
+
+
+def parse_cursor(value):
+    """A feed cursor from the client: a non-negative integer (or its digits), else None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= 0 else None
+    if isinstance(value, str) and value.strip().isdecimal():
+        return int(value)
+    return None
+
+
+@socketio.on('subscribe_changes')
+def handle_subscribe_changes(data=None):
+    """
+    Join the usage change feed. A reconnecting client passes {'cursor': n} from
+    its last usage_delta and first receives everything it missed; without a
+    cursor it only gets entries appended from now on. A cursor that isn't a
+    valid offset is treated as none, and usage_subscribed says reset so the
+    client reloads in full.
+    """
+    data = data if isinstance(data, dict) else {}
+    cursor = parse_cursor(data.get('cursor'))
+    with file_change_handler.lock:
+        if cursor is not None:
+            file_change_handler.send_since(cursor, emit, limit=file_change_handler.cursor)
+        join_room(USAGE_ROOM)
+        emit('usage_subscribed', {'cursor': file_change_handler.cursor,
+                                  'reset': data.get('cursor') is not None and cursor is None})
+
 
 @socketio.on('start_conversation')
 def handle_start_conversation(data):
@@ -98,9 +149,10 @@ def handle_start_conversation(data):
     )
 
     # build memory context
-    dev_ctx = get_relevant_memories(user_id, input_text, "dev_environment")
-    proj_ctx = get_relevant_memories(user_id, input_text, "project_preferences")
-    general_ctx = get_relevant_memories(user_id, input_text, None)
+    grouped = get_memories_by_category(user_id, input_text, ["dev_environment", "project_preferences", None])
+    dev_ctx = grouped["dev_environment"]
+    proj_ctx = grouped["project_preferences"]
+    general_ctx = grouped[None]
     memory_context = ""
 
     if dev_ctx:
@@ -131,10 +183,11 @@ def handle_start_conversation(data):
     ], user_id=user_id)
 
 
-def start_file_watcher(socketio_instance):
-    event_handler = FileChangeHandler(socketio_instance)
+def start_file_watcher(event_handler):
+    watched_dir = os.path.dirname(event_handler.feed.path)
+    os.makedirs(watched_dir, exist_ok=True)
     observer = Observer()
-    observer.schedule(event_handler, path="../scripts/logs", recursive=False)
+    observer.schedule(event_handler, path=watched_dir, recursive=False)
     observer.start()
     print("File watcher started.")
     return observer
@@ -146,7 +199,7 @@ def handle_disconnect():
 
 
 def run_server():
-    observer = start_file_watcher(socketio)
+    observer = start_file_watcher(file_change_handler)
     
     socketio.run(app, debug=True)
 
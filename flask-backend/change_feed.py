@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+
+# --- Tracker change feed ------------------------------------------------------
+# The tracker's categorizer appends every new or relabeled entry to
+# categorized_changes.jsonl. A client's cursor is the byte offset it has read
+# up to, so catching up or resuming after a reconnect reads only what was
+# appended since, never the whole log.
+#
+# The categorizer rotates the file once it grows past its size limit: the old
+# file becomes categorized_changes.jsonl.1 and the new one starts with a
+# {"base": n} header line, n being the offset its first entry continues from.
+# Offsets therefore keep growing across rotations, and a cursor that falls in
+# the rotated file is still served from it.
+CHANGES_FILE = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "scripts", "logs", "categorized_changes.jsonl")
+)
+ROTATED_SUFFIX = ".1"
+DEBOUNCE_SECONDS = 0.5  # Coalesce the burst of watchdog events a single write produces
+MAX_BATCH_BYTES = 1 << 20  # Largest slice of the feed sent in one emit
+
+
+def _read_header(f):
+    """(base offset, header length) of an open change file; files without a header start at 0"""
+    first = f.readline()
+    if first.startswith(b'{"base"'):
+        try:
+            return json.loads(first)["base"], len(first)
+        except (ValueError, KeyError):
+            pass
+    return 0, 0
+
+
+class ChangeFeed:
+    """Reads complete JSON lines appended to the change file after a given offset."""
+
+    def __init__(self, path=CHANGES_FILE):
+        self.path = path
+
+    def _open(self, path):
+        """(file, base, header length, end offset) of one change file, or None if it doesn't exist"""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        base, header = _read_header(f)
+        return f, base, header, base + os.fstat(f.fileno()).st_size - header
+
+    def size(self):
+        """Offset of the end of the feed"""
+        opened = self._open(self.path)
+        if opened is None:
+            return 0
+        opened[0].close()
+        return opened[3]
+
+    def read(self, cursor, limit=None, max_bytes=MAX_BATCH_BYTES):
+        """
+        Return (entries, new_cursor, reset) for lines after cursor, stopping at
+        limit (an offset) and after about max_bytes. A trailing partial line is
+        left for the next read. A cursor before the rotated file or past the end
+        of the feed can't be served (the file was recreated, or the reader fell
+        too far behind): nothing is read, reset is True, and new_cursor is where
+        the feed can be read from.
+        """
+        opened = self._open(self.path)
+        if opened is None:
+            return [], cursor, False
+        if cursor < opened[1]:
+            rotated = self._open(self.path + ROTATED_SUFFIX)
+            if rotated is not None and rotated[1] <= cursor < rotated[3] == opened[1]:
+                opened[0].close()
+                opened = rotated
+            else:
+                # Restart from the oldest entry still on disk
+                restart = opened[1]
+                if rotated is not None:
+                    rotated[0].close()
+                    if rotated[3] == opened[1]:
+                        restart = rotated[1]
+                opened[0].close()
+                return [], restart, True
+        f, base, header, size = opened
+        with f:
+            if cursor > size:
+                return [], base, True
+            limit = size if limit is None else min(limit, size)
+            if cursor >= limit:
+                return [], cursor, False
+
+            f.seek(cursor - base + header)
+            chunk = f.read(min(limit - cursor, max_bytes))
+            end = chunk.rfind(b"\n") + 1
+            if end == 0 and len(chunk) == max_bytes:
+                # A single line longer than max_bytes: read on to its end
+                f.seek(cursor - base + header)
+                chunk = f.readline()
+                end = len(chunk) if chunk.endswith(b"\n") else 0
+        entries = []
+        for line in chunk[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries, cursor + end, False
+
+
+class Debouncer:
+    """Runs callback once, delay seconds after the last of a burst of trigger() calls."""
+
+    def __init__(self, delay, callback):
+        self.delay = delay
+        self.callback = callback
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def trigger(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.callback)
+            self._timer.daemon = True
+            self._timer.start()
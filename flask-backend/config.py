@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from mem0 import Memory
 
+from embedding_cache import install_embedding_cache
+
 
 load_dotenv()
 
@@ -21,6 +23,8 @@ config = {
 }
 
 memory = Memory.from_config(config)
+# Repeated queries are answered from the on-disk embedding cache
+install_embedding_cache(memory)
 
 # Reduce ChromaDB logs
 logging.getLogger("chromadb").setLevel(logging.ERROR)
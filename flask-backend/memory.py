@@ -23,4 +23,39 @@ def get_relevant_memories(user_id, query, memory_category=None, limit=3):
     raw = response.get("results") or []
     if memory_category:
         raw = [r for r in raw if isinstance(r, dict) and r.get("metadata", {}).get("category")==memory_category]
-    return [r.get("memory") for r in raw[:limit] if r and r.get("memory")]
\ No newline at end of file
+    return [r.get("memory") for r in raw[:limit] if r and r.get("memory")]
+
+CATEGORY_FETCH_FACTOR = 3  # Hits fetched per requested category, so one busy category can't crowd out the rest
+
+
+def category_filter(user_id, categories):
+    """
+    Vector store filter for the user's memories in any of categories (all of them if
+    None, "any category", is among them). Chroma takes one operator per where clause,
+    so the conditions are combined with $and.
+    """
+    clauses = [{"user_id": user_id}]
+    named = [category for category in categories if category]
+    if named and None not in categories:
+        clauses.append({"category": {"$in": named}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def get_memories_by_category(user_id, query, categories, limit=3):
+    """
+    Top `limit` memories per category (None for any) in one retrieval: the query is
+    embedded once, the vector store is searched once for all the categories, and the
+    hits are grouped here by their category metadata. Returns {category: [memory]}.
+    """
+    vectors = memory.embedding_model.embed(query, "search")
+    hits = memory.vector_store.search(query=query, vectors=vectors, limit=limit * len(categories) * CATEGORY_FETCH_FACTOR,
+                                      filters=category_filter(user_id, categories))
+    grouped = {category: [] for category in categories}
+    for hit in hits:  # Best match first
+        data = hit.payload.get("data") if hit.payload else None
+        if not data:
+            continue
+        for category in dict.fromkeys((hit.payload.get("category"), None)):
+            if category in grouped and len(grouped[category]) < limit:
+                grouped[category].append(data)
+    return grouped
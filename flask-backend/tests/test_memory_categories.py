@@ -0,0 +1,84 @@
+import os
+import sys
+import types
+
+import pytest
+
+os.environ["MEM0_TELEMETRY"] = "False"  # Read when mem0 is first imported
+pytest.importorskip("mem0")
+pytest.importorskip("chromadb")
+pytest.importorskip("embedding_cache")
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class StubEmbedder:
+    def __init__(self):
+        self.config = types.SimpleNamespace(model="stub", embedding_dims=3)
+
+    def embed(self, text, memory_action=None):
+        return [1.0, 0.0, 0.0]
+
+
+@pytest.fixture
+def memory_module(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("EMBEDDING_CACHE_DB", str(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.chdir(tmp_path)  # config opens ./chroma_db on import
+    monkeypatch.syspath_prepend(BACKEND_DIR)
+    for name in ("config", "memory", "embedding_cache"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    # Chroma caches clients by path, and config's path is the relative ./chroma_db
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+    import memory
+    memory.memory.embedding_model = StubEmbedder()
+    yield memory
+    for name in ("config", "memory", "embedding_cache"):
+        sys.modules.pop(name, None)
+
+
+def store(memory_module, rows):
+    """Insert (user, category, text, vector) rows straight into the Chroma collection."""
+    memory_module.memory.vector_store.insert(
+        vectors=[vector for _, _, _, vector in rows],
+        payloads=[{"user_id": user, "category": category, "data": text} for user, category, text, _ in rows],
+        ids=[f"id-{i}" for i in range(len(rows))],
+    )
+
+
+def test_groups_hits_by_category_in_one_search(memory_module):
+    store(memory_module, [
+        ("alice", "dev_environment", "uses neovim", [1.0, 0.0, 0.0]),
+        ("alice", "dev_environment", "runs arch linux", [0.9, 0.1, 0.0]),
+        ("alice", "project_preferences", "prefers pytest", [0.8, 0.2, 0.0]),
+        ("alice", "default", "likes coffee", [0.95, 0.05, 0.0]),
+        ("bob", "dev_environment", "uses emacs", [1.0, 0.0, 0.0]),
+    ])
+    searches = []
+    search = memory_module.memory.vector_store.search
+
+    def counting_search(**kwargs):
+        searches.append(kwargs["filters"])
+        return search(**kwargs)
+
+    memory_module.memory.vector_store.search = counting_search
+
+    grouped = memory_module.get_memories_by_category(
+        "alice", "editor", ["dev_environment", "project_preferences", None], limit=2)
+
+    assert len(searches) == 1
+    assert grouped["dev_environment"] == ["uses neovim", "runs arch linux"]
+    assert grouped["project_preferences"] == ["prefers pytest"]
+    assert grouped[None] == ["uses neovim", "likes coffee"]
+
+
+def test_named_categories_are_filtered_in_the_store(memory_module):
+    store(memory_module, [
+        ("alice", "default", "likes coffee", [1.0, 0.0, 0.0]),
+        ("alice", "project_preferences", "prefers pytest", [0.5, 0.5, 0.0]),
+    ])
+
+    grouped = memory_module.get_memories_by_category("alice", "tests", ["project_preferences", "dev_environment"])
+
+    assert grouped == {"project_preferences": ["prefers pytest"], "dev_environment": []}
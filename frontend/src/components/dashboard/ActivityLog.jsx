@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { FaChrome, FaFirefox, FaWindows, FaCode, FaRegWindowMaximize } from 'react-icons/fa';
+import usageService from '../../services/usageService';
 
 const ActivityLog = ({ data: initialData }) => {
   const [activities, setActivities] = useState(initialData || []);
@@ -9,11 +10,7 @@ const ActivityLog = ({ data: initialData }) => {
   const fetchActivityData = async () => {
     try {
       setLoading(true);
-      const response = await fetch('/usage_log.json');
-      if (!response.ok) {
-        throw new Error(`Failed to fetch activity data: ${response.status}`);
-      }
-      const data = await response.json();
+      const data = await usageService.getTodayEvents();
       setActivities(data);
       setError(null);
     } catch (err) {
@@ -10,6 +10,7 @@ import DailyTip from '../../components/dashboard/DailyTip';
 import GmailOverview from '../../components/dashboard/GmailOverview';
 import TimeTrackingCard from '../../components/dashboard/TimeTrackingCard';
 import api from '../../services/api';
+import usageService from '../../services/usageService';
 
 // Create a context to hold the activity data without causing re-renders
 const ActivityDataContext = createContext(null);
@@ -157,23 +158,8 @@ const ActivityDataProvider = ({ children }) => {
       // Wait a moment for the backend to process the data
       await new Promise(resolve => setTimeout(resolve, 800));
       
-      // Now fetch the latest data with cache-busting
-      const timestamp = Date.now();
-      const url = `/categorized_log.json?nocache=${timestamp}`;
-      
-      const response = await fetch(url, {
-        cache: 'no-store',
-        headers: {
-          'Pragma': 'no-cache',
-          'Cache-Control': 'no-cache'
-        }
-      });
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error: ${response.status}`);
-      }
-      
-      const data = await response.json();
+      // Now fetch today's events from the usage API
+      const data = await usageService.getTodayEvents();
       updateData(data);
     } catch (error) {
       console.error('Error fetching data:', error);
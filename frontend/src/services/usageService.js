@@ -0,0 +1,56 @@
+/**
+ * Usage data from the tracker API (backend/api.py), which serves events and
+ * totals straight from the event store and archive.
+ */
+
+const USAGE_API = '/api/usage';
+
+// Local calendar day as the API expects it (YYYY-MM-DD)
+const toDay = (date) => {
+  const pad = (n) => String(n).padStart(2, '0');
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}`;
+};
+
+const getJson = async (path, params) => {
+  const query = new URLSearchParams(Object.entries(params).filter(([, value]) => value != null));
+  // Default caching: the browser revalidates with the ETag and an unchanged store answers 304
+  const response = await fetch(`${USAGE_API}${path}?${query}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error: ${response.status}`);
+  }
+  return response.json();
+};
+
+const usageService = {
+  /**
+   * Every event in [from, to], following the API's pagination to the end
+   */
+  async getEvents({ from, to } = {}) {
+    const events = [];
+    let cursor = null;
+    do {
+      const page = await getJson('/events', { from, to, cursor });
+      events.push(...page.events);
+      cursor = page.next_cursor;
+    } while (cursor != null);
+    return events;
+  },
+
+  /**
+   * Today's events, categorized
+   */
+  async getTodayEvents() {
+    const today = toDay(new Date());
+    return this.getEvents({ from: today, to: today });
+  },
+
+  /**
+   * Active seconds per category in [from, to]
+   */
+  async getTotals({ from, to } = {}) {
+    const data = await getJson('/totals', { from, to });
+    return data.totals;
+  }
+};
+
+export default usageService;
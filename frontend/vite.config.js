@@ -12,6 +12,15 @@ export default defineConfig({
     port: 5173,
     open: true,
     proxy: {
+      // Usage data and tracker control come from the Flask API (backend/api.py)
+      '/api/usage': {
+        target: 'http://localhost:5000',
+        changeOrigin: true,
+      },
+      '/api/tracking': {
+        target: 'http://localhost:5000',
+        changeOrigin: true,
+      },
       '/api': {
         target: 'http://localhost:3000',
         changeOrigin: true,
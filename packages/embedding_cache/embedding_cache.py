@@ -0,0 +1,175 @@
+"""
+Persistent cache in front of mem0's embedder.
+
+Every mem0 search embeds its query over the network. CachedEmbedder keys each
+vector by embedding model, memory action ("add", "search", ...) and the exact
+text, and keeps the vectors in one SQLite file, so repeated prompts skip the
+embedding call, in this process and in every other one that shares the file.
+The cache is bounded: past max_entries the least recently used vectors are
+evicted.
+
+scripts/, features/, features/main/ and flask-backend/ are separate programs
+that all import this one module; install it once into the environment they run
+in (the req.txt files list it too). They share the same cache file
+(EMBEDDING_CACHE_DB in the environment overrides it):
+
+    pip install -e packages/embedding_cache
+
+    memory = Memory.from_config(config)
+    install_embedding_cache(memory)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB") or os.path.join(
+    os.path.expanduser("~"), ".cache", "mem0_embeddings", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = 20000
+EVICT_EVERY = 100  # inserts between eviction passes
+
+
+def embedding_key(model, memory_action, text):
+    # Exact text: embeddings are case- and whitespace-sensitive, so near-duplicates get their own vectors
+    return hashlib.sha1(f"{model}\0{memory_action}\0{text}".encode("utf-8")).hexdigest()
+
+
+def embed_batch(embedder, texts, memory_action=None):
+    """
+    Embed texts in one request where possible: OpenAI embedders take the whole
+    list at once, a CachedEmbedder embeds only its misses, and anything else
+    falls back to one embed() call per text.
+    """
+    if not texts:
+        return []
+    if hasattr(embedder, "embed_many"):
+        return embedder.embed_many(texts, memory_action)
+    client = getattr(embedder, "client", None)
+    config = getattr(embedder, "config", None)
+    if client is not None and hasattr(client, "embeddings") and getattr(config, "model", None):
+        options = {"dimensions": config.embedding_dims} if getattr(config, "embedding_dims", None) else {}
+        response = client.embeddings.create(input=[text.replace("\n", " ") for text in texts],
+                                            model=config.model, **options)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return [embedder.embed(text, memory_action) for text in texts]
+
+
+class EmbeddingCache:
+    """SQLite map of (model, memory action, text) -> float32 vector, LRU-bounded and safe to share between processes."""
+
+    def __init__(self, path=EMBEDDING_CACHE_DB, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, model, memory_action, texts):
+        """Cached vectors for texts, as a list aligned with texts (None where missing)."""
+        keys = [embedding_key(model, memory_action, text) for text in texts]
+        with self._lock:
+            found = {}
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+            vectors = [list(array("f", found[key])) if key in found else None for key in keys]
+            hits = sum(1 for vector in vectors if vector is not None)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def get(self, model, memory_action, text):
+        return self.get_many(model, memory_action, [text])[0]
+
+    def put_many(self, model, memory_action, texts, vectors):
+        now = time.time()
+        rows = [(embedding_key(model, memory_action, text), model, array("f", vector).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._inserts += len(rows)
+            if self._inserts >= EVICT_EVERY:
+                self._inserts = 0
+                self._evict()
+
+    def put(self, model, memory_action, text, vector):
+        self.put_many(model, memory_action, [text], [vector])
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class CachedEmbedder:
+    """
+    Wraps a mem0 embedder (anything with embed(text, memory_action)) and answers
+    from the cache when it can. Other attributes pass through to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, cache=None):
+        self.embedder = embedder
+        self.cache = cache or EmbeddingCache()
+        config = getattr(embedder, "config", None)
+        self.model = f"{type(embedder).__name__}:{getattr(config, 'model', None)}"
+
+    def embed(self, text, memory_action=None):
+        vector = self.cache.get(self.model, memory_action, text)
+        if vector is None:
+            vector = self.embedder.embed(text, memory_action)
+            self.cache.put(self.model, memory_action, text, vector)
+        return vector
+
+    def embed_many(self, texts, memory_action=None):
+        """Vectors for texts; cache misses are embedded together in one batched request."""
+        vectors = self.cache.get_many(self.model, memory_action, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, embed_batch(self.embedder, missing, memory_action)))
+            self.cache.put_many(self.model, memory_action, missing, [embedded[text] for text in missing])
+            vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def stats(self):
+        return self.cache.stats()
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+
+def install_embedding_cache(memory, cache=None):
+    """Put a CachedEmbedder in front of memory.embedding_model (once) and return it."""
+    if not isinstance(memory.embedding_model, CachedEmbedder):
+        memory.embedding_model = CachedEmbedder(memory.embedding_model, cache)
+    return memory.embedding_model
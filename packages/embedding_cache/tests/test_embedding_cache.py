@@ -0,0 +1,46 @@
+import types
+
+from embedding_cache import EmbeddingCache, install_embedding_cache
+
+
+class StubEmbedder:
+    def __init__(self):
+        self.config = types.SimpleNamespace(model="stub")
+        self.calls = []
+
+    def embed(self, text, memory_action=None):
+        self.calls.append((text, memory_action))
+        return [float(len(text)), float(len(self.calls))]
+
+
+def cached_memory(tmp_path):
+    memory = types.SimpleNamespace(embedding_model=StubEmbedder())
+    install_embedding_cache(memory, EmbeddingCache(str(tmp_path / "cache.sqlite3")))
+    return memory
+
+
+def test_repeated_text_is_served_from_the_cache(tmp_path):
+    memory = cached_memory(tmp_path)
+    first = memory.embedding_model.embed("Writes Python", "search")
+
+    assert memory.embedding_model.embed("Writes Python", "search") == first
+    assert memory.embedding_model.embedder.calls == [("Writes Python", "search")]
+
+
+def test_key_is_the_exact_text_and_action(tmp_path):
+    memory = cached_memory(tmp_path)
+    for text, action in [("Writes Python", "search"), ("writes  python", "search"), ("Writes Python", "add")]:
+        memory.embedding_model.embed(text, action)
+
+    assert len(memory.embedding_model.embedder.calls) == 3
+    assert memory.embedding_model.stats()["entries"] == 3
+
+
+def test_embed_many_embeds_only_the_misses(tmp_path):
+    memory = cached_memory(tmp_path)
+    memory.embedding_model.embed("Uses VS Code", "add")
+
+    vectors = memory.embedding_model.embed_many(["Uses VS Code", "Writes Python", "Writes Python"], "add")
+
+    assert memory.embedding_model.embedder.calls == [("Uses VS Code", "add"), ("Writes Python", "add")]
+    assert vectors[1] == vectors[2]
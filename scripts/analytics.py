@@ -0,0 +1,317 @@
+"""
+Vectorized usage analytics over the tracker history.
+
+Loads events once into NumPy columns (archived partitions plus the events the
+archive doesn't hold yet) and computes focus sessions, context-switch rates,
+an hourly heatmap and per-app streaks without a Python loop per event.
+Sessions follow the rollups rule: an "active" event opens a session that the
+next event of any kind closes, and lasts at most SESSION_MAX_SECONDS.
+
+    python analytics.py                                   # everything, all history
+    python analytics.py --from 2025-01-01 --to 2025-03-31 --report heatmap --json
+"""
+import argparse
+import json
+from datetime import datetime
+
+import numpy as np
+
+from archive import UsageArchive
+from config import SESSION_MAX_SECONDS
+from event_store import open_event_store
+from records import EPOCH, ActivityColumns, InternTable
+
+DAY = 86400
+# Upper edges (seconds) of the focus-session length histogram buckets
+SESSION_BUCKETS = (60, 300, 900, 1800, 3600, 7200)
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+REPORTS = ("totals", "sessions", "switches", "heatmap", "streaks")
+# Stored archive columns an analytics frame needs (titles are never loaded)
+ARCHIVE_COLUMNS = ("seqs", "timestamps", "app_ids", "category_ids", "status_ids", "apps", "categories", "statuses")
+
+
+class UsageFrame:
+    """
+    Tracker events as NumPy columns in seq order: seconds since 1970-01-01 in
+    naive local time (as in ActivityColumns) and integer ids into the apps,
+    categories and statuses string tables.
+    """
+
+    def __init__(self, seqs, timestamps, app_ids, category_ids, status_ids, apps, categories, statuses):
+        self.seqs = np.asarray(seqs, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.app_ids = np.asarray(app_ids, dtype=np.int32)
+        self.category_ids = np.asarray(category_ids, dtype=np.int32)
+        self.status_ids = np.asarray(status_ids, dtype=np.int32)
+        self.apps = list(apps)
+        self.categories = list(categories)
+        self.statuses = list(statuses)
+
+    @classmethod
+    def empty(cls):
+        return cls((), (), (), (), (), (), (), ())
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Wrap ActivityColumns; the integer columns are copied straight from their buffers."""
+        return cls(np.frombuffer(columns.seqs, dtype=np.int64), np.frombuffer(columns.timestamps, dtype=np.int64),
+                   np.frombuffer(columns.app_ids, dtype=np.uint32), np.frombuffer(columns.category_ids, dtype=np.uint32),
+                   np.frombuffer(columns.status_ids, dtype=np.uint8),
+                   columns.apps.strings, columns.categories.strings, columns.statuses.strings)
+
+    @classmethod
+    def from_partition(cls, data):
+        """Build from the arrays of one archive partition (UsageArchive.read_partition)."""
+        return cls(data["seqs"], data["timestamps"], data["app_ids"], data["category_ids"], data["status_ids"],
+                   data["apps"].tolist(), data["categories"].tolist(), data["statuses"].tolist())
+
+    @classmethod
+    def concat(cls, frames):
+        """Join frames (already in seq order) and merge their string tables."""
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return cls.empty()
+        tables = {name: InternTable() for name in ("apps", "categories", "statuses")}
+        ids = {name: [] for name in ("app_ids", "category_ids", "status_ids")}
+        for frame in frames:
+            for id_name, table_name in (("app_ids", "apps"), ("category_ids", "categories"),
+                                        ("status_ids", "statuses")):
+                table = tables[table_name]
+                remap = np.array([table.intern(s) for s in getattr(frame, table_name)], dtype=np.int32)
+                ids[id_name].append(remap[getattr(frame, id_name)])
+        return cls(np.concatenate([f.seqs for f in frames]), np.concatenate([f.timestamps for f in frames]),
+                   np.concatenate(ids["app_ids"]), np.concatenate(ids["category_ids"]),
+                   np.concatenate(ids["status_ids"]),
+                   tables["apps"].strings, tables["categories"].strings, tables["statuses"].strings)
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def intervals(self, start=None, end=None, categories=None):
+        """
+        Active sessions as (row, start, end) arrays, clipped to [start, end) in
+        seconds. The session still open at the end of the data is left out.
+        """
+        if len(self) < 2 or "active" not in self.statuses:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows = np.flatnonzero(self.status_ids[:-1] == self.statuses.index("active"))
+        if categories is not None:
+            wanted = [i for i, category in enumerate(self.categories) if category in set(categories)]
+            rows = rows[np.isin(self.category_ids[rows], wanted)]
+        starts = self.timestamps[rows]
+        ends = np.minimum(self.timestamps[rows + 1], starts + SESSION_MAX_SECONDS)
+        if start is not None:
+            starts = np.maximum(starts, start)
+        if end is not None:
+            ends = np.minimum(ends, end)
+        keep = ends > starts
+        return rows[keep], starts[keep], ends[keep]
+
+
+def load_history(start=None, end=None, archive=None, store=None):
+    """
+    A UsageFrame of every event on the days in [start, end] ("YYYY-MM-DD" or
+    "YYYY-MM-DD HH:MM:SS"). Only archive partitions in range are opened, and only
+    the columns analytics needs are decompressed.
+    """
+    archive = archive or UsageArchive()
+    store = store or open_event_store()
+    frames = [UsageFrame.from_partition(archive.read_partition(day, ARCHIVE_COLUMNS))
+              for day in archive.select_partitions(start, end)]
+
+    archived_max = archive.max_seq()
+    first_day, last_day = (start or "")[:10], (end or "")[:10]
+    live = ActivityColumns(
+        event for event in store.snapshot().events()
+        if event["seq"] > archived_max
+        and (not first_day or event["timestamp"][:10] >= first_day)
+        and (not last_day or event["timestamp"][:10] <= last_day))
+    frames.append(UsageFrame.from_columns(live))
+    return UsageFrame.concat(frames)
+
+
+def to_seconds(bound, end=False):
+    """Seconds (as stored in timestamps) of a query bound; a date-only end runs to the next midnight."""
+    if not bound:
+        return None
+    seconds = int((datetime.fromisoformat(bound) - EPOCH).total_seconds())
+    return seconds + DAY if end and len(bound) <= 10 else seconds
+
+
+# --- reports ---
+
+def category_totals(frame, start=None, end=None, categories=None):
+    """Active seconds per category."""
+    rows, starts, ends = frame.intervals(start, end, categories)
+    seconds = np.bincount(frame.category_ids[rows], weights=ends - starts, minlength=len(frame.categories))
+    return {frame.categories[i]: float(seconds[i]) for i in np.flatnonzero(seconds)}
+
+
+def focus_sessions(frame, start=None, end=None, categories=None, by="app"):
+    """
+    Lengths of uninterrupted focus on one app (or category): consecutive active
+    sessions with the same key merge; idle, closed or a different key ends it.
+    """
+    rows, starts, ends = frame.intervals(start, end, categories)
+    if not len(rows):
+        return {"count": 0, "total_seconds": 0.0, "histogram": {}}
+    keys = (frame.app_ids if by == "app" else frame.category_ids)[rows]
+    breaks = np.ones(len(rows), dtype=bool)
+    breaks[1:] = (rows[1:] != rows[:-1] + 1) | (keys[1:] != keys[:-1]) | (starts[1:] != ends[:-1])
+    run_ids = np.cumsum(breaks) - 1
+    lengths = np.bincount(run_ids, weights=ends - starts)
+
+    counts = np.bincount(np.searchsorted(SESSION_BUCKETS, lengths, side="right"),
+                         minlength=len(SESSION_BUCKETS) + 1)
+    labels = [f"<{edge // 60}m" for edge in SESSION_BUCKETS] + [f">={SESSION_BUCKETS[-1] // 60}m"]
+    return {
+        "count": int(len(lengths)),
+        "total_seconds": float(lengths.sum()),
+        "mean_seconds": float(lengths.mean()),
+        "median_seconds": float(np.median(lengths)),
+        "p90_seconds": float(np.percentile(lengths, 90)),
+        "max_seconds": float(lengths.max()),
+        "histogram": dict(zip(labels, counts.tolist())),
+    }
+
+
+def context_switches(frame, start=None, end=None, categories=None):
+    """App switches between back-to-back active sessions, overall and per day, with the rate per active hour."""
+    rows, starts, ends = frame.intervals(start, end, categories)
+    if len(rows) < 2:
+        return {"switches": 0, "active_hours": 0.0, "per_active_hour": 0.0, "by_day": {}}
+    apps = frame.app_ids[rows]
+    switched = (rows[1:] == rows[:-1] + 1) & (apps[1:] != apps[:-1])
+    switch_days = starts[1:][switched] // DAY
+    active_hours = float((ends - starts).sum()) / 3600
+    days, per_day = np.unique(switch_days, return_counts=True)
+    return {
+        "switches": int(switched.sum()),
+        "active_hours": active_hours,
+        "per_active_hour": float(switched.sum()) / active_hours if active_hours else 0.0,
+        "by_day": {_day_string(day): int(count) for day, count in zip(days, per_day)},
+    }
+
+
+def hourly_heatmap(frame, start=None, end=None, categories=None):
+    """
+    Active seconds per weekday and hour of day (7 x 24). Sessions spanning an
+    hour boundary are split exactly: the cumulative active time is sampled at
+    every hour boundary with one searchsorted over the session ends.
+    """
+    _, starts, ends = frame.intervals(start, end, categories)
+    grid = np.zeros((7, 24))
+    if not len(starts):
+        return {"weekdays": list(WEEKDAYS), "seconds": grid.tolist()}
+    boundaries = np.arange(starts[0] // 3600 * 3600, ends.max() + 3600, 3600)
+    cumulative = np.concatenate(([0], np.cumsum(ends - starts)))
+    index = np.searchsorted(ends, boundaries, side="right")
+    partial = np.zeros(len(boundaries), dtype=np.int64)
+    inside = index < len(starts)
+    partial[inside] = np.clip(boundaries[inside] - starts[index[inside]], 0, None)
+    per_hour = np.diff(cumulative[index] + partial)
+
+    hours = boundaries[:-1] // 3600
+    cells = ((hours // 24 + 3) % 7) * 24 + hours % 24  # 1970-01-01 was a Thursday
+    grid = np.bincount(cells, weights=per_hour, minlength=7 * 24).reshape(7, 24)
+    return {"weekdays": list(WEEKDAYS), "seconds": grid.tolist()}
+
+
+def app_streaks(frame, start=None, end=None, categories=None, min_seconds=60):
+    """
+    Per app: days used (at least min_seconds active, counted on the day a
+    session starts), the longest run of consecutive such days and the run that
+    reaches the last day of the data.
+    """
+    rows, starts, ends = frame.intervals(start, end, categories)
+    if not len(rows):
+        return {}
+    days = starts // DAY
+    first_day, day_count, app_count = days[0], int(days[-1] - days[0]) + 1, len(frame.apps)
+    usage = np.bincount((days - first_day) * app_count + frame.app_ids[rows], weights=ends - starts,
+                        minlength=day_count * app_count).reshape(day_count, app_count)
+    used = (usage >= min_seconds).T  # apps x days
+
+    padded = np.zeros((app_count, day_count + 2), dtype=np.int8)
+    padded[:, 1:-1] = used
+    edges = np.diff(padded, axis=1)
+    run_apps, run_starts = np.nonzero(edges == 1)
+    _, run_ends = np.nonzero(edges == -1)  # Row-major order pairs each end with its start
+    lengths = run_ends - run_starts
+    longest = np.zeros(app_count, dtype=np.int64)
+    np.maximum.at(longest, run_apps, lengths)
+    current = np.zeros(app_count, dtype=np.int64)
+    reaches_end = run_ends == day_count
+    current[run_apps[reaches_end]] = lengths[reaches_end]
+
+    days_used = used.sum(axis=1)
+    return {frame.apps[app]: {"days_used": int(days_used[app]), "longest_streak": int(longest[app]),
+                              "current_streak": int(current[app])}
+            for app in np.flatnonzero(days_used)}
+
+
+def _day_string(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+def usage_report(start=None, end=None, categories=None, reports=REPORTS, frame=None):
+    """
+    JSON-ready analytics for [start, end] (inclusive; "YYYY-MM-DD" or
+    "YYYY-MM-DD HH:MM:SS"), optionally limited to some categories. Pass a frame
+    to run several reports over data loaded once.
+    """
+    if frame is None:
+        frame = load_history(start, end)
+    window = (to_seconds(start), to_seconds(end, end=True), categories)
+    builders = {"totals": category_totals, "sessions": focus_sessions, "switches": context_switches,
+                "heatmap": hourly_heatmap, "streaks": app_streaks}
+    return {name: builders[name](frame, *window) for name in reports}
+
+
+def _print_report(report):
+    if "totals" in report:
+        print("\n--- Active time by category ---")
+        for category, seconds in sorted(report["totals"].items(), key=lambda item: -item[1]):
+            print(f"{category:<20}{seconds / 3600:>8.1f}h")
+    if "sessions" in report:
+        sessions = report["sessions"]
+        print("\n--- Focus sessions ---")
+        if sessions["count"]:
+            print(f"{sessions['count']} sessions, median {sessions['median_seconds'] / 60:.1f} min, "
+                  f"p90 {sessions['p90_seconds'] / 60:.1f} min, longest {sessions['max_seconds'] / 60:.0f} min")
+            print("  ".join(f"{bucket}: {count}" for bucket, count in sessions["histogram"].items()))
+    if "switches" in report:
+        switches = report["switches"]
+        print("\n--- Context switches ---")
+        print(f"{switches['switches']} switches over {switches['active_hours']:.1f} active hours "
+              f"({switches['per_active_hour']:.1f}/hour)")
+    if "heatmap" in report:
+        print("\n--- Active minutes by weekday and hour ---")
+        print("     " + "".join(f"{hour:>4}" for hour in range(24)))
+        for weekday, row in zip(report["heatmap"]["weekdays"], report["heatmap"]["seconds"]):
+            print(f"{weekday:<5}" + "".join(f"{seconds / 60:>4.0f}" for seconds in row))
+    if "streaks" in report:
+        print("\n--- App streaks (days) ---")
+        for app, streak in sorted(report["streaks"].items(), key=lambda item: -item[1]["longest_streak"]):
+            print(f"{app:<28}used {streak['days_used']:>4}  longest {streak['longest_streak']:>4}  "
+                  f"current {streak['current_streak']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", help="start (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument("--to", dest="end", help="end, inclusive")
+    parser.add_argument("--category", action="append", help="only these categories (repeatable)")
+    parser.add_argument("--report", action="append", choices=REPORTS, help="reports to run (default: all)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = usage_report(args.start, args.end, args.category, args.report or REPORTS)
+    if args.json:
+        print(json.dumps(report, indent=1))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Columnar archive of tracker history.
+
+compact() rolls every closed day of the event store into one compressed npz
+partition, <ARCHIVE_DIR>/YYYY-MM-DD.npz, with integer columns and per-partition
+string tables (the same layout as records.ActivityColumns). A manifest records
+each partition's seq range, time range and category counts, so queries open
+only the partitions that can match and load only the columns they ask for.
+
+    python archive.py                     # compact closed days, apply retention
+    python archive.py --from 2025-01-01 --to 2025-01-31 --category coding
+"""
+import argparse
+import io
+import json
+import os
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import ARCHIVE_DIR, ARCHIVE_RETENTION_DAYS, EVENT_SEGMENT_RETENTION_DAYS
+from event_store import SEGMENT_SUFFIX, _lock, _unlock, is_label, open_event_store
+from records import FIELDS, ActivityColumns
+
+MANIFEST_NAME = "manifest.json"
+ARCHIVE_LOCK_FILE_NAME = ".archive.lock"
+# Columns stored per partition; the string columns are ids into the tables below
+INT_COLUMNS = ("seqs", "timestamps", "title_ids", "app_ids", "category_ids", "status_ids")
+TABLES = {"title_ids": "titles", "app_ids": "apps", "category_ids": "categories", "status_ids": "statuses"}
+# Query column name -> stored id column
+STRING_FIELDS = {"window_title": "title_ids", "app_name": "app_ids", "category": "category_ids", "status": "status_ids"}
+
+
+class UsageArchive:
+    """Date-partitioned, compressed columnar storage for closed days of events."""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    # --- manifest ---
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {"archived_through": "", "partitions": {}}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive access to the archive across threads and processes. The manifest
+        is reloaded under the lock, so changes another process made are not overwritten.
+        """
+        with self._lock, open(os.path.join(self.directory, ARCHIVE_LOCK_FILE_NAME), "a+") as lock_file:
+            _lock(lock_file)
+            try:
+                self.manifest = self._load_manifest()
+                yield
+            finally:
+                _unlock(lock_file)
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(temp_file, path)
+
+    def partitions(self):
+        """Archived days, oldest first."""
+        return sorted(self.manifest["partitions"])
+
+    def archived_through(self):
+        """The last day that has been compacted ("" if none), even if since expired."""
+        return self.manifest["archived_through"]
+
+    def max_seq(self):
+        """Highest seq in the archive (0 if empty)."""
+        return max((p["max_seq"] for p in self.manifest["partitions"].values()), default=0)
+
+    # --- partitions ---
+
+    def _partition_path(self, day):
+        return os.path.join(self.directory, self.manifest["partitions"][day]["file"])
+
+    def write_partition(self, day, events):
+        """Store one day of (label-folded) events as a partition, replacing any existing one."""
+        columns = events if isinstance(events, ActivityColumns) else ActivityColumns(events)
+        if not len(columns):
+            return
+        arrays = {name: np.asarray(getattr(columns, name), dtype=np.int64 if name in ("seqs", "timestamps")
+                                   else np.int32) for name in INT_COLUMNS}
+        for table in TABLES.values():
+            arrays[table] = np.array(getattr(columns, table).strings, dtype=str)
+
+        file_name = f"{day}.npz"
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        path = os.path.join(self.directory, file_name)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(temp_file, path)
+
+        category_counts = np.bincount(arrays["category_ids"], minlength=len(arrays["categories"]))
+        self.manifest["partitions"][day] = {
+            "file": file_name,
+            "rows": len(columns),
+            "min_seq": int(arrays["seqs"][0]),
+            "max_seq": int(arrays["seqs"][-1]),
+            "start": int(arrays["timestamps"].min()),
+            "end": int(arrays["timestamps"].max()),
+            "categories": {category: int(count) for category, count
+                           in zip(columns.categories.strings, category_counts) if count},
+        }
+
+    def read_partition(self, day, columns=None):
+        """Raw arrays of one partition; only the requested stored columns are decompressed."""
+        with np.load(self._partition_path(day), allow_pickle=False) as data:
+            names = data.files if columns is None else [c for c in columns if c in data.files]
+            return {name: data[name] for name in names}
+
+    def _load_columns(self, day):
+        data = self.read_partition(day)
+        columns = ActivityColumns()
+        for name in INT_COLUMNS:
+            getattr(columns, name).extend(int(v) for v in data[name])
+        for table in TABLES.values():
+            for string in data[table]:
+                getattr(columns, table).intern(str(string))
+        return columns
+
+    def apply_labels(self, labels):
+        """
+        Apply {seq: category} labels to archived events, rewriting only the partitions
+        they touch. Returns the number of events whose category changed.
+        """
+        days = self.partitions()
+        starts = [self.manifest["partitions"][day]["min_seq"] for day in days]
+        by_day = {}
+        for seq, category in labels.items():
+            index = bisect_right(starts, seq) - 1
+            if index >= 0 and seq <= self.manifest["partitions"][days[index]]["max_seq"]:
+                by_day.setdefault(days[index], {})[seq] = category
+
+        changed = 0
+        for day, day_labels in by_day.items():
+            columns = self._load_columns(day)
+            day_changed = 0
+            for seq, category in day_labels.items():
+                position = columns.find(seq)
+                if position is not None and columns[position].category != category:
+                    columns.set_category(position, category)
+                    day_changed += 1
+            if day_changed:
+                self.write_partition(day, columns)
+                changed += day_changed
+        if changed:
+            self._save_manifest()
+        return changed
+
+    def expire(self, today, retention_days=ARCHIVE_RETENTION_DAYS):
+        """Delete partitions older than the retention window. Returns the expired days."""
+        if retention_days is None:
+            return []
+        horizon = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+        expired = [day for day in self.partitions() if day < horizon]
+        for day in expired:
+            try:
+                os.remove(self._partition_path(day))
+            except FileNotFoundError:
+                pass
+            del self.manifest["partitions"][day]
+        if expired:
+            self._save_manifest()
+        return expired
+
+    # --- queries ---
+
+    def select_partitions(self, start=None, end=None, categories=None):
+        """Days that can hold rows in [start, end] with one of the categories."""
+        selected = []
+        for day in self.partitions():
+            if (start and day < start[:10]) or (end and day > end[:10]):
+                continue
+            if categories is not None and not set(categories) & set(self.manifest["partitions"][day]["categories"]):
+                continue
+            selected.append(day)
+        return selected
+
+    def query(self, start=None, end=None, categories=None, fields=FIELDS):
+        """
+        Archived events with start <= timestamp <= end ("YYYY-MM-DD" or
+        "YYYY-MM-DD HH:MM:SS", inclusive) and, if given, one of the categories.
+        Returns {field: numpy array} in seq order; timestamps are datetime64[s]
+        and string fields are numpy str arrays.
+        """
+        start_seconds = _bound_seconds(start, end=False)
+        end_seconds = _bound_seconds(end, end=True)
+        needed = {STRING_FIELDS[f] for f in fields if f in STRING_FIELDS}
+        needed |= {TABLES[c] for c in needed}
+        if "seq" in fields:
+            needed.add("seqs")
+        if "timestamp" in fields or start_seconds is not None or end_seconds is not None:
+            needed.add("timestamps")
+        if categories is not None:
+            needed |= {"category_ids", "categories"}
+
+        parts = {field: [] for field in fields}
+        for day in self.select_partitions(start, end, categories):
+            data = self.read_partition(day, needed)
+            mask = None
+            if start_seconds is not None:
+                mask = data["timestamps"] >= start_seconds
+            if end_seconds is not None:
+                upper = data["timestamps"] <= end_seconds
+                mask = upper if mask is None else mask & upper
+            if categories is not None:
+                wanted = np.flatnonzero(np.isin(data["categories"], list(categories)))
+                in_categories = np.isin(data["category_ids"], wanted)
+                mask = in_categories if mask is None else mask & in_categories
+
+            for field in fields:
+                if field == "seq":
+                    values = data["seqs"]
+                elif field == "timestamp":
+                    values = data["timestamps"].astype("datetime64[s]")
+                else:
+                    id_column = STRING_FIELDS[field]
+                    values = data[TABLES[id_column]][data[id_column]]
+                parts[field].append(values if mask is None else values[mask])
+
+        result = {}
+        for field in fields:
+            if parts[field]:
+                result[field] = np.concatenate(parts[field])
+            elif field == "seq":
+                result[field] = np.empty(0, dtype=np.int64)
+            elif field == "timestamp":
+                result[field] = np.empty(0, dtype="datetime64[s]")
+            else:
+                result[field] = np.empty(0, dtype=str)
+        return result
+
+    def iter_dicts(self, start=None, end=None, categories=None, after_seq=0):
+        """
+        Archived events as the dicts the rest of the tracker uses, one day at a time.
+        Partitions wholly at or before after_seq are skipped without being opened.
+        """
+        for day in self.select_partitions(start, end, categories):
+            if self.manifest["partitions"][day]["max_seq"] <= after_seq:
+                continue
+            rows = self.query(max(start or day, day), min(end or day, day + " 23:59:59"), categories)
+            for i in np.flatnonzero(rows["seq"] > after_seq):
+                yield {
+                    "timestamp": str(rows["timestamp"][i]).replace("T", " "),
+                    "window_title": str(rows["window_title"][i]),
+                    "app_name": str(rows["app_name"][i]),
+                    "category": str(rows["category"][i]),
+                    "status": str(rows["status"][i]),
+                    "seq": int(rows["seq"][i]),
+                }
+
+
+def _bound_seconds(bound, end):
+    """Epoch seconds (naive local time) of a query bound, or None for a whole-day bound."""
+    if not bound or len(bound) <= 10:
+        return None
+    return int((datetime.fromisoformat(bound) - datetime(1970, 1, 1)).total_seconds())
+
+
+def compact(store=None, archive=None, today=None, retention_days=ARCHIVE_RETENTION_DAYS,
+            segment_retention_days=EVENT_SEGMENT_RETENTION_DAYS):
+    """
+    Archive every closed day of the event store not archived yet, apply labels
+    written since to already-archived events, then expire old partitions and
+    delete archived segments past segment_retention_days. Safe to run while the
+    tracker is running: only closed segments are read or removed.
+    """
+    store = store or open_event_store()
+    archive = archive or UsageArchive()
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    summary = {"archived_days": [], "rows": 0, "relabeled": 0, "expired": [], "removed_segments": []}
+    if not hasattr(store, "segments"):
+        return summary
+
+    with archive._locked():
+        archived_through = archive.archived_through()
+        segments = [name for name in store.segments() if name[:-len(SEGMENT_SUFFIX)] > archived_through]
+
+        # One pass over everything newer than the archive: closed days become
+        # partitions, and every label is applied to whichever side holds its event
+        days = {}
+        labels = {}
+        for name in segments:
+            day = name[:-len(SEGMENT_SUFFIX)]
+            for record in store.read_segment(name):
+                if is_label(record):
+                    labels[record["ref"]] = record["category"]
+                elif day < today:
+                    days.setdefault(day, []).append(record)
+
+        for day, events in sorted(days.items()):
+            for event in events:
+                if event["seq"] in labels:
+                    event["category"] = labels.pop(event["seq"])
+            archive.write_partition(day, events)
+            summary["archived_days"].append(day)
+            summary["rows"] += len(events)
+        if days:
+            archive.manifest["archived_through"] = max(days)
+            archive._save_manifest()
+
+        archived_max = archive.max_seq()
+        summary["relabeled"] = archive.apply_labels(
+            {seq: category for seq, category in labels.items() if seq <= archived_max})
+        summary["expired"] = archive.expire(today, retention_days)
+
+    if segment_retention_days is not None:
+        horizon = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=segment_retention_days)).strftime("%Y-%m-%d")
+        for name in store.segments():
+            day = name[:-len(SEGMENT_SUFFIX)]
+            if day < horizon and day <= archive.archived_through():
+                try:
+                    store.remove_segment(name)
+                except RuntimeError:
+                    continue  # Still the writer's segment: removed on a later run
+                summary["removed_segments"].append(name)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", help="query start (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument("--to", dest="end", help="query end, inclusive")
+    parser.add_argument("--category", action="append", help="only these categories (repeatable)")
+    args = parser.parse_args()
+
+    if args.start or args.end or args.category:
+        archive = UsageArchive()
+        rows = archive.query(args.start, args.end, args.category)
+        print(f"{len(rows['seq'])} events in {len(archive.select_partitions(args.start, args.end, args.category))} partitions")
+        return
+
+    summary = compact()
+    print(f"Archived {summary['rows']} events from {len(summary['archived_days'])} days, "
+          f"relabeled {summary['relabeled']}, expired {len(summary['expired'])} partitions, "
+          f"removed {len(summary['removed_segments'])} segments")
+
+
+if __name__ == "__main__":
+    main()
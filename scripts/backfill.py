@@ -0,0 +1,204 @@
+"""
+Backfill categories for historical tracker events.
+
+Scans the archive and the event store, dedupes the (canonical title, app)
+pairs that need a category, categorizes them in concurrent batches under a
+request-rate limit, and appends the labels in bulk. Progress is checkpointed
+after every batch, so a killed run picks up where it stopped; the checkpoint is
+kept per run mode and removed once a run finishes cleanly. While the tracker
+is running the labels are handed to its categorization worker instead.
+
+    python backfill.py                   # entries without a category (or "unknown")
+    python backfill.py --recategorize --reset-cache   # after a taxonomy change
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import types
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import logger
+from archive import UsageArchive
+from canonicalize import cache_key
+from categorization_worker import submit_labels
+from classifier import TitleClassifier
+from config import (BACKFILL_BATCH_SIZE, BACKFILL_CHECKPOINT_FILE, BACKFILL_CONCURRENCY,
+                    BACKFILL_REQUESTS_PER_MINUTE)
+from event_store import open_event_store
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def rate_limited(client, limiter):
+    """Wrap an OpenAI client so every chat completion waits for the limiter first."""
+    def create(*args, **kwargs):
+        limiter.acquire()
+        return client.chat.completions.create(*args, **kwargs)
+
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+
+def run_mode(recategorize, reset_cache):
+    """Checkpoints only resume a run of the same mode, e.g. never a --recategorize from a plain run."""
+    return "+".join(name for name, on in (("recategorize", recategorize), ("reset-cache", reset_cache)) if on) or "default"
+
+
+def load_checkpoint(path, mode):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("mode") != mode:
+        print(f"Ignoring the checkpoint from a {checkpoint.get('mode', 'different')} run")
+        return {}
+    return checkpoint["done"]
+
+
+def save_checkpoint(path, mode, done):
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump({"mode": mode, "done": done}, f)
+    os.replace(temp_file, path)
+
+
+def iter_history(archive=None, store=None):
+    """Every event: archived days first, then the ones still only in the event store."""
+    archive = archive or UsageArchive()
+    store = store or open_event_store()
+    yield from archive.iter_dicts()
+    archived_max = archive.max_seq()
+    for e in store.snapshot().events():
+        if e["seq"] > archived_max:
+            yield e
+
+
+def collect_work(events, recategorize):
+    """Group the events that need a category by cache key: {key: (item, [(seq, current category)])}."""
+    work = {}
+    for e in events:
+        if e["status"] != "active":
+            continue
+        if not recategorize and e["category"] not in ("", "unknown"):
+            continue
+        item = {"window_title": e["window_title"], "app_name": e["app_name"]}
+        key = cache_key(item)
+        if key not in work:
+            work[key] = (item, [])
+        work[key][1].append((e["seq"], e["category"]))
+    return work
+
+
+def run_backfill(batch_size=BACKFILL_BATCH_SIZE, concurrency=BACKFILL_CONCURRENCY,
+                 requests_per_minute=BACKFILL_REQUESTS_PER_MINUTE, recategorize=False,
+                 reset_cache=False, checkpoint_file=BACKFILL_CHECKPOINT_FILE, restart=False):
+    work = collect_work(iter_history(), recategorize)
+    mode = run_mode(recategorize, reset_cache)
+    done = {} if restart else load_checkpoint(checkpoint_file, mode)
+    todo = [key for key in work if key not in done]
+    print(f"{sum(len(seqs) for _, seqs in work.values())} entries, {len(work)} distinct windows, "
+          f"{len(todo)} still to categorize")
+
+    cache = logger.load_cache()
+    if reset_cache:
+        # The classifier learned from the old labels too, so it starts over with the cache
+        cache.clear()
+        logger.classifier = TitleClassifier()
+    logger.classifier.learn_cache(cache)
+    client = rate_limited(logger.openai_client, RateLimiter(requests_per_minute))
+
+    done_lock = threading.Lock()
+
+    def categorize_batch(keys):
+        # Each batch counts into its own Counters, merged into the logger's under the lock
+        counts, usage = Counter(), Counter()
+        categories = logger.categorize_windows([work[key][0] for key in keys], cache, client, counts, usage)
+        with done_lock:
+            logger.tier_counts.update(counts)
+            logger.llm_usage.update(usage)
+            for key, category in zip(keys, categories):
+                if category not in (None, "unknown"):
+                    done[key] = category
+            save_checkpoint(checkpoint_file, mode, done)
+        return len(keys)
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    finished = failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in as_completed([pool.submit(categorize_batch, batch) for batch in batches]):
+            try:
+                finished += future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Batch failed (will be retried on the next run): {e}")
+            print(f"Categorized {finished}/{len(todo)} windows")
+
+    logger.save_tier_stats(cache)
+    write_labels(work, done)
+    if not failed and os.path.exists(checkpoint_file):
+        # Nothing left to resume; the next run starts from the current history
+        os.remove(checkpoint_file)
+
+
+def write_labels(work, done):
+    """Append a label for every event whose category changed, in one bulk write."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    labels = [
+        {"timestamp": timestamp, "ref": seq, "category": done[key]}
+        for key, (_, seqs) in work.items() if key in done
+        for seq, current in seqs if current != done[key]
+    ]
+    if not labels:
+        print("No labels to write")
+        return
+    try:
+        store = open_event_store(writer=True)
+    except RuntimeError:
+        # The tracker holds the writer lock, so its categorization worker writes them
+        submit_labels(labels)
+        print(f"The tracker is running; handed {len(labels)} labels to its categorization worker")
+        return
+    try:
+        store.append_many(labels)
+    finally:
+        store.close()
+    print(f"Wrote {len(labels)} labels")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=BACKFILL_REQUESTS_PER_MINUTE,
+                        help="maximum API requests per minute")
+    parser.add_argument("--recategorize", action="store_true",
+                        help="relabel every active entry, not just uncategorized ones")
+    parser.add_argument("--reset-cache", action="store_true", help="clear the category cache first")
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    run_backfill(args.batch_size, args.concurrency, args.rate, args.recategorize,
+                 args.reset_cache, args.checkpoint, args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Analytics benchmark: the vectorized reports in analytics.py versus the
+per-dict Python loops they replace, over a synthetic history.
+
+Run from the scripts directory:
+    python -m bench.analytics_bench --events 1000000
+"""
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+import analytics
+from analytics import UsageFrame
+
+from bench.memory_bench import APPS, CATEGORIES
+
+STATUSES = ["active", "closed", "idle"]
+
+
+def synthetic_frame(count, seed=7):
+    """A UsageFrame of `count` events, generated column-wise (5-300s apart, mostly active)."""
+    rng = np.random.default_rng(seed)
+    start = int(analytics.to_seconds("2024-01-01 09:00:00"))
+    return UsageFrame(
+        seqs=np.arange(1, count + 1),
+        timestamps=start + np.cumsum(rng.integers(5, 301, count)),
+        app_ids=rng.integers(0, len(APPS), count),
+        category_ids=rng.integers(0, len(CATEGORIES), count),
+        status_ids=rng.choice(len(STATUSES), count, p=[0.6, 0.2, 0.2]),
+        apps=APPS, categories=CATEGORIES, statuses=STATUSES)
+
+
+def as_dicts(frame):
+    """The same events as the dicts the loop-based code walks over."""
+    return [{"timestamp": int(ts), "app_name": frame.apps[app], "category": frame.categories[category],
+             "status": frame.statuses[status]}
+            for ts, app, category, status in zip(frame.timestamps.tolist(), frame.app_ids.tolist(),
+                                                 frame.category_ids.tolist(), frame.status_ids.tolist())]
+
+
+def loop_reports(events):
+    """Category totals, focus sessions and context switches with one Python loop, as print_metrics did."""
+    totals = Counter()
+    sessions = []
+    switches = 0
+    current = None
+    for previous, event in zip(events, events[1:]):
+        if previous["status"] != "active":
+            current = None
+            continue
+        seconds = event["timestamp"] - previous["timestamp"]
+        totals[previous["category"]] += seconds
+        if current is not None and current[0] == previous["app_name"]:
+            current[1] += seconds
+        else:
+            if current is not None:
+                switches += 1
+                sessions.append(current[1])
+            current = [previous["app_name"], seconds]
+        if event["status"] != "active":
+            sessions.append(current[1])
+            current = None
+    if current is not None:
+        sessions.append(current[1])
+    return totals, sorted(sessions), switches
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs per report")
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.events)
+    builders = {"totals": analytics.category_totals, "sessions": analytics.focus_sessions,
+                "switches": analytics.context_switches, "heatmap": analytics.hourly_heatmap,
+                "streaks": analytics.app_streaks}
+    print(f"{args.events} events over {(frame.timestamps[-1] - frame.timestamps[0]) / 86400:.0f} days")
+    print(f"{'report':<12}{'vectorized':>12}")
+    results = {}
+    for name, build in builders.items():
+        best = min(timed(build, frame)[1] for _ in range(args.repeat))
+        results[name] = build(frame)
+        print(f"{name:<12}{best * 1000:>10.1f}ms")
+
+    events, build_seconds = timed(as_dicts, frame)
+    (totals, sessions, switches), loop_seconds = timed(loop_reports, events)
+    comparable = sum(min(timed(builders[name], frame)[1] for _ in range(args.repeat))
+                     for name in ("totals", "sessions", "switches"))
+    print(f"\nPython loop over dicts (totals, sessions, switches): {loop_seconds * 1000:.0f}ms "
+          f"(+{build_seconds * 1000:.0f}ms to build the dicts)")
+    print(f"Vectorized, same three reports: {comparable * 1000:.0f}ms -> {loop_seconds / comparable:.0f}x faster")
+
+    # The two implementations must agree
+    assert results["sessions"]["count"] == len(sessions), (results["sessions"]["count"], len(sessions))
+    assert results["switches"]["switches"] == switches
+    assert all(abs(results["totals"][c] - totals[c]) < 1e-6 for c in totals)
+
+
+if __name__ == "__main__":
+    main()
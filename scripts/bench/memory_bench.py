@@ -0,0 +1,86 @@
+"""
+Memory benchmark: list of dicts (what json.load of the log gives the categorizer)
+versus ActivityColumns.
+
+Run from the scripts directory:
+    python -m bench.memory_bench --events 200000
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from records import ActivityColumns
+
+APPS = ["Code.exe", "chrome.exe", "slack.exe", "explorer.exe", "WindowsTerminal.exe", "spotify.exe"]
+CATEGORIES = ["coding", "browsing", "communication", "utility", "entertainment", "work"]
+
+
+def synthetic_events(count, distinct_titles=2000, seed=7):
+    """Focus events with a realistic amount of title repetition."""
+    rng = random.Random(seed)
+    titles = [f"document {i} - project {i % 40} - window" for i in range(distinct_titles)]
+    moment = datetime(2025, 1, 1, 9, 0, 0)
+    events = []
+    for seq in range(1, count + 1):
+        moment += timedelta(seconds=rng.randint(5, 300))
+        status = rng.choice(["active", "active", "active", "closed", "idle"])
+        events.append({
+            "timestamp": moment.strftime("%Y-%m-%d %H:%M:%S"),
+            "window_title": "idle" if status == "idle" else rng.choice(titles),
+            "app_name": "idle" if status == "idle" else rng.choice(APPS),
+            "category": "N/A" if status == "idle" else rng.choice(CATEGORIES),
+            "status": status,
+            "seq": seq,
+        })
+    return events
+
+
+def measure(build):
+    """Return (data, bytes retained, build seconds); timing is taken without tracemalloc overhead."""
+    started = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current, elapsed
+
+
+def scan_seconds(data):
+    """Time one full pass reading category and status, as metrics code does."""
+    started = time.perf_counter()
+    active = 0
+    for record in data:
+        if record["status"] == "active" and record["category"]:
+            active += 1
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--titles", type=int, default=2000, help="distinct window titles")
+    args = parser.parse_args()
+
+    serialized = json.dumps(synthetic_events(args.events, args.titles))
+
+    dicts, dict_bytes, dict_build = measure(lambda: json.loads(serialized))
+    columns, column_bytes, column_build = measure(lambda: ActivityColumns(json.loads(serialized)))
+
+    print(f"{args.events} events, {args.titles} distinct titles")
+    print(f"{'representation':<16}{'memory':>12}{'per event':>12}{'build':>10}{'scan':>10}")
+    for name, data, size, build in (("list of dicts", dicts, dict_bytes, dict_build),
+                                    ("ActivityColumns", columns, column_bytes, column_build)):
+        print(f"{name:<16}{size / 2**20:>10.1f}MB{size / args.events:>11.0f}B"
+              f"{build:>9.2f}s{scan_seconds(data):>9.2f}s")
+    print(f"Memory ratio: {dict_bytes / column_bytes:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Offline evaluation of the categorization model policy against the category cache.
+
+Samples labelled windows from the cache (its labels came from the large model)
+and relabels them with the small model alone, the tiered policy and the large
+model alone. Reports agreement with the cache, escalation rate, cost and
+request latency for each, so LLM_ESCALATE_BELOW_CONFIDENCE can be tuned
+before it is changed in config.py.
+
+Run from the scripts directory (uses the real API unless --stub is given):
+    python -m bench.model_eval --sample 200
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from collections import Counter
+
+import logger
+from config import LLM_LARGE_MODEL, LLM_MAX_PROMPT_ITEMS, LLM_SMALL_MODEL
+
+from bench.traces import StubLLMClient
+
+
+def sample_cache(cache, size, seed):
+    """(key, item) pairs from the cache with their cached category; the canonical key doubles as the item."""
+    labelled = [(key, category) for key, category in cache.items() if category not in ("", "unknown", "N/A")]
+    random.Random(seed).shuffle(labelled)
+    sample = []
+    for key, category in labelled[:size]:
+        window_title, _, app_name = key.rpartition("|")
+        sample.append((key, {"window_title": window_title, "app_name": app_name}, category))
+    return sample
+
+
+def evaluate(policy, sample):
+    """Label the sample in prompt-sized batches with policy ("small", "tiered" or "large")."""
+    logger.llm_usage.clear()
+    logger.tier_counts.clear()
+    latencies = []
+    labels = {}
+    for start in range(0, len(sample), LLM_MAX_PROMPT_ITEMS):
+        batch = [(key, item) for key, item, _ in sample[start:start + LLM_MAX_PROMPT_ITEMS]]
+        started = time.perf_counter()
+        if policy == "tiered":
+            labels.update(logger.query_tiered(batch))
+        else:
+            model = LLM_SMALL_MODEL if policy == "small" else LLM_LARGE_MODEL
+            try:
+                answers, _ = logger.query_llm(model, batch)
+            except Exception as e:
+                print(f"{policy}: request failed: {e}")
+                answers = {}
+            labels.update({key: category for key, (category, _) in answers.items()})
+        latencies.append(time.perf_counter() - started)
+
+    agree = sum(1 for key, _, expected in sample if labels.get(key) == expected)
+    cost = sum(value for name, value in logger.llm_usage.items() if name.endswith("_usd"))
+    disagreements = Counter((expected, labels.get(key)) for key, _, expected in sample if labels.get(key) != expected)
+    return {
+        "items": len(sample),
+        "labelled": len(labels),
+        "agreement": agree / len(sample) if sample else 0.0,
+        "escalated": logger.tier_counts["escalated"],
+        "api_calls": logger.tier_counts["api_calls"],
+        "cost_usd": cost,
+        "cost_per_1k_items_usd": 1000 * cost / len(sample) if sample else 0.0,
+        "batch_latency_s": {"mean": statistics.fmean(latencies) if latencies else 0.0,
+                            "max": max(latencies, default=0.0)},
+        "top_disagreements": [[expected, got, count] for (expected, got), count in disagreements.most_common(5)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=200, help="cached windows to relabel")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--policy", action="append", choices=["small", "tiered", "large"],
+                        help="policies to run (default: all three)")
+    parser.add_argument("--stub", action="store_true", help="use the replay stub instead of the API")
+    parser.add_argument("--output", help="also save the results as JSON")
+    args = parser.parse_args()
+
+    sample = sample_cache(logger.load_cache(), args.sample, args.seed)
+    if not sample:
+        print("The category cache has no labelled windows to evaluate against")
+        return
+    if args.stub:
+        logger.openai_client = StubLLMClient()
+    logger.LLM_ITEM_LOG_FILE = None  # Evaluation labels don't belong in the production item log
+
+    results = {policy: evaluate(policy, sample) for policy in args.policy or ["small", "tiered", "large"]}
+    print(f"{len(sample)} cached windows; small model {LLM_SMALL_MODEL}, large model {LLM_LARGE_MODEL}")
+    print(f"{'policy':<8}{'agreement':>10}{'escalated':>10}{'calls':>7}{'$/1k items':>12}{'batch s':>9}")
+    for policy, result in results.items():
+        print(f"{policy:<8}{100 * result['agreement']:>9.1f}%{result['escalated']:>10}{result['api_calls']:>7}"
+              f"{result['cost_per_1k_items_usd']:>12.4f}{result['batch_latency_s']['mean']:>9.2f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
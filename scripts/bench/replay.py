@@ -0,0 +1,270 @@
+"""
+Replay a synthetic focus trace through the tracker pipeline and report how it scales.
+
+Drives logger.sample_activity with a TraceProbe on a simulated clock, flushes the
+categorization worker against a stubbed LLM client, runs the categorizer and
+print_metrics on their usual schedules, and records per-tick latency, bytes
+written, cache hit rates and API calls per hour. Results are saved as JSON.
+
+Run from the scripts directory:
+    python -m bench.replay --hours 24 --switches-per-hour 90
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import categorizer
+import logger
+import metrics
+from categorization_worker import CategorizationWorker
+from category_cache import CategoryCache
+from classifier import TitleClassifier
+from config import CATEGORIZE_BATCH_MAX_AGE, CATEGORY_UPDATE_INTERVAL, TRACK_INTERVAL
+from event_store import SegmentedEventStore
+from records import ActivityColumns
+from rollups import UsageRollups
+from scheduler import AdaptiveScheduler
+
+from bench.traces import StubLLMClient, TraceProbe, generate_trace
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ReplayEnvironment:
+    """Points the logger, categorizer and metrics modules at a scratch directory and a stub LLM."""
+
+    def __init__(self, workdir, fsync):
+        self.workdir = workdir
+        self.export_bytes = 0
+        self.llm = StubLLMClient()
+        self.store = SegmentedEventStore(os.path.join(workdir, "events"), writer=True, fsync=fsync)
+        self.cache = CategoryCache(os.path.join(workdir, "category_cache.sqlite3"), legacy_file=None)
+
+        logger.openai_client = self.llm
+        logger.API_CALL_COUNT_FILE = os.path.join(workdir, "api_calls.txt")
+        logger.tier_counts.clear()
+        logger.llm_usage.clear()
+        logger.LLM_ITEM_LOG_FILE = os.path.join(workdir, "llm_items.jsonl")
+        logger.classifier = TitleClassifier()
+        metrics.API_CALL_COUNT_FILE = logger.API_CALL_COUNT_FILE
+
+        self.worker = CategorizationWorker(
+            self.store, lambda batch: logger.categorize_windows(batch, self.cache),
+            pending_file=os.path.join(workdir, "pending.json"))
+
+        categorizer.store = SegmentedEventStore(os.path.join(workdir, "events"))
+        categorizer.CATEGORY_FILE = os.path.join(workdir, "categorized_log.json")
+        categorizer.CATEGORY_CHANGES_FILE = os.path.join(workdir, "categorized_changes.jsonl")
+        categorizer.CATEGORIZER_CHECKPOINT_FILE = os.path.join(workdir, "checkpoint.json")
+        categorizer.in_memory_data = ActivityColumns()
+        categorizer.read_cursor = None
+        categorizer.rollups = UsageRollups()
+        metrics.live_rollups = categorizer.rollups
+        categorizer.change_listeners[:] = [categorizer.rollups.apply_all, categorizer.append_changes]
+
+        # Count every byte the categorizer rewrites, not just what ends up on disk
+        write_json_atomically = categorizer.write_json_atomically
+
+        def counting_write(path, data):
+            write_json_atomically(path, data)
+            self.export_bytes += os.path.getsize(path)
+
+        categorizer.write_json_atomically = counting_write
+
+    def close(self):
+        self.store.close()
+        self.cache.close()
+
+
+def replay(trace, fsync=False, metrics_every=3600, sampling="fixed", focus_events=False):
+    """
+    Run the trace and return the results dict. sampling="fixed" ticks every
+    TRACK_INTERVAL; "adaptive" uses AdaptiveScheduler, woken at focus changes
+    when focus_events is set (as with the X11 probe).
+    """
+    started_at = trace[0]["start"]
+    ended_at = trace[-1]["end"]
+    hours = (ended_at - started_at).total_seconds() / 3600
+
+    tick_latency = []
+    timestamp_lag = []
+    flush_latency = []
+    categorize_series = []
+    metrics_series = []
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        env = ReplayEnvironment(workdir, fsync)
+        probe = TraceProbe(trace, supports_events=focus_events)
+        last = {"window_title": None, "app_name": None, "status": None, "idle_time": 0}
+        events = 0
+
+        moment = started_at
+        scheduler = AdaptiveScheduler(event_driven=focus_events,
+                                      clock=lambda: (moment - started_at).total_seconds())
+        next_flush = moment + timedelta(seconds=CATEGORIZE_BATCH_MAX_AGE)
+        next_categorize = moment + timedelta(seconds=CATEGORY_UPDATE_INTERVAL)
+        next_export = moment + timedelta(seconds=categorizer.VERY_STRICT_FILE_WRITE_INTERVAL)
+        next_metrics = moment + timedelta(seconds=metrics_every)
+        while moment < ended_at:
+            probe.set_time(moment)
+            timestamp = moment.strftime("%Y-%m-%d %H:%M:%S")
+
+            tick_started = time.perf_counter()
+            changed = logger.sample_activity(probe, env.store, env.worker, last, timestamp)
+            tick_latency.append(time.perf_counter() - tick_started)
+            if changed:
+                events += 1
+                timestamp_lag.append((moment - probe.segment_start()).total_seconds())
+
+            if moment >= next_flush:
+                flush_started = time.perf_counter()
+                env.worker.drain()
+                flush_latency.append(time.perf_counter() - flush_started)
+                next_flush = moment + timedelta(seconds=CATEGORIZE_BATCH_MAX_AGE)
+
+            if moment >= next_categorize:
+                cycle_started = time.perf_counter()
+                categorizer.categorize_entries()
+                if moment >= next_export:
+                    categorizer.last_file_write_time = 0  # the real schedule uses wall-clock time
+                    categorizer.write_to_file_if_needed()
+                    next_export = moment + timedelta(seconds=categorizer.VERY_STRICT_FILE_WRITE_INTERVAL)
+                categorize_series.append([len(categorizer.in_memory_data), time.perf_counter() - cycle_started])
+                next_categorize = moment + timedelta(seconds=CATEGORY_UPDATE_INTERVAL)
+
+            if moment >= next_metrics:
+                metrics_started = time.perf_counter()
+                metrics.print_metrics()
+                metrics_series.append([len(categorizer.in_memory_data), time.perf_counter() - metrics_started])
+                next_metrics = moment + timedelta(seconds=metrics_every)
+
+            if sampling == "fixed":
+                moment += timedelta(seconds=TRACK_INTERVAL)
+                scheduler.record(changed, last["status"] == "idle", last["idle_time"])
+                continue
+            scheduler.record(changed, last["status"] == "idle", last["idle_time"])
+            deadline = moment + timedelta(seconds=max(scheduler.delay(), 0.001))
+            focus_change = probe.next_focus_change() if focus_events else None
+            if focus_change is not None and moment < focus_change < deadline:
+                moment = focus_change
+                scheduler.woke_early()
+            else:
+                moment = deadline
+
+        env.worker.drain()
+        store_bytes = _directory_bytes(os.path.join(workdir, "events"))
+        cache_stats = env.cache.stats()
+        tiers = dict(logger.tier_counts)
+        env.close()
+
+    answered = sum(tiers.get(t, 0) for t in logger.CATEGORIZATION_TIERS)
+    return {
+        "trace": {"hours": hours, "segments": len(trace), "events_logged": events},
+        "sampling": {
+            "mode": sampling,
+            "focus_events": focus_events,
+            "samples": len(tick_latency),
+            "samples_per_hour": len(tick_latency) / hours if hours else 0,
+            "event_wakeups": scheduler.event_wakeups,
+            "timestamp_lag_s": {
+                "mean": statistics.fmean(timestamp_lag) if timestamp_lag else 0,
+                "max": max(timestamp_lag, default=0),
+            },
+        },
+        "tick_latency": _percentiles(tick_latency),
+        "worker_flush_latency": _percentiles(flush_latency),
+        "categorize_entries": {
+            "latency": _percentiles([seconds for _, seconds in categorize_series]),
+            "by_history": categorize_series[::max(1, len(categorize_series) // 20)],
+        },
+        "print_metrics": {
+            "latency": _percentiles([seconds for _, seconds in metrics_series]),
+            "by_history": metrics_series,
+        },
+        "bytes_written": {
+            "event_store": store_bytes,
+            "exports": env.export_bytes,
+            "per_hour": (store_bytes + env.export_bytes) / hours if hours else 0,
+        },
+        "categorization": {
+            "tiers": tiers,
+            "tier_hit_rate": {t: tiers.get(t, 0) / answered for t in logger.CATEGORIZATION_TIERS} if answered else {},
+            "cache": cache_stats,
+            "api_calls": env.llm.calls,
+            "api_items": env.llm.items,
+            "api_calls_per_hour": env.llm.calls / hours if hours else 0,
+            "api_calls_by_model": dict(env.llm.calls_by_model),
+            "llm_usage": dict(logger.llm_usage),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--switches-per-hour", type=float, default=60)
+    parser.add_argument("--idle-fraction", type=float, default=0.15)
+    parser.add_argument("--distinct-titles", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fsync", action="store_true", help="fsync event store appends, as in production")
+    parser.add_argument("--sampling", choices=["fixed", "adaptive"], default="adaptive")
+    parser.add_argument("--focus-events", action="store_true", help="simulate an event-capable probe")
+    parser.add_argument("--output", help="results file (default: bench/results/replay-<time>.json)")
+    args = parser.parse_args()
+
+    trace = generate_trace(args.hours, args.switches_per_hour, args.idle_fraction, args.distinct_titles, args.seed)
+    results = replay(trace, fsync=args.fsync, sampling=args.sampling, focus_events=args.focus_events)
+    results["parameters"] = vars(args)
+    results["run_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    tick = results["tick_latency"]
+    categorization = results["categorization"]
+    print(f"Replayed {results['trace']['hours']:.1f}h, {results['trace']['events_logged']} events logged")
+    sampling = results["sampling"]
+    print(f"Samples/hour: {sampling['samples_per_hour']:.0f}, "
+          f"mean timestamp lag {sampling['timestamp_lag_s']['mean']:.1f}s")
+    print(f"Tick latency: p50 {tick['p50_ms']:.2f}ms, p99 {tick['p99_ms']:.2f}ms, max {tick['max_ms']:.2f}ms")
+    print(f"Bytes written: {results['bytes_written']['per_hour'] / 1024:.1f} KiB/hour")
+    print(f"Cache hit rate: {100 * categorization['cache']['hit_rate']:.1f}%, "
+          f"API calls/hour: {categorization['api_calls_per_hour']:.1f}")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Synthetic focus/idle traces and fakes for replaying them through the tracker."""
+import json
+import random
+import re
+import types
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import IDLE_THRESHOLD
+from probe import ActivityProbe
+
+# (app name, title template, weight). {n} and {k} are filled per generated title;
+# {badge} becomes an unread counter some of the time, like real browser/chat titles.
+WINDOW_TEMPLATES = [
+    ("Code.exe", "{badge}module_{n}.py - project{k} - Visual Studio Code", 30),
+    ("chrome.exe", "{badge}Inbox - user{k}@example.com - Gmail - Google Chrome", 8),
+    ("chrome.exe", "Video {n} - YouTube - Google Chrome", 8),
+    ("chrome.exe", "Search results for topic {n} - Google Search - Google Chrome", 10),
+    ("chrome.exe", "Pull request #{n} - org/repo{k} - GitHub - Google Chrome", 8),
+    ("chrome.exe", "Article {n} on site{k} - Google Chrome", 10),
+    ("slack.exe", "{badge}Slack | channel-{k} | Workspace", 10),
+    ("WindowsTerminal.exe", "Terminal - project{k}", 8),
+    ("explorer.exe", "Folder {n}", 4),
+    ("spotify.exe", "Song {n} - Artist {k}", 4),
+]
+
+LLM_CATEGORIES = ["work", "coding", "social media", "entertainment", "communication", "gaming", "utility", "browsing"]
+
+
+def _make_title(rng, template, distinct_titles):
+    badge = f"({rng.randint(1, 30)}) " if rng.random() < 0.3 else ""
+    return template.format(badge=badge, n=rng.randrange(distinct_titles), k=rng.randrange(12))
+
+
+def generate_trace(hours=8.0, switches_per_hour=60, idle_fraction=0.15, distinct_titles=300,
+                   seed=1, start=datetime(2025, 1, 6, 9, 0, 0)):
+    """
+    A list of segments {"start", "end", "window_title", "app_name", "idle"}
+    covering `hours` of activity. Focus changes arrive as a Poisson process at
+    switches_per_hour; roughly idle_fraction of the time is spent in idle stretches
+    longer than IDLE_THRESHOLD.
+    """
+    rng = random.Random(seed)
+    weights = [w for _, _, w in WINDOW_TEMPLATES]
+    end = start + timedelta(hours=hours)
+    mean_focus = 3600.0 / max(switches_per_hour, 1e-6)
+    segments = []
+    moment = start
+    while moment < end:
+        if rng.random() < idle_fraction * mean_focus / (IDLE_THRESHOLD * 2 + mean_focus):
+            duration = rng.uniform(IDLE_THRESHOLD, IDLE_THRESHOLD * 3)
+            segment = {"window_title": None, "app_name": None, "idle": True}
+        else:
+            duration = rng.expovariate(1.0 / mean_focus)
+            app_name, template, _ = rng.choices(WINDOW_TEMPLATES, weights)[0]
+            segment = {"window_title": _make_title(rng, template, distinct_titles),
+                       "app_name": app_name, "idle": False}
+        segment["start"] = moment
+        moment = min(end, moment + timedelta(seconds=max(1.0, duration)))
+        segment["end"] = moment
+        segments.append(segment)
+    return segments
+
+
+class TraceProbe(ActivityProbe):
+    """Probe driven by a trace and a simulated clock (set_time) instead of the desktop."""
+
+    def __init__(self, trace, supports_events=False):
+        super().__init__()
+        self.supports_events = supports_events
+        self.trace = trace
+        self._position = 0
+        self.now = trace[0]["start"] if trace else datetime.now()
+
+    def set_time(self, moment):
+        self.now = moment
+        while self._position + 1 < len(self.trace) and self.trace[self._position]["end"] <= moment:
+            self._position += 1
+
+    def _segment(self):
+        return self.trace[self._position] if self.trace else None
+
+    def segment_start(self):
+        """When the window (or idle stretch) now being reported actually began."""
+        segment = self._segment()
+        return segment["start"] if segment else self.now
+
+    def next_focus_change(self):
+        """Time of the next focus change an event-capable probe would report, or None."""
+        for segment in self.trace[self._position + 1:]:
+            if not segment["idle"]:
+                return segment["start"]
+        return None
+
+    def get_active_window(self):
+        segment = self._segment()
+        if segment is None or segment["idle"]:
+            return None, None
+        return segment["window_title"], segment["app_name"]
+
+    def get_idle_time(self):
+        segment = self._segment()
+        if segment is None or not segment["idle"]:
+            return 0
+        return IDLE_THRESHOLD + (self.now - segment["start"]).total_seconds()
+
+
+class StubLLMClient:
+    """
+    Stands in for the OpenAI client: answers the categorization prompt with one
+    deterministic category per numbered item and counts calls and items.
+    """
+
+    ITEM_RE = re.compile(r"^\s*(\d+)\. Window: '(.*)', App: '(.*)'$", re.MULTILINE)
+
+    def __init__(self, unsure_fraction=0.1):
+        self.calls = 0
+        self.items = 0
+        self.calls_by_model = Counter()
+        self.unsure_fraction = unsure_fraction  # Share of items answered with low confidence
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, model=None, messages=None, **kwargs):
+        prompt = messages[-1]["content"]
+        items = self.ITEM_RE.findall(prompt)
+        self.calls += 1
+        self.items += len(items)
+        self.calls_by_model[model] += 1
+        labels = {}
+        for number, title, app in items:
+            digest = zlib.crc32(f"{title}|{app}".encode())
+            unsure = (digest >> 8) % 1000 < self.unsure_fraction * 1000
+            labels[number] = {"category": LLM_CATEGORIES[digest % len(LLM_CATEGORIES)],
+                              "confidence": 0.5 if unsure else 0.95}
+        message = types.SimpleNamespace(content=json.dumps(labels))
+        # Roughly 25 prompt and 12 completion tokens per item
+        usage = types.SimpleNamespace(prompt_tokens=60 + 25 * len(items), completion_tokens=12 * len(items))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
@@ -0,0 +1,46 @@
+import re
+
+# Things in window titles that change without changing what the user is doing
+COUNTER_RE = re.compile(r"[(\[]\s*\d+\+?\s*[)\]]")  # "(3) Inbox", "Slack [12]"
+BADGE_RE = re.compile(r"^[\s*•●◉○✱✉🔴]+")  # unsaved/unread markers at the start
+URL_RE = re.compile(r"\b(?:https?://|www\.)\S+", re.IGNORECASE)
+EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+FILE_RE = re.compile(r"(?:[A-Za-z]:)?(?:[\w~.-]*[/\\])*[\w~-][\w~.-]*\.[A-Za-z][A-Za-z0-9]{0,5}\b")
+SEPARATOR_RE = re.compile(r"\s+[-–—|:·]\s+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def canonical_title(window_title):
+    """
+    Reduce a window title to the part that identifies the activity, e.g.
+    "(3) Inbox – Gmail" -> "inbox - gmail" and
+    "main.py — project — Visual Studio Code" -> "project - visual studio code".
+    """
+    title = window_title or ""
+    title = URL_RE.sub(" ", title)
+    title = EMAIL_RE.sub(" ", title)
+    title = COUNTER_RE.sub(" ", title)
+    title = BADGE_RE.sub("", title)
+
+    parts = []
+    for part in SEPARATOR_RE.split(title):
+        part = FILE_RE.sub(" ", part)
+        part = WHITESPACE_RE.sub(" ", part).strip(" *•●-–—|")
+        if part:
+            parts.append(part.lower())
+    return " - ".join(parts)
+
+
+def canonical_app(app_name):
+    return (app_name or "").strip().lower()
+
+
+def cache_key(item):
+    """Category cache key for a {"window_title", "app_name"} item."""
+    return f"{canonical_title(item['window_title'])}|{canonical_app(item['app_name'])}"
+
+
+def canonicalize_raw_key(key):
+    """Convert a legacy raw "window_title|app_name" cache key to its canonical form."""
+    window_title, _, app_name = key.rpartition("|")
+    return cache_key({"window_title": window_title, "app_name": app_name})
@@ -0,0 +1,286 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import (CATEGORIZE_BATCH_MAX_AGE, CATEGORIZE_BATCH_SIZE, CATEGORIZE_QUEUE_SIZE,
+                    CATEGORIZE_RETRY_DELAY, LABEL_INBOX_DIR, LABEL_INBOX_POLL_INTERVAL, PENDING_FILE)
+
+# What negatively cached items come back as: written once so the event shows it,
+# but the entry stays pending and its real label replaces it after the TTL
+PROVISIONAL_CATEGORY = "unknown"
+
+
+def submit_labels(labels, inbox_dir=LABEL_INBOX_DIR):
+    """
+    Hand labels ({"ref", "category"}) to the running tracker's worker, which holds
+    the event store's writer lock. Each call drops one complete file in the inbox.
+    """
+    os.makedirs(inbox_dir, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}-{threading.get_ident()}.jsonl"
+    temp_file = os.path.join(inbox_dir, name + ".tmp")
+    with open(temp_file, 'w') as f:
+        f.write("".join(json.dumps({"ref": label["ref"], "category": label["category"]}) + "\n"
+                        for label in labels))
+    os.replace(temp_file, os.path.join(inbox_dir, name))
+
+
+class CategorizationWorker(threading.Thread):
+    """
+    Categorizes logged entries in the background so the sampling loop never
+    waits on the network.
+
+    The logger submits entries to a bounded queue; the worker flushes them in
+    batches once CATEGORIZE_BATCH_SIZE entries are waiting or the oldest one is
+    CATEGORIZE_BATCH_MAX_AGE seconds old, and appends the resulting labels to
+    the event store. Entries stay in a pending set on disk until their label has
+    been written, so nothing is lost across restarts: submit() only appends the
+    new entry to a journal next to the pending file, and the worker folds the
+    journal into the pending file whenever it rewrites it. Labels other processes
+    submit to the inbox (see submit_labels) are written by the worker too.
+
+    Entries a batch leaves pending (backing off, or provisionally labelled) are
+    only requeued once their retry time has passed: retry_times reports it per
+    item, and without it they wait retry_delay.
+    """
+
+    def __init__(self, store, categorize, pending_file=PENDING_FILE, inbox_dir=LABEL_INBOX_DIR,
+                 queue_size=CATEGORIZE_QUEUE_SIZE, batch_size=CATEGORIZE_BATCH_SIZE,
+                 max_batch_age=CATEGORIZE_BATCH_MAX_AGE, retry_delay=CATEGORIZE_RETRY_DELAY, retry_times=None):
+        super().__init__(name="categorization-worker", daemon=True)
+        self.store = store
+        self.categorize = categorize  # callable: list of {"window_title", "app_name"} -> list of categories (or None)
+        self.retry_times = retry_times  # callable: same items -> list of epoch retry times (None: retry any time)
+        self.pending_file = pending_file
+        self.journal_file = f"{pending_file}.journal"
+        self.inbox_dir = inbox_dir
+        self.batch_size = batch_size
+        self.max_batch_age = max_batch_age
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._pending_lock = threading.Lock()
+        self._pending = self._load_pending()
+        self._queued = set()
+        self._not_before = {}  # seq -> epoch time before which a left-pending entry isn't requeued
+        self._next_requeue = 0.0
+        self._stop_event = threading.Event()
+
+    # --- pending set ---
+
+    def has_pending_file(self):
+        return os.path.exists(self.pending_file) or os.path.exists(self.journal_file)
+
+    def _load_pending(self):
+        pending = {}
+        if os.path.exists(self.pending_file):
+            try:
+                with open(self.pending_file, 'r') as f:
+                    pending = {int(seq): item for seq, item in json.load(f).items()}
+            except (ValueError, OSError) as e:
+                print(f"Could not read pending categorizations: {e}")
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash
+                    pending[record.pop("seq")] = record
+        return pending
+
+    def _save_pending(self):
+        """Rewrite the pending file from memory and empty the journal it now covers. Call with _pending_lock held."""
+        os.makedirs(os.path.dirname(self.pending_file), exist_ok=True)
+        temp_file = f"{self.pending_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self._pending, f)
+        os.replace(temp_file, self.pending_file)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def _journal(self, seq, item):
+        """Record one new pending entry by appending a line, not by rewriting the pending file."""
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(dict(item, seq=seq)) + "\n")
+
+    def pending_count(self):
+        with self._pending_lock:
+            return len(self._pending)
+
+    # --- producer side ---
+
+    def submit(self, entry):
+        """
+        Queue an event ({"seq", "window_title", "app_name", ...}) for categorization.
+        Never blocks: if the queue is full the entry stays in the pending set and
+        is picked up once the worker catches up.
+        """
+        item = {"window_title": entry["window_title"], "app_name": entry["app_name"]}
+        with self._pending_lock:
+            self._pending[entry["seq"]] = item
+            self._journal(entry["seq"], item)
+        if not self._enqueue(entry["seq"]):
+            self._next_requeue = 0.0  # Requeued as soon as the worker is idle
+
+    def _enqueue(self, seq):
+        with self._pending_lock:
+            if seq in self._queued:
+                return True
+            try:
+                self.queue.put_nowait(seq)
+            except queue.Full:
+                return False
+            self._queued.add(seq)
+        return True
+
+    # --- worker side ---
+
+    def run(self):
+        print("Starting categorization worker...")
+        self._requeue_pending()
+        batch = []
+        batch_started = None
+        inbox_checked = 0.0
+        while not self._stop_event.is_set():
+            if time.monotonic() - inbox_checked >= LABEL_INBOX_POLL_INTERVAL:
+                inbox_checked = time.monotonic()
+                self._ingest_inbox()
+            timeout = 1.0
+            if batch:
+                timeout = max(0.0, self.max_batch_age - (time.monotonic() - batch_started))
+            try:
+                seq = self.queue.get(timeout=timeout)
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(seq)
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or
+                          time.monotonic() - batch_started >= self.max_batch_age):
+                if not self._flush(batch):
+                    self._stop_event.wait(self.retry_delay)
+                batch = []
+            elif not batch and self.queue.empty() and time.time() >= self._next_requeue:
+                self._requeue_pending()
+
+    def _requeue_pending(self):
+        """
+        Move pending entries that didn't fit in the queue (or survived a restart) back
+        into it, skipping those whose retry time hasn't come; the next requeue is
+        scheduled for the earliest of those.
+        """
+        now = time.time()
+        with self._pending_lock:
+            waiting = [seq for seq in self._pending if seq not in self._queued]
+            later = [self._not_before[seq] for seq in waiting if self._not_before.get(seq, 0.0) > now]
+            due = [seq for seq in waiting if self._not_before.get(seq, 0.0) <= now]
+        self._next_requeue = min(later, default=float("inf"))
+        for seq in sorted(due):
+            if not self._enqueue(seq):
+                self._next_requeue = now  # The queue filled up: try the rest once it drains
+                break
+
+    def _flush(self, seqs):
+        """Categorize one batch and write the labels. Returns False if the batch should be retried."""
+        with self._pending_lock:
+            for seq in seqs:
+                self._queued.discard(seq)
+            seqs = [seq for seq in seqs if seq in self._pending]
+            items = [self._pending[seq] for seq in seqs]
+        if not items:
+            return True
+
+        try:
+            categories = self.categorize([{"window_title": item["window_title"], "app_name": item["app_name"]}
+                                          for item in items])
+        except Exception as e:
+            print(f"Categorization worker error: {e}")
+            return False
+
+        # A None category means "not yet" (e.g. the LLM item is backing off): keep it pending.
+        # A provisional one is written once and the entry stays pending until a real label comes.
+        labelled = [(seq, cat) for seq, item, cat in zip(seqs, items, categories)
+                    if cat is not None and not (cat == PROVISIONAL_CATEGORY and item.get("provisional"))]
+        self._defer([(seq, item) for seq, item, cat in zip(seqs, items, categories)
+                     if cat is None or cat == PROVISIONAL_CATEGORY])
+        if not labelled:
+            return False
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.store.append_many({"timestamp": timestamp, "ref": seq, "category": cat}
+                               for seq, cat in labelled)
+        with self._pending_lock:
+            for seq, cat in labelled:
+                if cat != PROVISIONAL_CATEGORY:
+                    self._pending.pop(seq, None)
+                    self._not_before.pop(seq, None)
+                elif seq in self._pending:
+                    self._pending[seq] = dict(self._pending[seq], provisional=True)
+            self._save_pending()
+        return True
+
+    def _defer(self, entries):
+        """Hold (seq, item) entries a batch left pending back until they may be retried."""
+        if not entries:
+            return
+        now = time.time()
+        if self.retry_times is None:
+            retry_at = [now + self.retry_delay] * len(entries)
+        else:
+            try:
+                retry_at = self.retry_times([{"window_title": item["window_title"], "app_name": item["app_name"]}
+                                             for _, item in entries])
+            except Exception as e:
+                print(f"Could not look up retry times: {e}")
+                retry_at = [now + self.retry_delay] * len(entries)
+        with self._pending_lock:
+            for (seq, _), at in zip(entries, retry_at):
+                self._not_before[seq] = at or now
+                self._next_requeue = min(self._next_requeue, at or now)
+
+    def _ingest_inbox(self):
+        """Write the labels waiting in the inbox, then delete their files."""
+        try:
+            names = sorted(name for name in os.listdir(self.inbox_dir) if name.endswith(".jsonl"))
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.inbox_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    labels = [json.loads(line) for line in f if line.strip()]
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.store.append_many({"timestamp": timestamp, "ref": label["ref"], "category": label["category"]}
+                                       for label in labels)
+                os.remove(path)
+            except (ValueError, KeyError, OSError) as e:
+                print(f"Could not write submitted labels from {name}: {e}")
+                continue
+            with self._pending_lock:
+                for label in labels:
+                    self._pending.pop(label["ref"], None)
+                    self._not_before.pop(label["ref"], None)
+                self._save_pending()
+            print(f"Wrote {len(labels)} submitted labels from {name}")
+
+    def drain(self):
+        """Categorize everything pending right now on the calling thread (replays and shutdown)."""
+        with self._pending_lock:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queued.clear()
+            seqs = sorted(self._pending)
+        for start in range(0, len(seqs), self.batch_size):
+            self._flush(seqs[start:start + self.batch_size])
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stop(self):
+        self._stop_event.set()
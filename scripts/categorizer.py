@@ -5,29 +5,137 @@ from datetime import datetime
 import threading
 
 # Import configurations
-from config import LOG_FILE, CATEGORY_FILE, CATEGORY_UPDATE_INTERVAL
+from archive import UsageArchive, compact
+from config import (CATEGORY_FILE, CATEGORY_UPDATE_INTERVAL, CATEGORY_CHANGES_FILE, CATEGORY_CHANGES_MAX_BYTES,
+                    CATEGORIZER_CHECKPOINT_FILE, ARCHIVE_COMPACT_INTERVAL)
+from event_store import is_label, open_event_store
+from records import ActivityColumns
+from rollups import UsageRollups
 
 # Global tracking variables
 last_file_write_time = 0
 # Increase the interval to avoid any accidental refresh
 VERY_STRICT_FILE_WRITE_INTERVAL = 300  # Exactly 5 minutes (300 seconds)
-in_memory_data = []
+in_memory_data = ActivityColumns()  # Interned, array-backed; iterate it for read-only record views
+read_cursor = None  # Event store position up to which in_memory_data is current
+has_unwritten_changes = False
+change_listeners = []
+rollups = UsageRollups()  # Session/time-bucket aggregates, fed with every change
 write_lock = threading.Lock()
+store = open_event_store()
+archive = UsageArchive()  # Closed days; in_memory_data and the exports only hold what isn't archived yet
+last_compaction_time = 0
+last_cycle_time = 0  # When the loop last finished a cycle, for the heartbeat
+
+def write_json_atomically(path, data):
+    """Write JSON to a temporary file first, then atomically replace the real file"""
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'w') as f:
+        if isinstance(data, ActivityColumns):
+            # Stream rows so the export never holds every entry as a dict at once
+            f.write("[")
+            for i, entry in enumerate(data.iter_dicts()):
+                if i:
+                    f.write(", ")
+                json.dump(entry, f)
+            f.write("]")
+        else:
+            json.dump(data, f)
+    os.replace(temp_file, path)
+
+def add_change_listener(callback):
+    """Register callback(changed_records), called with the new or relabeled entries of each cycle"""
+    change_listeners.append(callback)
+
+def append_changes(changed):
+    """Default downstream: append changed entries to CATEGORY_CHANGES_FILE as JSON lines"""
+    with open(CATEGORY_CHANGES_FILE, 'a') as f:
+        for entry in changed:
+            f.write(json.dumps(entry) + "\n")
+    rotate_changes_if_needed()
+
+def rotate_changes_if_needed():
+    """
+    Once CATEGORY_CHANGES_FILE outgrows CATEGORY_CHANGES_MAX_BYTES, move it to .1
+    (replacing the previous generation) and start a new file. The new file opens
+    with a {"base": n} line, n being the feed offset its entries continue from,
+    so readers' byte-offset cursors stay valid across the rotation.
+    """
+    try:
+        size = os.path.getsize(CATEGORY_CHANGES_FILE)
+        if size <= CATEGORY_CHANGES_MAX_BYTES:
+            return
+        with open(CATEGORY_CHANGES_FILE, 'rb') as f:
+            first = f.readline()
+        base, header = (json.loads(first)["base"], len(first)) if first.startswith(b'{"base"') else (0, 0)
+        temp_file = f"{CATEGORY_CHANGES_FILE}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(json.dumps({"base": base + size - header}) + "\n")
+        os.replace(CATEGORY_CHANGES_FILE, f"{CATEGORY_CHANGES_FILE}.1")
+        os.replace(temp_file, CATEGORY_CHANGES_FILE)
+    except (OSError, ValueError, KeyError) as e:
+        # e.g. a reader holds the file open on Windows; the next append tries again
+        print(f"Error rotating {CATEGORY_CHANGES_FILE}: {e}")
+
+def load_checkpoint():
+    """
+    Restore in-memory data and the read cursor from the last export, so a restart
+    only reads events appended since. Without a checkpoint, start from the beginning.
+    """
+    global in_memory_data, read_cursor
+
+    if not (os.path.exists(CATEGORIZER_CHECKPOINT_FILE) and os.path.exists(CATEGORY_FILE)):
+        return
+    try:
+        with open(CATEGORIZER_CHECKPOINT_FILE, 'r') as f:
+            cursor = json.load(f)
+        with open(CATEGORY_FILE, 'r') as f:
+            data = json.load(f)
+        in_memory_data = ActivityColumns(data)
+        in_memory_data.drop_through(archive.max_seq())  # Export may predate the last compaction
+        read_cursor = cursor
+        rollups.apply_all(in_memory_data)
+        print(f"Resuming categorizer from checkpoint: {len(data)} entries, cursor {cursor}")
+    except (ValueError, KeyError, OSError) as e:
+        print(f"Ignoring categorizer checkpoint: {e}")
+
+def save_checkpoint():
+    """Record the cursor matching the data just exported to CATEGORY_FILE"""
+    write_json_atomically(CATEGORIZER_CHECKPOINT_FILE, read_cursor)
 
 def categorize_entries():
-    """Process log entries but only store in memory"""
-    global in_memory_data
+    """
+    Apply events appended since the last cycle to the in-memory data.
+    Work per cycle is proportional to new activity, not to the total history.
+    """
+    global read_cursor, has_unwritten_changes
     
     try:
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r') as f:
-                log_data = json.load(f)
-            
-            # Store data in memory only (don't write to file yet)
-            in_memory_data = log_data  # Replace with actual categorization logic
-            print(f"Updated in-memory data: {len(in_memory_data)} entries at {datetime.now().strftime('%H:%M:%S')}")
-        else:
-            print(f"Warning: Log file not found: {LOG_FILE}")
+        records, cursor = store.read_since(read_cursor)
+        archived_max = archive.max_seq()
+        changed = {}
+        for record in records:
+            if is_label(record):
+                position = in_memory_data.find(record["ref"])
+                if position is None:
+                    continue
+                if in_memory_data[position].category != record["category"]:
+                    in_memory_data.set_category(position, record["category"])
+                    changed[record["ref"]] = position
+            elif record["seq"] > archived_max:  # Archived events are already counted
+                changed[record["seq"]] = in_memory_data.append(record)
+        read_cursor = cursor
+
+        if changed:
+            print(f"Updated in-memory data: {len(changed)} changed, {len(in_memory_data)} entries "
+                  f"at {datetime.now().strftime('%H:%M:%S')}")
+            changed = [in_memory_data[position].as_dict() for position in changed.values()]
+            has_unwritten_changes = True
+            for callback in change_listeners:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    print(f"Error in change listener: {e}")
     except Exception as e:
         print(f"Error in categorize_entries: {e}")
 
@@ -40,24 +148,22 @@ def time_until_next_write():
 
 def write_to_file_if_needed():
     """Write to file only if the time threshold is met, with thread safety"""
-    global last_file_write_time, in_memory_data
+    global last_file_write_time, in_memory_data, has_unwritten_changes
     
     # Get the lock to ensure thread safety
     with write_lock:
         current_time = time.time()
         time_since_last_write = current_time - last_file_write_time
         
-        # Only write if at least 5 minutes have passed
-        if time_since_last_write >= VERY_STRICT_FILE_WRITE_INTERVAL:
+        # Only write if at least 5 minutes have passed and something changed
+        if time_since_last_write >= VERY_STRICT_FILE_WRITE_INTERVAL and not has_unwritten_changes:
+            # Nothing changed since the last write: skip this one and wait for the next slot
+            last_file_write_time = current_time
+        elif time_since_last_write >= VERY_STRICT_FILE_WRITE_INTERVAL:
             try:
-                temp_file = f"{CATEGORY_FILE}.tmp"
-                
-                # Write to temporary file first
-                with open(temp_file, 'w') as f:
-                    json.dump(in_memory_data, f)
-                
-                # Atomically replace the real file
-                os.replace(temp_file, CATEGORY_FILE)
+                write_json_atomically(CATEGORY_FILE, in_memory_data)
+                save_checkpoint()
+                has_unwritten_changes = False
                 
                 last_file_write_time = current_time
                 next_write = datetime.fromtimestamp(current_time + VERY_STRICT_FILE_WRITE_INTERVAL)
@@ -71,11 +177,33 @@ def write_to_file_if_needed():
             if remaining % 60 < 1:  # Only print once a minute to reduce spam
                 print(f"Next file write in {int(remaining)} seconds")
 
+def compact_archive_if_due():
+    """Roll closed days into the archive, then drop them from memory and from the exports"""
+    global last_compaction_time, has_unwritten_changes
+
+    current_time = time.time()
+    if current_time - last_compaction_time < ARCHIVE_COMPACT_INTERVAL:
+        return
+    last_compaction_time = current_time
+    try:
+        summary = compact(store, archive)
+    except Exception as e:
+        print(f"Error compacting archive: {e}")
+        return
+    if summary["archived_days"]:
+        print(f"Archived {summary['rows']} events from {', '.join(summary['archived_days'])}")
+    if in_memory_data.drop_through(archive.max_seq()):
+        has_unwritten_changes = True
+
 def start_categorizer_loop():
     """Main loop that enforces the update schedule"""
-    global last_file_write_time
+    global last_file_write_time, last_cycle_time
     
     print("Starting categorizer loop with VERY strict file update interval")
+    rollups.apply_all(archive.iter_dicts())
+    load_checkpoint()
+    add_change_listener(rollups.apply_all)
+    add_change_listener(append_changes)
     last_file_write_time = time.time()  # Initialize with current time
     
     # For debugging - show when next file write will occur
@@ -87,8 +215,12 @@ def start_categorizer_loop():
             # Update data in memory
             categorize_entries()
             
+            # Move finished days out of memory and into the archive
+            compact_archive_if_due()
+
             # Check if we should write to file
             write_to_file_if_needed()
+            last_cycle_time = time.time()
             
             # Sleep for a while before next check
             time.sleep(CATEGORY_UPDATE_INTERVAL)
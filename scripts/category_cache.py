@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from canonicalize import canonicalize_raw_key
+from config import (CATEGORY_CACHE_DB, CATEGORY_CACHE_MAX_AGE_DAYS, CATEGORY_CACHE_MAX_ENTRIES,
+                    CATEGORY_CACHE_TOUCH_FLUSH_INTERVAL, LEGACY_CATEGORY_CACHE_FILE, LLM_MAX_ATTEMPTS, LLM_NEGATIVE_CACHE_TTL,
+                    LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+
+
+class CategoryCache:
+    """
+    SQLite-backed map of canonical "title|app" keys to categories.
+
+    Every update runs in one transaction, so the cache is never left half
+    written, and WAL mode lets the logger, the categorizer and a backfill job
+    share the file. The cache is bounded: entries unused for max_age_days are
+    dropped, and beyond max_entries the least recently used go first. Hits
+    only note the key in memory; their last_used times are written together on
+    the next update, or once touch_flush_interval has passed. The row count is
+    kept in memory too, so eviction only runs once it is over max_entries.
+    Supports the dict operations categorize_windows uses (get, in, [], update, items).
+
+    Keys the LLM failed to label are tracked in a second table with their
+    failure count and when they may be retried (exponential backoff). Past
+    LLM_MAX_ATTEMPTS failures a key is negatively cached: it reads as "unknown"
+    until LLM_NEGATIVE_CACHE_TTL has passed.
+    """
+
+    def __init__(self, path=CATEGORY_CACHE_DB, max_entries=CATEGORY_CACHE_MAX_ENTRIES,
+                 max_age_days=CATEGORY_CACHE_MAX_AGE_DAYS, legacy_file=LEGACY_CATEGORY_CACHE_FILE,
+                 touch_flush_interval=CATEGORY_CACHE_TOUCH_FLUSH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.touch_flush_interval = touch_flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last hit time, not yet written
+        self._last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS category_cache ("
+            " key TEXT PRIMARY KEY,"
+            " category TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_category_cache_last_used ON category_cache (last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS category_failures ("
+            " key TEXT PRIMARY KEY,"
+            " attempts INTEGER NOT NULL,"
+            " retry_at REAL NOT NULL)"
+        )
+        # Approximate when other processes write too; each one trims what it sees
+        self._count = self._conn.execute("SELECT COUNT(*) FROM category_cache").fetchone()[0]
+        if legacy_file and len(self) == 0:
+            self._import_json(legacy_file)
+
+    def _import_json(self, path):
+        """One-time migration of the old category_cache.json."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                legacy = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Could not import legacy category cache {path}: {e}")
+            return
+        self.update({canonicalize_raw_key(k): v for k, v in legacy.items()})
+        print(f"Imported {len(legacy)} cached categories from {path}")
+
+    # --- dict-style access ---
+
+    def get(self, key, default=None):
+        """Look up a key, counting the hit or miss and refreshing its LRU position (see flush)."""
+        with self._lock:
+            row = self._conn.execute("SELECT category FROM category_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._touched[key] = time.time()
+            if time.monotonic() - self._last_flush >= self.touch_flush_interval:
+                with self._transaction():
+                    self._flush_touched()
+            return row[0]
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM category_cache WHERE key = ?", (key,)).fetchone() is not None
+
+    def __setitem__(self, key, category):
+        self.update({key: category})
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM category_cache").fetchone()[0]
+
+    def items(self):
+        with self._lock:
+            return self._conn.execute("SELECT key, category FROM category_cache").fetchall()
+
+    def update(self, mapping):
+        """Upsert several entries in one transaction, then evict if over the limits."""
+        now = time.time()
+        rows = [(key, category, now, now) for key, category in dict(mapping).items()]
+        if not rows:
+            return
+        with self._lock:
+            with self._transaction():
+                self._flush_touched()
+                self._count += len(rows) - self._count_existing([row[0] for row in rows])
+                self._conn.executemany(
+                    "INSERT INTO category_cache (key, category, created, last_used) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET category = excluded.category, last_used = excluded.last_used",
+                    rows,
+                )
+                self._conn.executemany("DELETE FROM category_failures WHERE key = ?", [(row[0],) for row in rows])
+                self._evict(now)
+
+    def flush(self):
+        """Write the last_used times of the hits since the last flush."""
+        with self._lock:
+            if self._touched:
+                with self._transaction():
+                    self._flush_touched()
+
+    def clear(self):
+        """Drop every entry (e.g. after the category taxonomy changes)."""
+        with self._lock:
+            with self._transaction():
+                self._conn.execute("DELETE FROM category_cache")
+                self._conn.execute("DELETE FROM category_failures")
+            self._touched.clear()
+            self._count = 0
+
+    # --- failure tracking ---
+
+    def failure_state(self, keys, now=None):
+        """
+        Split keys with recorded failures into ({key: retry_at} still backing off,
+        set negatively cached). Keys whose retry time has passed are in neither.
+        """
+        now = time.time() if now is None else now
+        backing_off, negative = {}, set()
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, attempts, retry_at FROM category_failures"
+                    f" WHERE key IN ({','.join('?' * len(chunk))}) AND retry_at > ?",
+                    (*chunk, now),
+                ).fetchall()
+                for key, attempts, retry_at in rows:
+                    if attempts >= LLM_MAX_ATTEMPTS:
+                        negative.add(key)
+                    else:
+                        backing_off[key] = retry_at
+        return backing_off, negative
+
+    def retry_times(self, keys, now=None):
+        """{key: retry_at} for the keys that may not be sent to the LLM yet, backing off or negatively cached."""
+        backing_off, negative = self.failure_state(keys, now)
+        if negative:
+            negative = list(negative)
+            with self._lock:
+                for start in range(0, len(negative), 500):
+                    chunk = negative[start:start + 500]
+                    backing_off.update(self._conn.execute(
+                        f"SELECT key, retry_at FROM category_failures WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ))
+        return backing_off
+
+    def record_failures(self, keys, now=None):
+        """Count one more failure for each key and schedule its next attempt."""
+        now = time.time() if now is None else now
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            with self._transaction():
+                for key in keys:
+                    row = self._conn.execute(
+                        "SELECT attempts FROM category_failures WHERE key = ?", (key,)).fetchone()
+                    attempts = (row[0] if row else 0) + 1
+                    if attempts >= LLM_MAX_ATTEMPTS:
+                        delay = LLM_NEGATIVE_CACHE_TTL
+                    else:
+                        delay = min(LLM_RETRY_BASE_DELAY * 2 ** (attempts - 1), LLM_RETRY_MAX_DELAY)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO category_failures (key, attempts, retry_at) VALUES (?, ?, ?)",
+                        (key, attempts, now + delay),
+                    )
+
+    # --- eviction and stats ---
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE category_cache SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def _count_existing(self, keys):
+        existing = 0
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            existing += self._conn.execute(
+                f"SELECT COUNT(*) FROM category_cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchone()[0]
+        return existing
+
+    def _evict(self, now):
+        if self.max_age:
+            self._count -= self._conn.execute(
+                "DELETE FROM category_cache WHERE last_used < ?", (now - self.max_age,)).rowcount
+        if self.max_entries and self._count > self.max_entries:
+            self._count -= self._conn.execute(
+                "DELETE FROM category_cache WHERE key IN"
+                " (SELECT key FROM category_cache ORDER BY last_used LIMIT ?)",
+                (self._count - self.max_entries,),
+            ).rowcount
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,82 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from canonicalize import canonical_app, canonical_title
+from config import CLASSIFIER_MIN_CONFIDENCE, CLASSIFIER_MIN_EXAMPLES
+
+TOKEN_RE = re.compile(r"[a-z0-9#+]+")
+
+
+def tokenize(window_title, app_name):
+    """Word tokens of the canonical title plus one token for the app."""
+    tokens = TOKEN_RE.findall(canonical_title(window_title))
+    app = canonical_app(app_name)
+    if app:
+        tokens.append(f"app:{app}")
+    return tokens
+
+
+class TitleClassifier:
+    """
+    Multinomial naive Bayes over window title/app tokens.
+
+    Trains incrementally with learn() (counts only, so each update is O(tokens))
+    and answers with predict() only when the posterior of the best category is
+    at least min_confidence; otherwise the caller falls back to the LLM.
+    """
+
+    def __init__(self, min_confidence=CLASSIFIER_MIN_CONFIDENCE, min_examples=CLASSIFIER_MIN_EXAMPLES):
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.category_docs = Counter()
+        self.category_tokens = Counter()
+        self.token_counts = defaultdict(Counter)  # category -> token -> count
+        self.vocabulary = set()
+        self._lock = threading.Lock()
+
+    @property
+    def examples(self):
+        return sum(self.category_docs.values())
+
+    def learn(self, window_title, app_name, category):
+        if not category or category == "unknown":
+            return
+        tokens = tokenize(window_title, app_name)
+        with self._lock:
+            self.category_docs[category] += 1
+            self.category_tokens[category] += len(tokens)
+            self.token_counts[category].update(tokens)
+            self.vocabulary.update(tokens)
+
+    def learn_cache(self, cache):
+        """Train on every labeled entry of a category cache (canonical "title|app" keys)."""
+        for key, category in cache.items():
+            window_title, _, app_name = key.rpartition("|")
+            self.learn(window_title, app_name, category)
+
+    def predict(self, window_title, app_name):
+        """Return (category, confidence), or (None, confidence) when not confident enough."""
+        tokens = tokenize(window_title, app_name)
+        with self._lock:
+            if self.examples < self.min_examples or len(self.category_docs) < 2 or not tokens:
+                return None, 0.0
+            total_docs = self.examples
+            vocabulary_size = len(self.vocabulary) + 1
+            scores = {}
+            for category, docs in self.category_docs.items():
+                counts = self.token_counts[category]
+                denominator = self.category_tokens[category] + vocabulary_size
+                score = math.log(docs / total_docs)
+                for token in tokens:
+                    score += math.log((counts.get(token, 0) + 1) / denominator)
+                scores[category] = score
+
+        best = max(scores, key=scores.get)
+        # Softmax over log scores gives the posterior of the best category
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        if confidence < self.min_confidence:
+            return None, confidence
+        return best, confidence
@@ -1,4 +1,5 @@
 import os
+import socket
 script_dir = os.path.dirname(os.path.abspath(__file__))
 print(os.path.abspath(__file__))
 # Go up one level from scripts directory to the project root
@@ -10,9 +11,106 @@ CATEGORY_FILE = os.path.join(LOG_DIR, "categorized_log.json")
 API_LOG_FILE = os.path.join(LOG_DIR, "api_log.txt")
 API_CALL_COUNT_FILE = os.path.join(LOG_DIR, "api_calls.txt")
 
+# Tracker state that the dashboard doesn't serve directly
+STATE_DIR = os.path.join(script_dir, "logs")
+os.makedirs(STATE_DIR, exist_ok=True)
+
+# Event store: append-only, line-delimited segments (one file per day)
+EVENT_DIR = os.path.join(STATE_DIR, "events")
+EVENT_STORE_BACKEND = "segmented"  # "segmented" or "memory"
+EVENT_STORE_FSYNC = True  # fsync every append so a crash never loses a written line
+
+# Categorizer: tails the event store from a checkpoint and emits only changed entries
+CATEGORIZER_CHECKPOINT_FILE = os.path.join(STATE_DIR, "categorizer_checkpoint.json")
+CATEGORY_CHANGES_FILE = os.path.join(STATE_DIR, "categorized_changes.jsonl")
+CATEGORY_CHANGES_MAX_BYTES = 8 * 1024 * 1024  # Past this the file is rotated; one old generation (.1) is kept
+ROLLUP_MINUTE_RETENTION_HOURS = 48  # Hour and day rollups are kept for the whole history
+# Longest a session is credited without a following event; past it the tracker was
+# presumably stopped or the machine asleep. The tracker only logs changes, so an
+# unchanged window legitimately goes this long without an event.
+SESSION_MAX_SECONDS = 3600
+
+# Columnar archive: each closed day of events is compacted into one compressed partition
+ARCHIVE_DIR = os.path.join(STATE_DIR, "archive")
+ARCHIVE_RETENTION_DAYS = 730  # Partitions older than this are deleted (None keeps them all)
+EVENT_SEGMENT_RETENTION_DAYS = 7  # Archived event store segments are kept this long, then deleted
+ARCHIVE_COMPACT_INTERVAL = 3600  # seconds between compaction checks in the categorizer loop
+
+# Supervision: backend/api.py runs main.py as a child and restarts it if it dies or stops beating
+TRACKER_PID_FILE = os.path.join(STATE_DIR, "tracker.pid")
+HEARTBEAT_FILE = os.path.join(STATE_DIR, "tracker_heartbeat.json")
+HEARTBEAT_INTERVAL = 10  # seconds between heartbeats written by the tracker
+HEARTBEAT_STALE_AFTER = 180  # Restart a tracker whose heartbeat, sampling tick or categorizer cycle is this old
+SUPERVISOR_RESTART_DELAY = 2  # seconds before restarting a crashed tracker, doubling per crash...
+SUPERVISOR_MAX_RESTART_DELAY = 300  # ...up to this; reset after SUPERVISOR_STABLE_AFTER seconds of uptime
+SUPERVISOR_STABLE_AFTER = 300
+
+# Multi-machine sync (sync.py): each device pushes new event store records to one collector
+SYNC_DEVICE_ID = socket.gethostname()
+SYNC_COLLECTOR_URL = "http://localhost:8765"
+SYNC_COLLECTOR_PORT = 8765
+SYNC_COLLECTOR_DB = os.path.join(STATE_DIR, "sync_collector.sqlite3")
+SYNC_CHECKPOINT_FILE = os.path.join(STATE_DIR, "sync_checkpoint.json")
+SYNC_TOKEN = None  # Shared secret sent as X-Sync-Token; None disables the check
+SYNC_BATCH_RECORDS = 2000  # Records per push request
+SYNC_INTERVAL = 60  # seconds between pushes with --watch
+
 OPENAI_API_KEY = "YOUR_API_KEY"
 
 # Timing configurations
 TRACK_INTERVAL = 5  # Track activity every 5 seconds
 CATEGORY_UPDATE_INTERVAL = 30  # Process categories every 30 seconds in memory
 IDLE_THRESHOLD = 300  # seconds
+
+# Adaptive sampling: fast right after a change, backing off while nothing changes
+SAMPLE_MIN_INTERVAL = 1  # seconds between samples right after a focus change
+SAMPLE_BACKOFF = 2  # Interval multiplier per unchanged sample
+SAMPLE_MAX_INTERVAL = TRACK_INTERVAL  # Ceiling with a polling probe
+SAMPLE_MAX_INTERVAL_EVENTS = 60  # Ceiling when the probe pushes focus changes
+SAMPLE_MAX_INTERVAL_IDLE = 30  # Ceiling while idle (bounds how late a return is noticed)
+
+# Background categorization worker
+CATEGORIZE_QUEUE_SIZE = 1000  # Bounded so the logger never blocks on a slow worker
+CATEGORIZE_BATCH_SIZE = 20  # Flush once this many entries are waiting...
+CATEGORIZE_BATCH_MAX_AGE = 10  # ...or once the oldest has waited this many seconds
+CATEGORIZE_RETRY_DELAY = 30  # seconds to wait after a failed batch
+PENDING_FILE = os.path.join(STATE_DIR, "pending_categorization.json")
+LABEL_INBOX_DIR = os.path.join(STATE_DIR, "label_inbox")  # Labels from other processes (backfill) for the worker to write
+LABEL_INBOX_POLL_INTERVAL = 5  # seconds between inbox checks
+
+# Category cache (SQLite, bounded with LRU/age eviction)
+CATEGORY_CACHE_DB = os.path.join(STATE_DIR, "category_cache.sqlite3")
+CATEGORY_CACHE_MAX_ENTRIES = 50000
+CATEGORY_CACHE_MAX_AGE_DAYS = 180  # Entries unused this long are dropped
+CATEGORY_CACHE_TOUCH_FLUSH_INTERVAL = 60  # seconds hits may wait before their last_used is written
+LEGACY_CATEGORY_CACHE_FILE = os.path.join(LOG_DIR, "category_cache.json")  # Imported once
+
+# LLM tier: failed items back off individually instead of being re-sent every batch
+LLM_MAX_PROMPT_ITEMS = 25  # Items per request; the rest wait for a later batch
+LLM_RETRY_BASE_DELAY = 60  # seconds before retrying a failed item, doubling per failure...
+LLM_RETRY_MAX_DELAY = 3600  # ...up to this
+LLM_MAX_ATTEMPTS = 5  # After this many failures the item is provisionally labelled "unknown"...
+LLM_NEGATIVE_CACHE_TTL = 24 * 3600  # ...for this many seconds before it is tried again
+
+# Model tiering: the small model labels everything; only items it is unsure about,
+# or labels outside the taxonomy, are escalated to the large model
+LLM_TAXONOMY = ("work", "coding", "social media", "entertainment", "communication", "gaming", "utility", "browsing")
+LLM_SMALL_MODEL = "gpt-4o-mini"  # None sends everything straight to the large model
+LLM_LARGE_MODEL = "gpt-4"
+LLM_ESCALATE_BELOW_CONFIDENCE = 0.7
+LLM_MODEL_PRICES = {  # USD per million (input, output) tokens, for the per-item cost log
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.0, 60.0),
+}
+LLM_ITEM_LOG_FILE = os.path.join(STATE_DIR, "llm_items.jsonl")  # One line per LLM-labelled item
+LLM_ITEM_LOG_MAX_BYTES = 16 * 1024 * 1024  # Past this the log is rotated; one old generation (.1) is kept
+
+# Local title classifier, consulted after the rules and the cache and before the LLM
+CLASSIFIER_MIN_CONFIDENCE = 0.9  # Below this the item goes to the LLM
+CLASSIFIER_MIN_EXAMPLES = 50  # Don't answer until this many labels have been learned
+
+# Historical backfill (backfill.py)
+BACKFILL_CHECKPOINT_FILE = os.path.join(STATE_DIR, "backfill_checkpoint.json")
+BACKFILL_BATCH_SIZE = 20  # Items per LLM request
+BACKFILL_CONCURRENCY = 4  # Batches in flight at once
+BACKFILL_REQUESTS_PER_MINUTE = 60  # API request rate limit
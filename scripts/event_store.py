@@ -0,0 +1,397 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import EVENT_DIR, EVENT_STORE_BACKEND, EVENT_STORE_FSYNC
+
+SEGMENT_SUFFIX = ".jsonl"
+LOCK_FILE_NAME = ".writer.lock"
+# Held briefly by the writer when it opens a segment and by remove_segment; it
+# also holds the name of the segment the writer is appending to
+SEGMENT_LOCK_FILE_NAME = ".segments.lock"
+# Highest seq of any removed segment, so sequence numbers never restart after compaction
+HIGH_WATER_FILE_NAME = ".high_water.json"
+
+
+def _lock(lock_file, blocking=True):
+    if os.name == "nt":
+        import msvcrt
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+
+
+def _unlock(lock_file):
+    if os.name == "nt":
+        import msvcrt
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def is_label(record):
+    """Label records point back at an earlier event through their 'ref' sequence number."""
+    return "ref" in record
+
+
+def fold_labels(records):
+    """
+    Apply label records to the events they reference and return the events in log order.
+    The latest label for an event wins.
+    """
+    events = []
+    labels = {}
+    for record in records:
+        if is_label(record):
+            labels[record["ref"]] = record["category"]
+        else:
+            events.append(record)
+
+    folded = []
+    for event in events:
+        category = labels.get(event["seq"])
+        if category is not None:
+            event = dict(event, category=category)
+        folded.append(event)
+    return folded
+
+
+class Snapshot:
+    """
+    A point-in-time view of the store. Records appended after the snapshot was
+    taken are never visible through it.
+    """
+
+    def __init__(self, read_records):
+        self._read_records = read_records
+
+    def records(self):
+        """Iterate raw records (events and labels) in the order they were appended."""
+        return self._read_records()
+
+    def events(self):
+        """Return the events with their latest category labels applied."""
+        return fold_labels(self.records())
+
+
+class EventStore:
+    """
+    Interface for the tracker's event storage.
+    Events are dicts like the ones the logger used to keep in usage_log.json;
+    the store stamps each record with a monotonically increasing 'seq'.
+    """
+
+    def append(self, event):
+        raise NotImplementedError
+
+    def append_many(self, events):
+        return [self.append(event) for event in events]
+
+    def append_label(self, ref, category):
+        """Record the category of the event with sequence number `ref`."""
+        return self.append({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "ref": ref,
+            "category": category,
+        })
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def read_since(self, cursor=None):
+        """
+        Return (records appended after `cursor`, new cursor). Pass None to read from
+        the beginning. Cursors are plain dicts so callers can checkpoint them as JSON.
+        """
+        after = (cursor or {}).get("seq", 0)
+        records = [r for r in self.snapshot().records() if r["seq"] > after]
+        return records, {"seq": records[-1]["seq"] if records else after}
+
+    def is_empty(self):
+        return next(iter(self.snapshot().records()), None) is None
+
+    def close(self):
+        pass
+
+
+class MemoryEventStore(EventStore):
+    """Keeps records in a list. Used for replays and benchmarks."""
+
+    def __init__(self, writer=True):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def append(self, event):
+        with self._lock:
+            record = dict(event, seq=len(self._records) + 1)
+            self._records.append(record)
+        return record
+
+    def snapshot(self):
+        with self._lock:
+            count = len(self._records)
+        records = self._records
+        return Snapshot(lambda: iter(records[:count]))
+
+    def read_since(self, cursor=None):
+        after = (cursor or {}).get("seq", 0)
+        with self._lock:
+            records = self._records[after:]
+        return records, {"seq": after + len(records)}
+
+
+class SegmentedEventStore(EventStore):
+    """
+    Append-only log split into daily segments: <directory>/YYYY-MM-DD.jsonl.
+
+    Each record is a single JSON line and appends are flushed and fsynced before
+    they return, so a crash can at worst leave a torn final line, which is
+    discarded when the writer reopens the store. Only one process may open the store for writing;
+    any number of readers may take snapshots concurrently.
+    """
+
+    def __init__(self, directory=EVENT_DIR, writer=False, fsync=EVENT_STORE_FSYNC):
+        self.directory = directory
+        self.writer = writer
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._file = None
+        self._segment = None
+        self._last_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        if writer:
+            self._acquire_writer_lock()
+            self._recover()
+
+    # --- segments ---
+
+    def segments(self):
+        """Segment file names in log order."""
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_for(self, record):
+        day = str(record.get("timestamp", ""))[:10] or datetime.now().strftime("%Y-%m-%d")
+        name = day + SEGMENT_SUFFIX
+        # Never go back to an older segment, so file order always matches log order
+        if self._segment and name < self._segment:
+            return self._segment
+        return name
+
+    # --- writer ---
+
+    def _acquire_writer_lock(self):
+        path = os.path.join(self.directory, LOCK_FILE_NAME)
+        self._lock_file = open(path, "a+")
+        try:
+            _lock(self._lock_file, blocking=False)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Event store {self.directory} is already open for writing by another process")
+
+    @contextmanager
+    def _segments_locked(self):
+        """Cross-process lock between the writer switching segments and remove_segment."""
+        with open(os.path.join(self.directory, SEGMENT_LOCK_FILE_NAME), "a+") as lock_file:
+            _lock(lock_file)
+            try:
+                yield lock_file
+            finally:
+                _unlock(lock_file)
+
+    def high_water(self):
+        """Highest seq ever held by a removed segment (0 if none was removed)."""
+        try:
+            with open(os.path.join(self.directory, HIGH_WATER_FILE_NAME), "r") as f:
+                return json.load(f)["seq"]
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _recover(self):
+        """Drop a torn trailing line left by a crash and pick up the last sequence number."""
+        # Segments may all have been archived and removed; never reuse their seqs
+        self._last_seq = self.high_water()
+        segments = self.segments()
+        if not segments:
+            return
+        path = self._segment_path(segments[-1])
+        with open(path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                print(f"Event store: discarding {len(data) - end} bytes of torn write in {segments[-1]}")
+                f.truncate(end)
+        self._segment = segments[-1]
+        for name in reversed(segments):
+            lines = _complete_lines(self._segment_path(name))
+            if lines:
+                self._last_seq = max(self._last_seq, json.loads(lines[-1])["seq"])
+                break
+
+    def append(self, event):
+        return self.append_many([event])[0]
+
+    def append_many(self, events):
+        """Append several records, syncing each touched segment once."""
+        if not self.writer:
+            raise RuntimeError("Event store was opened read-only")
+        written = []
+        with self._lock:
+            for event in events:
+                record = dict(event, seq=self._last_seq + 1)
+                segment = self._segment_for(record)
+                if segment != self._segment or self._file is None:
+                    self._sync_and_close()
+                    self._segment = segment
+                    with self._segments_locked() as lock_file:
+                        # Tell remove_segment (possibly in another process) which segment is live
+                        lock_file.seek(0)
+                        lock_file.truncate()
+                        lock_file.write(segment)
+                        lock_file.flush()
+                        self._file = open(self._segment_path(segment), "ab")
+                self._file.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                self._last_seq = record["seq"]
+                written.append(record)
+            if self._file:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+        return written
+
+    def _sync_and_close(self):
+        if self._file:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    # --- readers ---
+
+    def snapshot(self):
+        with self._lock:
+            bounds = []
+            for name in self.segments():
+                try:
+                    bounds.append((name, os.path.getsize(self._segment_path(name))))
+                except FileNotFoundError:
+                    continue
+
+        def read_records():
+            for name, size in bounds:
+                for line in _complete_lines(self._segment_path(name), size):
+                    yield json.loads(line)
+
+        return Snapshot(read_records)
+
+    def read_since(self, cursor=None):
+        """Tail the log from a {"segment", "offset"} cursor, reading only the bytes appended since."""
+        segment = (cursor or {}).get("segment", "")
+        offset = (cursor or {}).get("offset", 0)
+        last_seq = (cursor or {}).get("seq", 0)
+        records = []
+        for name in self.segments():
+            if name < segment:
+                continue
+            start = offset if name == segment else 0
+            try:
+                with open(self._segment_path(name), "rb") as f:
+                    f.seek(start)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].split(b"\n"):
+                if line:
+                    records.append(json.loads(line))
+            segment, offset = name, start + end
+        if records:
+            last_seq = records[-1]["seq"]
+        return records, {"segment": segment, "offset": offset, "seq": last_seq}
+
+    def read_segment(self, name):
+        """All complete records of one segment."""
+        return [json.loads(line) for line in _complete_lines(self._segment_path(name))]
+
+    def remove_segment(self, name):
+        """
+        Delete a closed segment, e.g. once its events have been archived. The
+        segment the writer appends to (in whichever process) and the newest one
+        are never removed, and the high-water mark keeps their seqs from being reused.
+        """
+        with self._lock, self._segments_locked() as lock_file:
+            lock_file.seek(0)
+            live = lock_file.read().strip()
+            segments = self.segments()
+            if name == self._segment or (live and name >= live) or (segments and name >= segments[-1]):
+                raise RuntimeError(f"Segment {name} is still being written")
+            lines = _complete_lines(self._segment_path(name))
+            if lines:
+                last_seq = json.loads(lines[-1])["seq"]
+                if last_seq > self.high_water():
+                    path = os.path.join(self.directory, HIGH_WATER_FILE_NAME)
+                    temp_file = f"{path}.tmp"
+                    with open(temp_file, "w") as f:
+                        json.dump({"seq": last_seq}, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_file, path)
+            try:
+                os.remove(self._segment_path(name))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._sync_and_close()
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+def _complete_lines(path, size=None):
+    """Newline-terminated lines of a segment, ignoring any partially written tail."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read() if size is None else f.read(size)
+    except FileNotFoundError:
+        return []
+    end = data.rfind(b"\n") + 1
+    return [line for line in data[:end].split(b"\n") if line]
+
+
+BACKENDS = {
+    "segmented": SegmentedEventStore,
+    "memory": MemoryEventStore,
+}
+
+
+def open_event_store(writer=False, backend=EVENT_STORE_BACKEND):
+    """Open the configured event store. Pass writer=True from the logger only."""
+    return BACKENDS[backend](writer=writer)
+
+
+def import_json_log(store, path):
+    """One-time migration of a legacy usage_log.json array into the store."""
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"Could not import legacy log {path}: {e}")
+        return 0
+    store.append_many({k: v for k, v in entry.items() if k != "seq"} for entry in entries)
+    print(f"Imported {len(entries)} entries from {path} into the event store")
+    return len(entries)
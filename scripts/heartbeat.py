@@ -0,0 +1,47 @@
+"""
+Tracker liveness file.
+
+main.py rewrites HEARTBEAT_FILE every HEARTBEAT_INTERVAL seconds with its pid
+and current health (tick latency, categorization queue depth, ...). The
+supervisor in backend/api.py reads it to answer status requests without
+touching the process table, and restarts a tracker whose heartbeat goes stale.
+The heartbeat is written by its own thread, so it also carries when the
+sampling loop last ticked and the categorizer last finished a cycle; if
+either stops advancing the tracker counts as hung even though it still beats.
+"""
+import json
+import os
+import time
+
+from config import HEARTBEAT_FILE, HEARTBEAT_INTERVAL
+
+# Timestamps that must all be recent for the tracker to count as alive
+HEARTBEAT_PROGRESS_FIELDS = ("time", "last_tick", "categorizer_last_cycle")
+
+
+def write_heartbeat(health, path=HEARTBEAT_FILE):
+    """Atomically replace the heartbeat with the given health fields, stamped with pid and time."""
+    payload = {"pid": os.getpid(), "time": time.time(), **health}
+    temp_file = f"{path}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(payload, f)
+    os.replace(temp_file, path)
+
+
+def read_heartbeat(path=HEARTBEAT_FILE):
+    """The last heartbeat, or None if there is none (or it can't be read)."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_heartbeat(collect, stop_event, interval=HEARTBEAT_INTERVAL, path=HEARTBEAT_FILE):
+    """Write collect()'s health every interval seconds until stop_event is set."""
+    while not stop_event.is_set():
+        try:
+            write_heartbeat(collect(), path)
+        except Exception as e:
+            print(f"Error writing heartbeat: {e}")
+        stop_event.wait(interval)
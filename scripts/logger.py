@@ -1,11 +1,23 @@
 from datetime import datetime
 
+import json
 import os
+import re
+import threading
 import time
-import json
 from datetime import datetime
-from config import IDLE_THRESHOLD, TRACK_INTERVAL, LOG_FILE, LOG_DIR
-from utils import get_active_window, get_idle_time
+from collections import Counter
+from config import (IDLE_THRESHOLD, TRACK_INTERVAL, LOG_FILE, API_CALL_COUNT_FILE, LLM_MAX_PROMPT_ITEMS,
+                    LLM_TAXONOMY, LLM_SMALL_MODEL, LLM_LARGE_MODEL, LLM_ESCALATE_BELOW_CONFIDENCE,
+                    LLM_MODEL_PRICES, LLM_ITEM_LOG_FILE, LLM_ITEM_LOG_MAX_BYTES)
+from canonicalize import cache_key
+from category_cache import CategoryCache
+from categorization_worker import CategorizationWorker
+from classifier import TitleClassifier
+from event_store import import_json_log, open_event_store
+from probe import get_probe
+from rules import match_rules
+from scheduler import AdaptiveScheduler
 from openai import OpenAI
 
 
@@ -23,65 +35,365 @@ openai_client = OpenAI()
 # === CACHE UTILITIES ===
 def load_cache():
     """
-    Load the category cache from disk, or return empty dict if none exists.
+    Open the SQLite category cache (importing category_cache.json the first time).
     """
-    cache_file = os.path.join(LOG_DIR, "category_cache.json")
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r') as f:
-            return json.load(f)
-    return {}
+    return CategoryCache()
+
 
+# === TIER STATS ===
+# How many items each tier answered: rules table, category cache, local classifier, LLM,
+# the negative cache (items the LLM keeps failing on), and LLM failures
+CATEGORIZATION_TIERS = ("rules", "cache", "classifier", "llm", "negative", "llm_failed")
+tier_counts = Counter()
+# Per model: items it labelled (model name) and what they cost in USD (model name + "_usd")
+llm_usage = Counter()
+item_log_lock = threading.Lock()  # Backfill labels from several threads at once
 
-def save_cache(cache):
+
+def save_tier_stats(cache=None):
     """
-    Save the category cache back to disk.
+    Write the per-tier hit rates (and cache counters) to API_CALL_COUNT_FILE, which print_metrics shows.
     """
-    cache_file = os.path.join(LOG_DIR, "category_cache.json")
-    with open(cache_file, 'w') as f:
-        json.dump(cache, f, indent=2)
+    answered = sum(tier_counts[t] for t in CATEGORIZATION_TIERS)
+    lines = ["Categorization tiers:"]
+    for tier in CATEGORIZATION_TIERS:
+        share = 100 * tier_counts[tier] / answered if answered else 0
+        lines.append(f"  {tier}: {tier_counts[tier]} ({share:.1f}%)")
+    lines.append(f"API calls: {tier_counts['api_calls']}")
+    lines.append(f"Deferred (backing off or over the prompt cap): {tier_counts['deferred']}")
+    for model in dict.fromkeys((LLM_SMALL_MODEL, LLM_LARGE_MODEL)):
+        if model:
+            lines.append(f"  {model}: {llm_usage[model]} items, ${llm_usage[model + '_usd']:.4f}")
+    lines.append(f"Escalated to {LLM_LARGE_MODEL}: {tier_counts['escalated']}")
+    lines.append(f"Off-taxonomy {LLM_LARGE_MODEL} labels (backed off): {tier_counts['off_taxonomy']}")
+    if hasattr(cache, "stats"):
+        stats = cache.stats()
+        lines.append(f"Category cache: {stats['entries']} entries, {stats['hits']} hits, "
+                     f"{stats['misses']} misses ({100 * stats['hit_rate']:.1f}% hit rate)")
+    with open(API_CALL_COUNT_FILE, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
 
+# Learns from every LLM label; trained on the whole cache when the logger starts
+classifier = TitleClassifier()
 
-def categorize_windows(batch, cache):
+
+LABEL_LINE_RE = re.compile(r"^\s*(\d+)\s*[.:)-]\s*(.+?)\s*$", re.MULTILINE)
+
+
+def parse_answers(content, count):
     """
-    Batch: list of {"window_title": str, "app_name": str}.
-    Uses OpenAI client to categorize uncached items, updates cache, and returns categories in order.
-    """
-    uncached = []
-    keys = []
-    for item in batch:
-        key = f"{item['window_title']}|{item['app_name']}"
-        if key not in cache:
-            uncached.append(item)
-            keys.append(key)
-
-    # Query OpenAI only for new items
-    if uncached:
-        prompt = (
-            "Categorize the following window titles and app names into high-level activity categories like 'work',"
-            " 'coding', 'social media', 'entertainment', 'communication', 'gaming', 'utility', or 'browsing'." +
-            "\n\n"
-        )
-        for i, it in enumerate(uncached, 1):
-            prompt += f"{i}. Window: '{it['window_title']}', App: '{it['app_name']}'\n"
-        prompt += "\nRespond with only the list of categories, one per line."
+    Read the model's {"1": {"category": "coding", "confidence": 0.9}, ...} answer into
+    {item number: (category, confidence)}. Plain {"1": "coding"} values and "1. coding"
+    lines are accepted too, with confidence 1.0. Unknown numbers and empty labels are
+    ignored, so a partial answer still labels the items it covers.
+    """
+    pairs = []
+    start, end = content.find("{"), content.rfind("}")
+    if start != -1 and end > start:
+        try:
+            pairs = list(json.loads(content[start:end + 1]).items())
+        except (ValueError, AttributeError):
+            pairs = []
+    if not pairs:
+        pairs = LABEL_LINE_RE.findall(content)
 
+    answers = {}
+    for number, answer in pairs:
         try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-            )
-            results = response.choices[0].message.content.strip().splitlines()
-
-            # Update cache
-            for k, cat in zip(keys, results):
-                cache[k] = cat.strip()
-            save_cache(cache)
+            number = int(number)
+        except (TypeError, ValueError):
+            continue
+        confidence = 1.0
+        if isinstance(answer, dict):
+            try:
+                confidence = min(1.0, max(0.0, float(answer.get("confidence", 1.0))))
+            except (TypeError, ValueError):
+                confidence = 0.0
+            answer = answer.get("category")
+        if 1 <= number <= count and isinstance(answer, str) and answer.strip():
+            answers[number] = (answer.strip(), confidence)
+    return answers
+
+
+def parse_labels(content, count):
+    """{item number: category} from the model's answer (see parse_answers)."""
+    return {number: category for number, (category, _) in parse_answers(content, count).items()}
+
+
+def request_cost(model, usage):
+    """USD cost of one request from its token usage (0 if the model or usage is unknown)."""
+    prices = LLM_MODEL_PRICES.get(model)
+    if prices is None or usage is None:
+        return 0.0
+    return (getattr(usage, "prompt_tokens", 0) * prices[0] + getattr(usage, "completion_tokens", 0) * prices[1]) / 1e6
+
+
+def query_llm(model, items, client=None, counts=None, usage=None):
+    """
+    Ask one model to label items, a list of (key, {"window_title", "app_name"}).
+    Returns ({key: (category, confidence)}, cost per item in USD). Raises on API errors.
+    client, counts and usage default to openai_client, tier_counts and llm_usage.
+    """
+    client = openai_client if client is None else client
+    counts = tier_counts if counts is None else counts
+    usage = llm_usage if usage is None else usage
+    prompt = (
+        "Categorize the following window titles and app names into one of these high-level activity"
+        f" categories: {', '.join(repr(c) for c in LLM_TAXONOMY)}.\n\n"
+    )
+    for i, (_, it) in enumerate(items, 1):
+        prompt += f"{i}. Window: '{it['window_title']}', App: '{it['app_name']}'\n"
+    prompt += ("\nRespond with only a JSON object mapping each item number to its category and your"
+               " confidence between 0 and 1, e.g. {\"1\": {\"category\": \"coding\", \"confidence\": 0.95}}.")
+
+    counts["api_calls"] += 1
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+    )
+    answers = parse_answers(response.choices[0].message.content or "", len(items))
+    cost = request_cost(model, getattr(response, "usage", None)) / len(items)
+    usage[model + "_usd"] += cost * len(items)
+    return {items[number - 1][0]: answer for number, answer in answers.items()}, cost
+
+
+def query_tiered(items, client=None, counts=None, usage=None):
+    """
+    Label items with the small model, escalating to the large one only what the small
+    model is unsure of (below LLM_ESCALATE_BELOW_CONFIDENCE) or labels outside
+    LLM_TAXONOMY. Large-model labels outside LLM_TAXONOMY are left out of the result,
+    so the caller backs them off like any other failure. Returns {key: category} and
+    appends one line per labelled item, with its model, confidence and cost, to
+    LLM_ITEM_LOG_FILE.
+    """
+    counts = tier_counts if counts is None else counts
+    usage = llm_usage if usage is None else usage
+    answered = {}
+    records = []
+    spent = Counter()  # key -> USD spent on it so far
+    escalate = items
+    if LLM_SMALL_MODEL:
+        try:
+            answers, cost = query_llm(LLM_SMALL_MODEL, items, client, counts, usage)
         except Exception as e:
-            print(f"Categorization error: {e}")
+            print(f"Categorization error ({LLM_SMALL_MODEL}): {e}")
+            answers, cost = {}, 0.0
+        escalate = []
+        for key, item in items:
+            spent[key] += cost
+            category, confidence = answers.get(key, ("", 0.0))
+            category = category.strip().lower()  # "Coding " is still in the taxonomy
+            if category in LLM_TAXONOMY and confidence >= LLM_ESCALATE_BELOW_CONFIDENCE:
+                answered[key] = category
+                records.append({"key": key, "category": category, "model": LLM_SMALL_MODEL,
+                                "confidence": confidence, "cost_usd": spent[key]})
+            else:
+                escalate.append((key, item))
+        usage[LLM_SMALL_MODEL] += len(answered)
+        counts["escalated"] += len(escalate)
+
+    if escalate:
+        try:
+            answers, cost = query_llm(LLM_LARGE_MODEL, escalate, client, counts, usage)
+        except Exception as e:
+            print(f"Categorization error ({LLM_LARGE_MODEL}): {e}")
+            answers, cost = {}, 0.0
+        for key, _ in escalate:
+            spent[key] += cost
+            if key not in answers:
+                continue
+            category, confidence = answers[key]
+            category = category.strip().lower()
+            record = {"key": key, "category": category, "model": LLM_LARGE_MODEL, "confidence": confidence,
+                      "cost_usd": spent[key], "escalated": bool(LLM_SMALL_MODEL)}
+            if category in LLM_TAXONOMY:
+                answered[key] = category
+                usage[LLM_LARGE_MODEL] += 1
+            else:
+                record["off_taxonomy"] = True
+                counts["off_taxonomy"] += 1
+            records.append(record)
+
+    if records and LLM_ITEM_LOG_FILE:
+        append_item_log(records)
+    return answered
 
-    # Return categories for the full batch
-    return [cache.get(f"{it['window_title']}|{it['app_name']}", "unknown") for it in batch]
+
+def append_item_log(records):
+    """
+    Append records to LLM_ITEM_LOG_FILE. Past LLM_ITEM_LOG_MAX_BYTES the file moves to
+    LLM_ITEM_LOG_FILE.1 (replacing the previous one) and a new file is started.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with item_log_lock:
+        with open(LLM_ITEM_LOG_FILE, 'a') as f:
+            f.write("".join(json.dumps(dict(record, time=timestamp)) + "\n" for record in records))
+            size = f.tell()
+        if size > LLM_ITEM_LOG_MAX_BYTES:
+            try:
+                os.replace(LLM_ITEM_LOG_FILE, f"{LLM_ITEM_LOG_FILE}.1")
+            except OSError as e:
+                print(f"Error rotating {LLM_ITEM_LOG_FILE}: {e}")
+
+
+def categorize_windows(batch, cache, client=None, counts=None, usage=None):
+    """
+    Batch: list of {"window_title": str, "app_name": str}.
+    Tries the rules table, then the cache (keyed by canonical title and app), then the
+    local classifier, and uses the OpenAI client only for what's left, at most
+    LLM_MAX_PROMPT_ITEMS per request: a small model first, escalating to a larger one
+    only the items it is unsure of (see query_tiered). Items the LLM fails to label back
+    off individually (see CategoryCache.record_failures) and come back as None, meaning
+    "try again later"; items that keep failing come back as "unknown" until their negative
+    cache entry expires (the worker keeps those pending, so a real label follows).
+    Updates cache and returns categories in order.
+
+    Tier counts go to the module's tier_counts and llm_usage, which are saved after
+    every batch. Callers categorizing on several threads pass their own counts and
+    usage Counters instead (and a client), and merge and save them themselves.
+    """
+    shared = counts is None
+    counts = tier_counts if counts is None else counts
+    usage = llm_usage if usage is None else usage
+    categories = [match_rules(item['window_title'], item['app_name']) for item in batch]
+    keys = [cache_key(item) for item in batch]
+
+    counts["rules"] += sum(1 for category in categories if category)
+
+    # Each canonical window is looked up once, however often it repeats in the batch
+    distinct = {}
+    for item, key, category in zip(batch, keys, categories):
+        if not category:
+            distinct.setdefault(key, item)
+
+    labels = {}
+    uncached = {}
+    for key, item in distinct.items():
+        cached = cache.get(key)
+        if cached is not None:
+            counts["cache"] += 1
+            labels[key] = cached
+            continue
+        predicted, _ = classifier.predict(item['window_title'], item['app_name'])
+        if predicted:
+            counts["classifier"] += 1
+            labels[key] = predicted
+        else:
+            uncached[key] = item
+
+    # Skip items still backing off from a failure; repeated failures are negatively cached
+    backing_off, negative = cache.failure_state(uncached) if uncached else ({}, set())
+    for key in negative:
+        labels[key] = "unknown"
+    counts["negative"] += len(negative)
+    to_query = [(k, it) for k, it in uncached.items() if k not in backing_off and k not in negative]
+    counts["deferred"] += len(backing_off) + max(0, len(to_query) - LLM_MAX_PROMPT_ITEMS)
+    to_query = to_query[:LLM_MAX_PROMPT_ITEMS]
+
+    # Query OpenAI only for new items: small model first, escalating what it is unsure of
+    if to_query:
+        answered = query_tiered(to_query, client, counts, usage)
+        items = dict(to_query)
+        for k, category in answered.items():
+            classifier.learn(items[k]['window_title'], items[k]['app_name'], category)
+        cache.update(answered)
+        counts["llm"] += len(answered)
+
+        failed = [k for k, _ in to_query if k not in answered]
+        if failed:
+            cache.record_failures(failed)
+            counts["llm_failed"] += len(failed)
+        labels.update(answered)
+
+    if shared:
+        save_tier_stats(cache)
+
+    # Return categories for the full batch (None: not categorized yet)
+    return [category or labels.get(key) for key, category in zip(keys, categories)]
+
+
+def retry_times(batch, cache):
+    """When each item of a batch may go to the LLM again (None: now), for the worker to schedule requeues."""
+    keys = [cache_key(item) for item in batch]
+    waiting = cache.retry_times(set(keys))
+    return [waiting.get(key) for key in keys]
+
+
+def sample_activity(probe, store, worker, last, timestamp):
+    """
+    Take one sample from the probe and log it if the window or status changed.
+    `last` holds the previous sample ({"window_title", "app_name", "status", "idle_time"})
+    and is updated in place. Returns True if anything was written.
+    """
+    idle_time = probe.get_idle_time()
+    last["idle_time"] = idle_time
+
+    current_window_title = "idle"
+    current_app_name = "idle"
+    current_status = "idle"
+
+    if idle_time < IDLE_THRESHOLD:
+        window_title, app_name = probe.get_active_window()
+        if window_title and app_name:
+            current_window_title = window_title
+            current_app_name = app_name
+            current_status = "active"
+
+    if (current_window_title == last["window_title"] and
+            current_app_name == last["app_name"] and
+            current_status == last["status"]):
+        return False
+
+    if last["status"] == "active":
+        closed_entry = {
+            "timestamp": timestamp,
+            "window_title": last["window_title"],
+            "app_name": last["app_name"],
+            "category": "",
+            "status": "closed"
+        }
+        store.append(closed_entry)
+
+    entry = {
+        "timestamp": timestamp,
+        "window_title": current_window_title,
+        "app_name": current_app_name,
+        "category": "" if current_status != "idle" else "N/A",
+        "status": current_status
+    }
+    entry = store.append(entry)
+    if current_status == "active":
+        worker.submit(entry)
+
+    last["window_title"] = current_window_title
+    last["app_name"] = current_app_name
+    last["status"] = current_status
+    return True
+
+
+# Set by log_usage; print_metrics reports its effective sample rate
+sampling_scheduler = None
+categorization_worker = None
+# Sampling tick timings for the heartbeat; max_latency covers the time since the last heartbeat
+tick_stats = {"last_tick": 0.0, "latency": 0.0, "max_latency": 0.0}
+
+
+def health_snapshot():
+    """Logger health for the heartbeat: tick latency, categorization backlog, sample rate."""
+    health = {
+        "last_tick": tick_stats["last_tick"],
+        "tick_latency_ms": tick_stats["latency"] * 1000,
+        "tick_latency_max_ms": tick_stats["max_latency"] * 1000,
+    }
+    tick_stats["max_latency"] = 0.0
+    if categorization_worker is not None:
+        health["queue_depth"] = categorization_worker.queue_depth()
+        health["pending_categorization"] = categorization_worker.pending_count()
+    if sampling_scheduler is not None:
+        health["samples_per_minute"] = sampling_scheduler.samples_per_minute()
+    return health
 
 
 def log_usage():
@@ -89,85 +401,43 @@ def log_usage():
     Main function to continuously log user activity.
     This runs in a separate thread.
     """
+    global sampling_scheduler, categorization_worker
     print("Starting activity logger...")
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w') as f:
-            json.dump([], f)
+    store = open_event_store(writer=True)
+    if store.is_empty():
+        import_json_log(store, LOG_FILE)
+
+    # Event-capable probes wake the scheduler as soon as focus changes
+    probe = get_probe()
+    sampling_scheduler = AdaptiveScheduler(event_driven=probe.supports_events)
+    probe.subscribe(lambda window_title, app_name: sampling_scheduler.wake())
+    probe.start()
 
+    # Categorization runs on its own thread so a slow API call never delays sampling
     cache = load_cache()
-    last_window_title = None
-    last_app_name = None
-    last_status = None
+    classifier.learn_cache(cache)
+    worker = CategorizationWorker(store, lambda batch: categorize_windows(batch, cache),
+                                  retry_times=lambda batch: retry_times(batch, cache))
+    if not worker.has_pending_file():
+        for e in store.snapshot().events():
+            if e["category"] == "" and e["status"] == "active":
+                worker.submit(e)
+    worker.start()
+    categorization_worker = worker
+
+    last = {"window_title": None, "app_name": None, "status": None, "idle_time": 0}
 
     while True:
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            idle_time = get_idle_time()
-
-            current_window_title = "idle"
-            current_app_name = "idle"
-            current_status = "idle"
-
-            if idle_time < IDLE_THRESHOLD:
-                window_title, app_name = get_active_window()
-                if window_title and app_name:
-                    current_window_title = window_title
-                    current_app_name = app_name
-                    current_status = "active"
-
-            if (current_window_title != last_window_title or
-                current_app_name != last_app_name or
-                current_status != last_status):
-
-                if last_status == "active":
-                    closed_entry = {
-                        "timestamp": timestamp,
-                        "window_title": last_window_title,
-                        "app_name": last_app_name,
-                        "category": "",
-                        "status": "closed"
-                    }
-                    with open(LOG_FILE, 'r+') as f:
-                        data = json.load(f)
-                        data.append(closed_entry)
-                        f.seek(0)
-                        json.dump(data, f, indent=2)
-                        f.truncate()
-
-                entry = {
-                    "timestamp": timestamp,
-                    "window_title": current_window_title,
-                    "app_name": current_app_name,
-                    "category": "" if current_status != "idle" else "N/A",
-                    "status": current_status
-                }
-
-                with open(LOG_FILE, 'r+') as f:
-                    data = json.load(f)
-                    data.append(entry)
-                    f.seek(0)
-                    json.dump(data, f, indent=2)
-                    f.truncate()
-
-                last_window_title = current_window_title
-                last_app_name = current_app_name
-                last_status = current_status
-
-            # After sleeping, categorize any uncategorized 'active' entries in batch
-            with open(LOG_FILE, 'r+') as f:
-                data = json.load(f)
-                uncategorized = [e for e in data if e["category"] == "" and e["status"] == "active"]
-                if uncategorized:
-                    batch = [{"window_title": e["window_title"], "app_name": e["app_name"]} for e in uncategorized]
-                    categories = categorize_windows(batch, cache)
-                    for e, cat in zip(uncategorized, categories):
-                        e["category"] = cat
-                    f.seek(0)
-                    json.dump(data, f, indent=2)
-                    f.truncate()
+            started = time.perf_counter()
+            changed = sample_activity(probe, store, worker, last, timestamp)
+            latency = time.perf_counter() - started
+            tick_stats.update(last_tick=time.time(), latency=latency,
+                              max_latency=max(tick_stats["max_latency"], latency))
 
-            time.sleep(TRACK_INTERVAL)
+            sampling_scheduler.record(changed, last["status"] == "idle", last["idle_time"])
+            sampling_scheduler.wait()
         except Exception as e:
             print(f"Error in activity logger: {e}")
             time.sleep(TRACK_INTERVAL)
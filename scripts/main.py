@@ -3,12 +3,24 @@ import signal
 import sys
 import time
 
+import categorizer
+import logger
 from categorizer import start_categorizer_loop
+from heartbeat import run_heartbeat
 from logger import log_usage
 from metrics import print_metrics
 
 # Flag to indicate if we should exit
 should_exit = False
+heartbeat_stop = threading.Event()
+started_at = time.time()
+
+def collect_health():
+    """Health fields for the heartbeat the supervisor reads"""
+    health = logger.health_snapshot()
+    health["started"] = started_at
+    health["categorizer_last_cycle"] = categorizer.last_cycle_time
+    return health
 
 def signal_handler(sig, frame):
     """Handle termination signals"""
@@ -28,6 +40,9 @@ if __name__ == "__main__":
     categorizer_thread = threading.Thread(target=start_categorizer_loop, daemon=True)
     categorizer_thread.start()
 
+    heartbeat_thread = threading.Thread(target=run_heartbeat, args=(collect_health, heartbeat_stop), daemon=True)
+    heartbeat_thread.start()
+
     try:
         while not should_exit:
             # Check for user input with a timeout to allow checking should_exit flag
@@ -49,4 +64,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         pass
     finally:
+        heartbeat_stop.set()
         print("Shutting down tracking service...")
\ No newline at end of file
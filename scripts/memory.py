@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 import os
 import logging
 
+from embedding_cache import install_embedding_cache
+
 # Optional: Reduce ChromaDB logs
 logging.getLogger("chromadb").setLevel(logging.ERROR)
 
@@ -26,6 +28,8 @@ config = {
     }
 }
 memory = Memory.from_config(config)
+# Repeated queries are answered from the on-disk embedding cache
+install_embedding_cache(memory)
 
 
 def view_memories(user_id="default_user"):
@@ -1,31 +1,32 @@
 # ---------- METRICS ----------
-from collections import Counter, defaultdict
-import json
 import os
-from config import API_CALL_COUNT_FILE, CATEGORY_FILE, TRACK_INTERVAL
+import logger
+from categorizer import rollups as live_rollups
+from config import API_CALL_COUNT_FILE
+from event_store import open_event_store
+from rollups import build_rollups
 
 
 def print_metrics():
-    if not os.path.exists(CATEGORY_FILE):
+    # The categorizer loop keeps rollups up to date; build them if it isn't running
+    usage = live_rollups
+    if usage.last_seq == 0:
+        usage = build_rollups(open_event_store().snapshot().events())
+    if usage.last_seq == 0:
         print("No categorized logs yet.")
         return
 
-    with open(CATEGORY_FILE, 'r') as f:
-        logs = json.load(f)
-
-    total_time = defaultdict(int)
-    freq = Counter()
-
-    for i in range(1, len(logs)):
-        if logs[i]["status"] == "active":
-            delta = TRACK_INTERVAL
-            cat = logs[i]["category"]
-            total_time[cat] += delta
-            freq[cat] += 1
+    total_time = usage.totals("day", by="category")
 
     print("\n--- Usage Metrics ---")
     for cat in total_time:
-        print(f"Category: {cat}\tTime: {total_time[cat] // 60} mins")
+        print(f"Category: {cat}\tTime: {int(total_time[cat]) // 60} mins")
+
+    scheduler = logger.sampling_scheduler
+    if scheduler is not None:
+        stats = scheduler.stats()
+        print(f"\nSampling: {stats['samples_per_minute']:.1f} samples/min, current interval "
+              f"{stats['interval']:.0f}s, {stats['event_wakeups']} focus-event wakeups")
 
     print("\nAPI Call Stats:")
     if os.path.exists(API_CALL_COUNT_FILE):
@@ -0,0 +1,210 @@
+import os
+import select
+import threading
+
+import psutil
+
+from utils import get_active_window, get_idle_time, get_platform
+
+
+class ActivityProbe:
+    """
+    Source of the active window and idle time for the logger.
+    Probes with supports_events = True call subscribers as soon as focus or the
+    focused window's title changes, so the logger doesn't have to poll for it.
+    """
+
+    supports_events = False
+
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """Register callback(window_title, app_name) for focus-change events."""
+        self._listeners.append(callback)
+
+    def _notify(self, window_title, app_name):
+        for callback in self._listeners:
+            try:
+                callback(window_title, app_name)
+            except Exception as e:
+                print(f"Error in focus listener: {e}")
+
+    def start(self):
+        pass
+
+    def get_active_window(self):
+        raise NotImplementedError
+
+    def get_idle_time(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SubprocessProbe(ActivityProbe):
+    """The original xdotool/xprintidle (Linux) and win32 (Windows) path, polled every tick."""
+
+    def get_active_window(self):
+        return get_active_window()
+
+    def get_idle_time(self):
+        return get_idle_time()
+
+
+class X11Probe(ActivityProbe):
+    """
+    Keeps X connections open instead of forking xdotool/xprintidle.
+
+    A background thread with its own connection listens for PropertyNotify on the
+    root window (_NET_ACTIVE_WINDOW) and on the focused window (_NET_WM_NAME) and
+    caches the result; idle time comes from the MIT-SCREEN-SAVER extension.
+    Pass display_name (e.g. ":99") to run against an Xvfb server.
+    """
+
+    supports_events = True
+
+    def __init__(self, display_name=None):
+        super().__init__()
+        from Xlib import display as xdisplay
+
+        self.display_name = display_name
+        self._query_display = xdisplay.Display(display_name)
+        self._query_root = self._query_display.screen().root
+        if not self._query_display.has_extension("MIT-SCREEN-SAVER"):
+            raise RuntimeError("X server has no MIT-SCREEN-SAVER extension")
+        self._query_lock = threading.Lock()
+
+        self._event_display = xdisplay.Display(display_name)
+        self._event_display.set_error_handler(lambda *args: None)
+        self._root = self._event_display.screen().root
+        self._atoms = {
+            name: self._event_display.intern_atom(name)
+            for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID", "UTF8_STRING", "WM_NAME")
+        }
+        self._state_lock = threading.Lock()
+        self._focused = None
+        self._active = (None, None)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._refresh_active_window()
+
+    def start(self):
+        if self._thread is None:
+            from Xlib import X
+            self._root.change_attributes(event_mask=X.PropertyChangeMask)
+            self._event_display.flush()
+            self._thread = threading.Thread(target=self._event_loop, name="x11-probe", daemon=True)
+            self._thread.start()
+
+    def get_active_window(self):
+        with self._state_lock:
+            return self._active
+
+    def get_idle_time(self):
+        try:
+            with self._query_lock:
+                info = self._query_root.screensaver_query_info()
+            return info.idle / 1000
+        except Exception:
+            return 0
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._event_display.close()
+        self._query_display.close()
+
+    def _event_loop(self):
+        from Xlib import X
+
+        display = self._event_display
+        while not self._stop.is_set():
+            try:
+                if not display.pending_events():
+                    select.select([display], [], [], 1.0)
+                    continue
+                event = display.next_event()
+                if event.type != X.PropertyNotify:
+                    continue
+                if event.atom == self._atoms["_NET_ACTIVE_WINDOW"] and event.window == self._root:
+                    self._refresh_active_window()
+                elif event.atom in (self._atoms["_NET_WM_NAME"], self._atoms["WM_NAME"]):
+                    if self._focused is not None and event.window.id == self._focused.id:
+                        self._refresh_active_window()
+            except Exception as e:
+                print(f"Error in X11 probe: {e}")
+
+    def _refresh_active_window(self):
+        """Re-read the focused window and notify subscribers if anything changed."""
+        from Xlib import X
+
+        window_title, app_name = None, None
+        try:
+            prop = self._root.get_full_property(self._atoms["_NET_ACTIVE_WINDOW"], X.AnyPropertyType)
+            window_id = prop.value[0] if prop and len(prop.value) else 0
+            window = self._event_display.create_resource_object("window", window_id) if window_id else None
+            if window is not None and (self._focused is None or window.id != self._focused.id):
+                # Follow title changes of the newly focused window
+                window.change_attributes(event_mask=X.PropertyChangeMask)
+            self._focused = window
+            if window is not None:
+                window_title = self._window_title(window)
+                app_name = self._window_app(window)
+        except Exception:
+            self._focused = None
+
+        with self._state_lock:
+            changed = (window_title, app_name) != self._active
+            self._active = (window_title, app_name)
+        if changed:
+            self._notify(window_title, app_name)
+
+    def _window_title(self, window):
+        prop = window.get_full_property(self._atoms["_NET_WM_NAME"], self._atoms["UTF8_STRING"])
+        if prop and prop.value:
+            value = prop.value
+            return value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+        name = window.get_wm_name()
+        return name.decode("latin-1") if isinstance(name, bytes) else name
+
+    def _window_app(self, window):
+        from Xlib import X
+
+        prop = window.get_full_property(self._atoms["_NET_WM_PID"], X.AnyPropertyType)
+        if not prop or not len(prop.value):
+            return None
+        try:
+            return psutil.Process(int(prop.value[0])).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+
+def get_probe(display_name=None):
+    """
+    Pick the best available probe: the in-process X11 probe on Linux when
+    python-xlib is installed and a display is reachable, otherwise the
+    subprocess/win32 fallback.
+    """
+    if get_platform() == "linux" and (display_name or os.environ.get("DISPLAY")):
+        try:
+            return X11Probe(display_name)
+        except Exception as e:
+            print(f"X11 probe unavailable ({e}), falling back to xdotool/xprintidle")
+    return SubprocessProbe()
+
+
+if __name__ == "__main__":
+    # Manual check, e.g. `Xvfb :99 & DISPLAY=:99 python probe.py`
+    import time
+
+    probe = get_probe()
+    print(f"Using {type(probe).__name__}")
+    probe.subscribe(lambda title, app: print(f"Focus: {title!r} ({app})"))
+    probe.start()
+    while True:
+        print(f"Idle: {probe.get_idle_time():.1f}s, active: {probe.get_active_window()}")
+        time.sleep(5)
@@ -0,0 +1,153 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+FIELDS = ("timestamp", "window_title", "app_name", "category", "status", "seq")
+
+
+class InternTable:
+    """Maps each distinct string to a small integer id and back."""
+
+    def __init__(self):
+        self._ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        value = "" if value is None else value
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class ActivityRecord:
+    """
+    Read-only view of one row of ActivityColumns. Supports the dict-style reads
+    the tracker code uses (record["category"], record.get("status")) without
+    materializing a dict.
+    """
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def seq(self):
+        return self._columns.seqs[self._index]
+
+    @property
+    def timestamp(self):
+        return (EPOCH + timedelta(seconds=self._columns.timestamps[self._index])).strftime(TIMESTAMP_FORMAT)
+
+    @property
+    def window_title(self):
+        return self._columns.titles[self._columns.title_ids[self._index]]
+
+    @property
+    def app_name(self):
+        return self._columns.apps[self._columns.app_ids[self._index]]
+
+    @property
+    def category(self):
+        return self._columns.categories[self._columns.category_ids[self._index]]
+
+    @property
+    def status(self):
+        return self._columns.statuses[self._columns.status_ids[self._index]]
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in FIELDS else default
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+class ActivityColumns:
+    """
+    Column-oriented store for tracker events.
+
+    Each field is an array of machine integers; titles, apps, categories and
+    statuses are interned, so a window seen a thousand times costs one string.
+    Rows are appended in seq order, which lets find() binary-search the seq
+    column instead of keeping a seq -> row dict.
+    """
+
+    def __init__(self, entries=()):
+        self.titles = InternTable()
+        self.apps = InternTable()
+        self.categories = InternTable()
+        self.statuses = InternTable()
+        self.seqs = array("q")
+        self.timestamps = array("q")  # seconds since 1970-01-01 in local (naive) time
+        self.title_ids = array("I")
+        self.app_ids = array("I")
+        self.category_ids = array("I")
+        self.status_ids = array("B")
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        """Append an event dict and return its row index."""
+        moment = datetime.fromisoformat(entry["timestamp"])
+        self.seqs.append(entry["seq"])
+        self.timestamps.append(int((moment - EPOCH).total_seconds()))
+        self.title_ids.append(self.titles.intern(entry.get("window_title")))
+        self.app_ids.append(self.apps.intern(entry.get("app_name")))
+        self.category_ids.append(self.categories.intern(entry.get("category")))
+        self.status_ids.append(self.statuses.intern(entry.get("status")))
+        return len(self.seqs) - 1
+
+    def find(self, seq):
+        """Row index of the event with this seq, or None."""
+        index = bisect_left(self.seqs, seq)
+        if index < len(self.seqs) and self.seqs[index] == seq:
+            return index
+        return None
+
+    def set_category(self, index, category):
+        self.category_ids[index] = self.categories.intern(category)
+
+    def drop_through(self, seq):
+        """Forget the rows with seq <= seq (e.g. once they are archived). Returns how many went."""
+        count = bisect_left(self.seqs, seq + 1)
+        if count:
+            for column in (self.seqs, self.timestamps, self.title_ids, self.app_ids,
+                           self.category_ids, self.status_ids):
+                del column[:count]
+        return count
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.seqs)
+        if not 0 <= index < len(self.seqs):
+            raise IndexError(index)
+        return ActivityRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.seqs)):
+            yield ActivityRecord(self, index)
+
+    def iter_dicts(self):
+        """Materialize rows one at a time, e.g. for a streaming JSON export."""
+        for record in self:
+            yield record.as_dict()
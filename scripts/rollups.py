@@ -0,0 +1,163 @@
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from config import ROLLUP_MINUTE_RETENTION_HOURS, SESSION_MAX_SECONDS
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bucket key formats; keys sort chronologically as strings
+GRANULARITIES = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H",
+    "day": "%Y-%m-%d",
+}
+
+
+def _bucket_start(moment, granularity):
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_step(granularity):
+    return {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}[granularity]
+
+
+def split_by_bucket(start, end, granularity):
+    """Yield (bucket key, seconds) for the part of [start, end) falling in each bucket."""
+    fmt = GRANULARITIES[granularity]
+    step = _bucket_step(granularity)
+    bucket = _bucket_start(start, granularity)
+    while bucket < end:
+        next_bucket = bucket + step
+        seconds = (min(end, next_bucket) - max(start, bucket)).total_seconds()
+        if seconds > 0:
+            yield bucket.strftime(fmt), seconds
+        bucket = next_bucket
+
+
+class UsageRollups:
+    """
+    Incremental session and time-bucket aggregates over tracker events.
+
+    An "active" event opens a session that the next event of any kind closes, so
+    each session is credited with its real duration rather than TRACK_INTERVAL
+    per row. A session is credited for at most SESSION_MAX_SECONDS, so time the
+    tracker wasn't running isn't counted as use. Per-minute, per-hour and per-day totals are kept by (category, app)
+    and updated as events and category labels arrive, so queries cost
+    O(buckets) instead of a scan over every event.
+    """
+
+    def __init__(self, minute_retention_hours=ROLLUP_MINUTE_RETENTION_HOURS, max_session_seconds=SESSION_MAX_SECONDS):
+        self.minute_retention = timedelta(hours=minute_retention_hours)
+        self.max_session = timedelta(seconds=max_session_seconds)
+        self.buckets = {g: defaultdict(Counter) for g in GRANULARITIES}
+        self.sessions = {}  # seq -> [start, end, category, app] for closed sessions
+        self.open_session = None  # (seq, start, category, app)
+        self.last_seq = 0
+        self._lock = threading.Lock()
+
+    # --- updates ---
+
+    def apply(self, entry):
+        """Feed one event (or an already-seen event with an updated category)."""
+        with self._lock:
+            seq = entry["seq"]
+            if seq <= self.last_seq:
+                self._relabel(seq, entry.get("category", ""))
+                return
+            self.last_seq = seq
+            moment = datetime.strptime(entry["timestamp"], TIMESTAMP_FORMAT)
+
+            if self.open_session is not None:
+                open_seq, start, category, app = self.open_session
+                self.open_session = None
+                end = min(moment, start + self.max_session)
+                if end > start:
+                    self.sessions[open_seq] = [start, end, category, app]
+                    self._credit(start, end, category, app, 1)
+
+            if entry.get("status") == "active":
+                self.open_session = (seq, moment, entry.get("category", ""), entry.get("app_name", ""))
+
+    def apply_all(self, entries):
+        for entry in entries:
+            self.apply(entry)
+        self.prune()
+
+    def _relabel(self, seq, category):
+        if self.open_session is not None and self.open_session[0] == seq:
+            open_seq, start, _, app = self.open_session
+            self.open_session = (open_seq, start, category, app)
+            return
+        session = self.sessions.get(seq)
+        if session is None or session[2] == category:
+            return
+        start, end, old_category, app = session
+        self._credit(start, end, old_category, app, -1)
+        self._credit(start, end, category, app, 1)
+        session[2] = category
+
+    def _credit(self, start, end, category, app, sign):
+        for granularity in GRANULARITIES:
+            if granularity == "minute" and end < self._minute_horizon():
+                continue
+            buckets = self.buckets[granularity]
+            for bucket, seconds in split_by_bucket(start, end, granularity):
+                counter = buckets[bucket]
+                counter[(category, app)] += sign * seconds
+                if counter[(category, app)] <= 0:
+                    del counter[(category, app)]
+
+    def _minute_horizon(self):
+        return datetime.now() - self.minute_retention
+
+    def prune(self):
+        """Drop per-minute buckets older than the retention window."""
+        with self._lock:
+            horizon = self._minute_horizon().strftime(GRANULARITIES["minute"])
+            minutes = self.buckets["minute"]
+            for bucket in [b for b in minutes if b < horizon]:
+                del minutes[bucket]
+
+    # --- queries ---
+
+    def series(self, granularity="hour", start=None, end=None, by="category", include_open=True):
+        """
+        {bucket: {category or app: seconds}} for buckets in [start, end] (bucket keys,
+        compared as strings). The session still in progress is credited up to now
+        (at most SESSION_MAX_SECONDS).
+        """
+        index = 0 if by == "category" else 1
+        with self._lock:
+            result = defaultdict(Counter)
+            for bucket, counter in self.buckets[granularity].items():
+                if (start and bucket < start) or (end and bucket > end):
+                    continue
+                for key, seconds in counter.items():
+                    result[bucket][key[index]] += seconds
+            if include_open and self.open_session is not None:
+                _, session_start, category, app = self.open_session
+                session_end = min(datetime.now(), session_start + self.max_session)
+                for bucket, seconds in split_by_bucket(session_start, session_end, granularity):
+                    if (start and bucket < start) or (end and bucket > end):
+                        continue
+                    result[bucket][(category, app)[index]] += seconds
+        return {bucket: dict(totals) for bucket, totals in sorted(result.items())}
+
+    def totals(self, granularity="day", start=None, end=None, by="category", include_open=True):
+        """Seconds per category (or app) summed over the selected buckets."""
+        totals = Counter()
+        for counter in self.series(granularity, start, end, by, include_open).values():
+            totals.update(counter)
+        return dict(totals)
+
+
+def build_rollups(events):
+    """Build rollups from a list of events, e.g. a store snapshot."""
+    rollups = UsageRollups()
+    rollups.apply_all(events)
+    return rollups
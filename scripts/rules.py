@@ -0,0 +1,63 @@
+import re
+
+# Deterministic categorization rules, checked before the cache and the LLM.
+# Title rules run first because browsers and editors host many kinds of activity.
+
+# (title regex, category) — matched case-insensitively against the raw window title
+TITLE_RULES = [
+    (r"\b(gmail|outlook|proton ?mail|thunderbird)\b", "communication"),
+    (r"\b(whatsapp|telegram|messenger|microsoft teams|zoom meeting|google meet)\b", "communication"),
+    (r"\b(youtube|netflix|prime video|disney|twitch|spotify|hotstar)\b", "entertainment"),
+    (r"\b(facebook|instagram|twitter|reddit|linkedin|tiktok)\b|\(@?\w+\) / x\b", "social media"),
+    (r"\b(github|gitlab|stack overflow|leetcode|localhost:\d+)\b", "coding"),
+    (r"\b(google docs|google sheets|google slides|notion|jira|confluence|trello)\b", "work"),
+    (r"\b(steam|epic games)\b", "gaming"),
+]
+
+# app (process) name -> category, compared lowercase
+APP_RULES = {
+    "code.exe": "coding",
+    "code": "coding",
+    "pycharm64.exe": "coding",
+    "pycharm": "coding",
+    "idea64.exe": "coding",
+    "devenv.exe": "coding",
+    "sublime_text.exe": "coding",
+    "sublime_text": "coding",
+    "windowsterminal.exe": "coding",
+    "gnome-terminal-server": "coding",
+    "slack.exe": "communication",
+    "slack": "communication",
+    "discord.exe": "communication",
+    "discord": "communication",
+    "teams.exe": "communication",
+    "ms-teams.exe": "communication",
+    "zoom.exe": "communication",
+    "zoom": "communication",
+    "outlook.exe": "communication",
+    "thunderbird": "communication",
+    "whatsapp.exe": "communication",
+    "spotify.exe": "entertainment",
+    "spotify": "entertainment",
+    "vlc.exe": "entertainment",
+    "vlc": "entertainment",
+    "steam.exe": "gaming",
+    "steam": "gaming",
+    "winword.exe": "work",
+    "excel.exe": "work",
+    "powerpnt.exe": "work",
+    "explorer.exe": "utility",
+    "nautilus": "utility",
+    "taskmgr.exe": "utility",
+}
+
+_COMPILED_TITLE_RULES = [(re.compile(pattern, re.IGNORECASE), category) for pattern, category in TITLE_RULES]
+
+
+def match_rules(window_title, app_name):
+    """Return the rule-assigned category for a window, or None if no rule applies."""
+    title = window_title or ""
+    for pattern, category in _COMPILED_TITLE_RULES:
+        if pattern.search(title):
+            return category
+    return APP_RULES.get((app_name or "").strip().lower())
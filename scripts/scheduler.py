@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+from config import (IDLE_THRESHOLD, SAMPLE_BACKOFF, SAMPLE_MAX_INTERVAL, SAMPLE_MAX_INTERVAL_EVENTS,
+                    SAMPLE_MAX_INTERVAL_IDLE, SAMPLE_MIN_INTERVAL)
+
+
+class AdaptiveScheduler:
+    """
+    Decides when the logger takes its next sample.
+
+    Samples come every SAMPLE_MIN_INTERVAL seconds right after a change and back
+    off exponentially while nothing changes, up to a ceiling that depends on
+    whether the user is idle and whether the probe pushes focus events (if it
+    does, wake() cuts any wait short). Deadlines advance from the previous
+    deadline rather than from when the sample finished, so slow samples don't
+    make the schedule drift.
+    """
+
+    def __init__(self, event_driven=False, min_interval=SAMPLE_MIN_INTERVAL, backoff=SAMPLE_BACKOFF,
+                 max_interval=None, max_idle_interval=SAMPLE_MAX_INTERVAL_IDLE, clock=time.monotonic):
+        if max_interval is None:
+            max_interval = SAMPLE_MAX_INTERVAL_EVENTS if event_driven else SAMPLE_MAX_INTERVAL
+        self.event_driven = event_driven
+        self.min_interval = min_interval
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.max_idle_interval = max_idle_interval
+        self.clock = clock
+        self.interval = min_interval
+        self.next_deadline = clock()
+        self.samples = 0
+        self.event_wakeups = 0
+        self._recent = deque()  # sample times within the rate window
+        self._woken = threading.Event()
+
+    def record(self, changed, idle, idle_time=0):
+        """Schedule the next sample after one was taken."""
+        now = self.clock()
+        self.samples += 1
+        self._recent.append(now)
+        while self._recent and self._recent[0] < now - 300:
+            self._recent.popleft()
+
+        if changed:
+            self.interval = self.min_interval
+        else:
+            ceiling = self.max_idle_interval if idle else self.max_interval
+            self.interval = min(self.interval * self.backoff, ceiling)
+
+        interval = self.interval
+        if not idle:
+            # Be awake when the user would cross the idle threshold
+            interval = min(interval, max(self.min_interval, IDLE_THRESHOLD - idle_time))
+
+        self.next_deadline += interval
+        if self.next_deadline <= now:
+            # We fell behind (e.g. the machine slept); skip the missed samples
+            self.next_deadline = now + interval
+
+    def wake(self):
+        """Called from probe callbacks: sample as soon as possible."""
+        self._woken.set()
+
+    def delay(self):
+        return max(0.0, self.next_deadline - self.clock())
+
+    def wait(self):
+        """Block until the next deadline or a wake(). Returns True if woken by an event."""
+        woken = self._woken.wait(self.delay())
+        self._woken.clear()
+        if woken:
+            self.woke_early()
+        return woken
+
+    def woke_early(self):
+        """Restart the schedule from now after an event cut the wait short."""
+        self.event_wakeups += 1
+        self.interval = self.min_interval
+        self.next_deadline = self.clock()
+
+    def samples_per_minute(self):
+        """Effective sample rate over the last five minutes."""
+        if len(self._recent) < 2:
+            return 0.0
+        span = self._recent[-1] - self._recent[0]
+        return 60.0 * (len(self._recent) - 1) / span if span > 0 else 0.0
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "event_wakeups": self.event_wakeups,
+            "interval": self.interval,
+            "samples_per_minute": self.samples_per_minute(),
+        }
@@ -0,0 +1,358 @@
+"""
+Sync tracker history from several machines into one collector.
+
+Every device pushes the records (events and category labels) it hasn't pushed
+yet, as gzip-compressed JSON batches numbered by the store's own sequence
+numbers: first any archived history past the collector's cursor, then the
+event store segments. The collector keeps one cursor per device, the highest seq
+it has merged, and ignores anything at or below it, so a retried or repeated
+push is harmless and a reconnecting device resumes from the collector's
+cursor instead of resending its history.
+
+    python sync.py collector                      # run the collector (stand-in server)
+    python sync.py push --collector http://host:8765 [--watch]
+    python sync.py report                         # combined totals from the collector db
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from archive import UsageArchive
+from config import (SYNC_BATCH_RECORDS, SYNC_CHECKPOINT_FILE, SYNC_COLLECTOR_DB, SYNC_COLLECTOR_PORT,
+                    SYNC_COLLECTOR_URL, SYNC_DEVICE_ID, SYNC_INTERVAL, SYNC_TOKEN)
+from event_store import is_label, open_event_store
+from rollups import build_rollups
+
+EVENT_COLUMNS = ("seq", "timestamp", "window_title", "app_name", "category", "status")
+
+
+class SyncGap(Exception):
+    """A push started past the collector's cursor for that device; the device must rewind."""
+
+    def __init__(self, cursor):
+        super().__init__(f"collector only has records up to seq {cursor}")
+        self.cursor = cursor
+
+
+# --- collector ---
+
+class SyncCollector:
+    """
+    Merged event store for all devices, in SQLite. A push is applied in one
+    transaction together with the device's cursor, so a crash never leaves
+    records merged without the cursor that covers them (or the reverse).
+    """
+
+    def __init__(self, path=SYNC_COLLECTOR_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " device TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " timestamp TEXT NOT NULL,"
+            " window_title TEXT,"
+            " app_name TEXT,"
+            " category TEXT,"
+            " status TEXT,"
+            " PRIMARY KEY (device, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS devices ("
+            " device TEXT PRIMARY KEY,"
+            " cursor INTEGER NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+
+    def cursor(self, device):
+        """Highest seq merged from this device (0 if none)."""
+        with self._lock:
+            row = self._conn.execute("SELECT cursor FROM devices WHERE device = ?", (device,)).fetchone()
+        return row[0] if row else 0
+
+    def apply(self, device, base_seq, records):
+        """
+        Merge records (in seq order) pushed by a device that believes the collector
+        is at base_seq. Records at or below the cursor are skipped; labels update the
+        category of the event they reference. Returns the new cursor.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT cursor FROM devices WHERE device = ?", (device,)).fetchone()
+                current = row[0] if row else 0
+                if base_seq > current:
+                    raise SyncGap(current)
+                fresh = [r for r in records if r["seq"] > current]
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO events (device, seq, timestamp, window_title, app_name, category, status)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(device,) + tuple(r.get(c) for c in EVENT_COLUMNS) for r in fresh if not is_label(r)])
+                self._conn.executemany(
+                    "UPDATE events SET category = ? WHERE device = ? AND seq = ?",
+                    [(r["category"], device, r["ref"]) for r in fresh if is_label(r)])
+                new_cursor = max([current] + [r["seq"] for r in fresh])
+                self._conn.execute(
+                    "INSERT INTO devices (device, cursor, last_seen) VALUES (?, ?, ?)"
+                    " ON CONFLICT(device) DO UPDATE SET cursor = excluded.cursor, last_seen = excluded.last_seen",
+                    (device, new_cursor, time.time()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return new_cursor
+
+    def devices(self):
+        """{device: {"cursor", "last_seen", "events"}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.device, d.cursor, d.last_seen, COUNT(e.seq) FROM devices d"
+                " LEFT JOIN events e ON e.device = d.device GROUP BY d.device").fetchall()
+        return {device: {"cursor": cursor, "last_seen": last_seen, "events": count}
+                for device, cursor, last_seen, count in rows}
+
+    def events(self, device, start=None, end=None):
+        """One device's events in seq order, as event dicts."""
+        query = f"SELECT {', '.join(EVENT_COLUMNS)} FROM events WHERE device = ?"
+        params = [device]
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            query += " AND substr(timestamp, 1, ?) <= ?"
+            params += [len(end), end]
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY seq", params).fetchall()
+        return [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+
+    def totals(self, by="category", start=None, end=None):
+        """Active seconds per category (or app) summed over every device."""
+        combined = Counter()
+        for device in self.devices():
+            rollups = build_rollups(self.events(device, start, end))
+            combined.update(rollups.totals("day", by=by, include_open=False))
+        return dict(combined)
+
+
+def make_handler(collector, token=SYNC_TOKEN):
+    class SyncHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            if token and self.headers.get("X-Sync-Token") != token:
+                self._reply(403, {"error": "bad sync token"})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/sync/cursor" and "device" in query:
+                self._reply(200, {"device": query["device"], "cursor": collector.cursor(query["device"])})
+            elif url.path == "/sync/devices":
+                self._reply(200, collector.devices())
+            elif url.path == "/sync/totals":
+                self._reply(200, collector.totals(query.get("by", "category"), query.get("from"), query.get("to")))
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if urlparse(self.path).path != "/sync/push":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                push = json.loads(body)
+                cursor = collector.apply(push["device"], push["base_seq"], push["records"])
+            except SyncGap as gap:
+                self._reply(409, {"error": str(gap), "cursor": gap.cursor})
+                return
+            except (ValueError, KeyError, OSError) as e:
+                self._reply(400, {"error": f"bad push: {e}"})
+                return
+            self._reply(200, {"cursor": cursor})
+
+        def log_message(self, format, *args):
+            pass  # One line per push would drown the collector's own output
+
+    return SyncHandler
+
+
+def serve(port=SYNC_COLLECTOR_PORT, path=SYNC_COLLECTOR_DB, token=SYNC_TOKEN):
+    server = ThreadingHTTPServer(("", port), make_handler(SyncCollector(path), token))
+    print(f"Sync collector listening on port {port}, merging into {path}")
+    server.serve_forever()
+
+
+# --- device ---
+
+class SyncClient:
+    """
+    Pushes this device's new records to the collector. The local read cursor is
+    checkpointed together with the seq the collector acknowledged, so a normal
+    push tails only what was appended since; when the two disagree (collector
+    reset, lost checkpoint) the push restarts from the collector's cursor.
+    Days already compacted out of the store are sent from the archive first.
+    """
+
+    def __init__(self, collector_url=SYNC_COLLECTOR_URL, device=SYNC_DEVICE_ID, store=None, archive=None,
+                 checkpoint_file=SYNC_CHECKPOINT_FILE, batch_records=SYNC_BATCH_RECORDS, token=SYNC_TOKEN):
+        self.collector_url = collector_url.rstrip("/")
+        self.device = device
+        self.store = store or open_event_store()
+        self.archive = archive  # None: reopen the archive on each push to see new compactions
+        self.checkpoint_file = checkpoint_file
+        self.batch_records = batch_records
+        self.token = token
+        self.acked = None  # Collector's cursor for this device, once known
+        self.bytes_sent = 0
+
+    def _request(self, path, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-Sync-Token"] = self.token
+        if body is not None:
+            body = gzip.compress(json.dumps(body).encode("utf-8"))
+            headers["Content-Encoding"] = "gzip"
+            self.bytes_sent += len(body)
+        request = urllib.request.Request(self.collector_url + path, data=body, headers=headers)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        with open(self.checkpoint_file, 'r') as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, cursor):
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({"collector": self.collector_url, "device": self.device,
+                       "acked": self.acked, "cursor": cursor}, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def _send(self, records):
+        """Push records (in seq order) in batches, advancing acked. Returns the number sent."""
+        sent = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batch_records:
+                sent += self._send_batch(batch)
+                batch = []
+        if batch:
+            sent += self._send_batch(batch)
+        return sent
+
+    def _send_batch(self, batch):
+        try:
+            reply = self._request("/sync/push", {"device": self.device, "base_seq": self.acked, "records": batch})
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                # The collector is behind what we thought: ask again and resend on the next push
+                self.acked = None
+                self._save_checkpoint(None)
+            raise
+        except OSError:
+            self.acked = None  # Unknown whether the batch landed; the collector will tell us
+            raise
+        self.acked = reply["cursor"]
+        return len(batch)
+
+    def push(self):
+        """Send everything the collector doesn't have yet. Returns the number of records sent."""
+        if self.acked is None:
+            self.acked = self._request(f"/sync/cursor?device={quote(self.device)}")["cursor"]
+        checkpoint = self._load_checkpoint()
+        resumable = (checkpoint.get("collector") == self.collector_url and checkpoint.get("device") == self.device
+                     and checkpoint.get("acked") == self.acked)
+
+        # Archived days first: their segments may already be gone from the store.
+        # Labels are folded into the archived events, so these are events only.
+        archive = self.archive or UsageArchive()
+        sent = 0
+        if self.acked < archive.max_seq():
+            acked = self.acked
+            sent += self._send(event for event in archive.iter_dicts(after_seq=acked) if event["seq"] > acked)
+
+        records, cursor = self.store.read_since(checkpoint["cursor"] if resumable else None)
+        acked = self.acked
+        sent += self._send(r for r in records if r["seq"] > acked)
+        self._save_checkpoint(cursor)
+        return sent
+
+    def run(self, interval=SYNC_INTERVAL, stop_event=None):
+        """Push every interval seconds until stop_event is set; failures are retried next time."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                sent = self.push()
+                if sent:
+                    print(f"Synced {sent} records to {self.collector_url} (collector at seq {self.acked})")
+            except (OSError, ValueError) as e:
+                print(f"Sync to {self.collector_url} failed, will retry: {e}")
+            stop_event.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    collector = commands.add_parser("collector", help="run the collector")
+    collector.add_argument("--port", type=int, default=SYNC_COLLECTOR_PORT)
+    collector.add_argument("--db", default=SYNC_COLLECTOR_DB)
+    push = commands.add_parser("push", help="push this device's new records")
+    push.add_argument("--collector", default=SYNC_COLLECTOR_URL)
+    push.add_argument("--device", default=SYNC_DEVICE_ID)
+    push.add_argument("--watch", action="store_true", help="keep pushing every --interval seconds")
+    push.add_argument("--interval", type=float, default=SYNC_INTERVAL)
+    report = commands.add_parser("report", help="combined totals from the collector database")
+    report.add_argument("--db", default=SYNC_COLLECTOR_DB)
+    report.add_argument("--by", choices=["category", "app"], default="category")
+    args = parser.parse_args()
+
+    if args.command == "collector":
+        serve(args.port, args.db)
+    elif args.command == "push":
+        client = SyncClient(args.collector, args.device)
+        if args.watch:
+            client.run(args.interval)
+        else:
+            sent = client.push()
+            print(f"Pushed {sent} records ({client.bytes_sent} bytes), collector at seq {client.acked}")
+    else:
+        collector = SyncCollector(args.db)
+        for device, info in collector.devices().items():
+            print(f"{device:<24}{info['events']:>8} events, seq {info['cursor']}")
+        for key, seconds in sorted(collector.totals(args.by).items(), key=lambda item: -item[1]):
+            print(f"{key:<24}{int(seconds) // 60:>8} mins")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+X11Probe against a real X server. Skipped without python-xlib or a display;
+run it headless under Xvfb:
+
+    Xvfb :99 & DISPLAY=:99 python -m pytest scripts/tests/test_probe.py
+"""
+import os
+import time
+
+import psutil
+import pytest
+
+Xlib = pytest.importorskip("Xlib")
+from Xlib import X, Xatom
+from Xlib import display as xdisplay
+
+pytestmark = pytest.mark.skipif(not os.environ.get("DISPLAY"), reason="no X display (run under Xvfb)")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+class FakeDesktop:
+    """Plays the window manager: creates windows and sets _NET_ACTIVE_WINDOW on the root."""
+
+    def __init__(self):
+        self.display = xdisplay.Display()
+        self.root = self.display.screen().root
+        self.atoms = {name: self.display.intern_atom(name)
+                      for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID", "UTF8_STRING")}
+
+    def window(self, title):
+        window = self.root.create_window(0, 0, 100, 100, 0, self.display.screen().root_depth)
+        window.change_property(Xatom.WM_NAME, Xatom.STRING, 8, title.encode("latin-1", "replace"))
+        self.retitle(window, title)
+        window.change_property(self.atoms["_NET_WM_PID"], Xatom.CARDINAL, 32, [os.getpid()])
+        self.display.flush()
+        return window
+
+    def retitle(self, window, title):
+        window.change_property(self.atoms["_NET_WM_NAME"], self.atoms["UTF8_STRING"], 8, title.encode("utf-8"))
+        self.display.flush()
+
+    def focus(self, window):
+        self.root.change_property(self.atoms["_NET_ACTIVE_WINDOW"], Xatom.WINDOW, 32, [window.id if window else X.NONE])
+        self.display.flush()
+
+    def close(self):
+        self.focus(None)
+        self.display.close()
+
+
+@pytest.fixture
+def desktop():
+    desktop = FakeDesktop()
+    yield desktop
+    desktop.close()
+
+
+@pytest.fixture
+def probe(monkeypatch, desktop):
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from probe import X11Probe
+
+    try:
+        probe = X11Probe()
+    except RuntimeError as e:  # e.g. Xvfb started with -extension MIT-SCREEN-SAVER
+        pytest.skip(str(e))
+    changes = []
+    probe.subscribe(lambda title, app: changes.append((title, app)))
+    probe.start()
+    probe.changes = changes
+    yield probe
+    probe.close()
+
+
+def test_reports_focused_window_and_app(desktop, probe):
+    desktop.focus(desktop.window("first window"))
+    app = psutil.Process().name()
+    assert wait_for(lambda: probe.get_active_window() == ("first window", app))
+    assert ("first window", app) in probe.changes
+
+
+def test_follows_focus_and_title_changes(desktop, probe):
+    editor = desktop.window("notes.txt")
+    desktop.focus(editor)
+    assert wait_for(lambda: probe.get_active_window()[0] == "notes.txt")
+
+    desktop.retitle(editor, "notes.txt — édité")
+    assert wait_for(lambda: probe.get_active_window()[0] == "notes.txt — édité")
+
+    desktop.focus(desktop.window("terminal"))
+    assert wait_for(lambda: probe.get_active_window()[0] == "terminal")
+
+
+def test_idle_time_comes_from_the_screensaver_extension(probe):
+    idle = probe.get_idle_time()
+    assert isinstance(idle, float)
+    assert idle >= 0